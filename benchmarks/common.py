@@ -0,0 +1,34 @@
+"""Helpers shared by the benchmarks."""
+import copy
+import os
+import tempfile
+from typing import Dict
+
+
+def create_settings(temp_dir: str, base_url: str = "") -> None:
+    """
+    Save settings (with the default assistants already created) to a temporary summawise directory, so no api requests are made
+    to set them up. Requests are sent to 'base_url' if it's provided (ex: the fake server used by 'e2e.py').
+    """
+    tempfile.tempdir = temp_dir
+    from summawise.settings import Settings
+    from summawise.api_objects import DEFAULT_ASSISTANTS, AssistantList
+
+    assistants = []
+    for idx, da in enumerate(DEFAULT_ASSISTANTS):
+        assistant = copy.copy(da)
+        assistant.id = f"asst_benchmark{idx}"
+        assistant.definition_hash = da.hash_definition()
+        assistants.append(assistant)
+
+    Settings.from_dict({
+        "api_key": "sk-benchmark",
+        "assistants": AssistantList(assistants).to_dict_list(),
+        "base_url": base_url
+    })
+    Settings.save()
+
+
+def temp_env(temp_dir: str) -> Dict[str, str]:
+    """Environment variables which make summawise (run in a subprocess) use a temporary directory for its data."""
+    return dict(os.environ, TMPDIR=temp_dir, TEMP=temp_dir, TMP=temp_dir)
@@ -0,0 +1,124 @@
+"""
+Generates a synthetic directory tree to benchmark scanning: many small source files spread across deeply nested directories,
+a few huge files, and directories which are ignored (blacklisted directories and a .gitignore) so pruning is exercised.
+The tree is deterministic for a given seed, so runs of the benchmarks can be compared.
+
+Usage: python benchmarks/corpus.py <directory> [--small_files N] [--huge_files N] [--huge_size MB] [--depth N] [--seed N]
+"""
+import json
+import random
+import click
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple
+
+SMALL_EXTENSIONS = [".py", ".js", ".ts", ".md", ".txt", ".json", ".c", ".go"]
+WORDS = [
+    "vector", "store", "thread", "assistant", "upload", "hash", "cache", "file", "stream", "token", "batch", "index",
+    "query", "result", "config", "server", "client", "request", "response", "buffer", "encoding", "summary", "content"
+]
+LINE_TEMPLATES = [
+    "def {0}_{1}({2}):\n    return {3}\n",
+    "// {0} {1} {2} {3}\n",
+    "{0} = \"{1} {2}\"  # {3}\n",
+    "The {0} {1} is used by the {2} {3}.\n"
+]
+
+
+class CorpusConfig(NamedTuple):
+    small_files: int = 2000
+    small_size: int = 2048  # average size of a small file (bytes)
+    huge_files: int = 2
+    huge_size: int = 32 * 1024 * 1024  # size of each huge file (bytes)
+    depth: int = 6  # maximum depth of nested directories
+    fanout: int = 4  # number of subdirectories in each directory
+    ignored_files: int = 500  # files in ignored directories, which should never be read
+    seed: int = 0
+
+
+def text(rng: random.Random, size: int) -> str:
+    """Source-like text of roughly 'size' bytes."""
+    lines: List[str] = []
+    length = 0
+    while length < size:
+        line = rng.choice(LINE_TEMPLATES).format(*(rng.choice(WORDS) for _ in range(4)))
+        lines.append(line)
+        length += len(line)
+    return "".join(lines)
+
+
+def directories(root: Path, config: CorpusConfig, rng: random.Random) -> List[Path]:
+    """A nested tree of directories, up to 'config.depth' levels deep."""
+    dirs = [root]
+    level = [root]
+    for depth in range(config.depth):
+        level = [parent / f"d{depth}_{idx}" for parent in level for idx in range(rng.randint(1, config.fanout))]
+        dirs.extend(level)
+    return dirs
+
+
+def generate(root: Path, config: CorpusConfig = CorpusConfig()) -> Dict[str, Any]:
+    """Write the corpus to 'root', and return a summary of it (also saved as 'corpus.json' alongside the tree)."""
+    rng = random.Random(config.seed)
+    tree = root / "tree"
+    dirs = directories(tree, config, rng)
+    for directory in dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    small_bytes = 0
+    for idx in range(config.small_files):
+        path = rng.choice(dirs) / f"file_{idx}{rng.choice(SMALL_EXTENSIONS)}"
+        data = text(rng, rng.randint(config.small_size // 4, config.small_size * 2)).encode("utf-8")
+        path.write_bytes(data)
+        small_bytes += len(data)
+
+    # huge files are written from a repeated block, since generating that much random text would dominate the setup time
+    block = text(rng, 1024 * 1024).encode("utf-8")
+    for idx in range(config.huge_files):
+        with open(tree / f"huge_{idx}.txt", "wb") as f:
+            for offset in range(0, config.huge_size, len(block)):
+                f.write(block[:config.huge_size - offset])
+
+    # files which are ignored: blacklisted directories, a directory listed in .gitignore, and ignored extensions
+    (tree / ".gitignore").write_text("generated/\n*.log\n")
+    ignored_dirs = [tree / "node_modules" / "pkg", tree / ".git" / "objects", rng.choice(dirs) / "generated"]
+    for directory in ignored_dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+    for idx in range(config.ignored_files):
+        directory = ignored_dirs[idx % len(ignored_dirs)]
+        (directory / f"ignored_{idx}.js").write_text(text(rng, 512))
+        if idx % 10 == 0:
+            (rng.choice(dirs) / f"ignored_{idx}.log").write_text(text(rng, 256))
+
+    summary = {
+        "config": config._asdict(),
+        "tree": str(tree),
+        "directories": len(dirs),
+        "files": config.small_files + config.huge_files,
+        "bytes": small_bytes + config.huge_files * config.huge_size,
+        "huge_file": str(tree / "huge_0.txt") if config.huge_files else None
+    }
+    (root / "corpus.json").write_text(json.dumps(summary, indent=4))
+    return summary
+
+
+@click.command()
+@click.argument("directory", type=click.Path(file_okay=False, path_type=Path))
+@click.option("-sf", "--small_files", type=click.IntRange(min=0), default=CorpusConfig().small_files, help="Number of small files.")
+@click.option("-hf", "--huge_files", type=click.IntRange(min=0), default=CorpusConfig().huge_files, help="Number of huge files.")
+@click.option("-hs", "--huge_size", type=click.IntRange(min=1), default=CorpusConfig().huge_size // (1024 * 1024), help="Size of each huge file (MB).")
+@click.option("-d", "--depth", type=click.IntRange(min=0), default=CorpusConfig().depth, help="Maximum depth of nested directories.")
+@click.option("-s", "--seed", type=int, default=CorpusConfig().seed, help="Seed of the random generator.")
+def main(directory: Path, small_files: int, huge_files: int, huge_size: int, depth: int, seed: int):
+    config = CorpusConfig(
+        small_files=small_files,
+        huge_files=huge_files,
+        huge_size=huge_size * 1024 * 1024,
+        depth=depth,
+        seed=seed
+    )
+    summary = generate(directory, config)
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+End-to-end benchmarks of summawise against a local fake OpenAI API (see 'fake_openai.py'), using a synthetic corpus (see 'corpus.py').
+Requests are sent to the fake API via the 'base_url' setting, in a temporary summawise directory.
+
+Each scenario runs in a new interpreter (so its peak memory usage is measured on its own), in order: later scenarios use the
+caches left by earlier ones (ex: 'process_dir_warm' re-scans the tree scanned by 'process_dir_cold').
+Results (files/s, MB/s, API calls, peak RSS, and the time spent in each stage) are saved as JSON, and compared with the results
+of a previous run if one is provided.
+
+Usage: python benchmarks/e2e.py [--output results.json] [--compare previous.json] [--small_files N] [--latency MS] ...
+"""
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import click
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from common import create_settings, temp_env
+from corpus import CorpusConfig, generate
+from fake_openai import ServerConfig, serve, base_url
+
+# metrics compared between runs, and whether a higher value is better
+COMPARED_METRICS = {
+    "seconds": False,
+    "files_per_second": True,
+    "mb_per_second": True,
+    "api_calls": False,
+    "peak_rss_mb": False,
+    "first_token_ms": False
+}
+
+
+def peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # NOTE: reported in bytes on macOS, and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def scanned(resources: Any) -> Dict[str, float]:
+    """The number of files (and their total size) in the resources of a scan."""
+    paths = list(resources.file_contents)
+    return {"files": len(paths), "bytes": sum(path.stat().st_size for path in paths)}
+
+
+def process_dir_scenario(corpus: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    from summawise.files.processing import process_dir
+    return scanned(process_dir(Path(corpus["tree"])))
+
+
+def process_file_scenario(corpus: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    from summawise.files.processing import process_file
+    path = Path(corpus["huge_file"])
+    process_file(path)
+    return {"files": 1, "bytes": path.stat().st_size}
+
+
+def create_thread_scenario(corpus: Dict[str, Any], options: Dict[str, Any], send_messages: bool = False) -> Dict[str, Any]:
+    """Create a thread for the (already scanned) tree, only the thread creation is measured."""
+    from summawise import ai
+    from summawise.files.processing import process_dir
+    resources = process_dir(Path(corpus["tree"]))
+
+    started_at = time.perf_counter()
+    ai.create_thread(resources, file_search=True, send_messages=send_messages)
+    metrics = scanned(resources) if send_messages else {}
+    metrics["seconds"] = time.perf_counter() - started_at
+    return metrics
+
+
+def get_thread_response_scenario(corpus: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Ask several questions in a thread, sequentially (like a conversation)."""
+    from summawise import ai
+    from summawise.settings import Settings
+    from summawise.files.processing import process_dir
+    resources = process_dir(Path(corpus["tree"]))
+    thread = ai.create_thread(resources, file_search=True)
+    assistant = Settings().assistants[0]  # type: ignore
+
+    started_at = time.perf_counter()
+    for idx in range(options["responses"]):
+        ai.get_thread_response(thread.id, assistant.id, f"Question {idx}?")
+    return {"responses": options["responses"], "seconds": time.perf_counter() - started_at}
+
+
+def batch_scenario(corpus: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summarize the top level directories of the tree with the 'batch' command, run in a new interpreter exactly as a user would run it
+    (so it's also a smoke test of the command, ex: it fails if the command's imports are broken). Fails unless every input succeeds.
+    """
+    inputs = sorted(str(path) for path in Path(corpus["tree"]).iterdir() if path.is_dir() and not path.name.startswith("."))
+    result = subprocess.run(
+        [sys.executable, "-m", "summawise", "batch", "-c", str(options["concurrency"]), "-q"],
+        input="\n".join(inputs), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"'summawise batch' failed ({result.returncode}):\n{result.stderr}")
+    records = [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+    failed = [record for record in records if record["status"] != "ok"]
+    if len(records) != len(inputs) or failed:
+        raise RuntimeError(f"'summawise batch' summarized {len(records) - len(failed)}/{len(inputs)} input(s):\n{failed}\n{result.stderr}")
+    return {"inputs": len(inputs)}
+
+
+SCENARIOS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = {
+    "process_dir_cold": process_dir_scenario,
+    "process_dir_warm": process_dir_scenario,
+    "process_file_huge": process_file_scenario,
+    "create_thread": create_thread_scenario,
+    "create_thread_messages": lambda corpus, options: create_thread_scenario(corpus, options, send_messages=True),
+    "get_thread_response": get_thread_response_scenario,
+    "batch": batch_scenario,
+}
+
+
+def run_scenario(name: str, corpus: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a scenario in this process (see 'scenario'), returning its metrics."""
+    from summawise import profiling
+    from summawise.settings import Settings
+    from summawise.files import cache as FileCache
+
+    Settings.init()
+    FileCache.init()
+    profiling.enable()
+    started_at = time.perf_counter()
+    # NOTE: progress output is discarded, only the results are written to stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        metrics = SCENARIOS[name](corpus, options)
+    # scenarios which only measure part of what they do return their own time
+    metrics.setdefault("seconds", time.perf_counter() - started_at)
+
+    seconds = metrics["seconds"]
+    if "files" in metrics:
+        metrics["files_per_second"] = metrics["files"] / seconds
+        metrics["mb_per_second"] = metrics["bytes"] / (1024 * 1024) / seconds
+
+    first_tokens = [span.duration for span in profiling.spans() if span.name == "run.first_token"]
+    if first_tokens:
+        metrics["first_token_ms"] = sum(first_tokens) / len(first_tokens) * 1000
+
+    stages: Dict[str, Dict[str, float]] = {}
+    for span in profiling.spans():
+        stage = stages.setdefault(span.name, {"calls": 0, "total_ms": 0.0})
+        stage["calls"] += 1
+        stage["total_ms"] += span.duration * 1000
+    metrics["stages"] = stages
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    return metrics
+
+
+def server_stats(url: str) -> Dict[str, Any]:
+    stats_url = url.rsplit("/v1", 1)[0] + "/_stats"
+    with urllib.request.urlopen(stats_url) as response:
+        return json.loads(response.read())
+
+
+def _serve(config: ServerConfig, url_queue: "multiprocessing.Queue[str]") -> None:
+    server = serve(config)
+    url_queue.put(base_url(server))
+    server.serve_forever()
+
+
+def compare(results: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Print the change in each metric since a previous run."""
+    print(f"\nCompared with: {previous.get('started_at', 'previous run')}")
+    for config in ("corpus", "server"):
+        if previous.get(config) != results[config]:
+            print(f"WARNING: the {config} configuration differs from the previous run, so the results aren't comparable.")
+    print(f"{'scenario':<26} {'metric':<18} {'previous':>12} {'current':>12} {'change':>9}")
+    for name, metrics in results["scenarios"].items():
+        previous_metrics = previous.get("scenarios", {}).get(name)
+        if not previous_metrics:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if metric not in metrics or not previous_metrics.get(metric):
+                continue
+            before, after = previous_metrics[metric], metrics[metric]
+            change = (after - before) / before * 100
+            better = (change > 0) == higher_is_better
+            marker = "" if abs(change) < 5 else (" +" if better else " -")
+            print(f"{name:<26} {metric:<18} {before:>12.2f} {after:>12.2f} {change:>+8.1f}%{marker}")
+
+
+@click.group(invoke_without_command=True)
+@click.option("-o", "--output", type=click.Path(dir_okay=False, path_type=Path), default=None, help="File the results are saved to. [Default: e2e-<timestamp>.json]")
+@click.option("-c", "--compare", "compare_path", type=click.Path(exists=True, dir_okay=False, path_type=Path), default=None, help="Results of a previous run to compare with.")
+@click.option("-s", "--scenarios", "scenario_names", default=",".join(SCENARIOS), help="Comma separated scenarios to run (in order).")
+@click.option("-sf", "--small_files", type=click.IntRange(min=1), default=CorpusConfig().small_files, help="Number of small files in the corpus.")
+@click.option("-hf", "--huge_files", type=click.IntRange(min=0), default=CorpusConfig().huge_files, help="Number of huge files in the corpus.")
+@click.option("-hs", "--huge_size", type=click.IntRange(min=1), default=CorpusConfig().huge_size // (1024 * 1024), help="Size of each huge file (MB).")
+@click.option("-l", "--latency", type=click.FloatRange(min=0), default=20.0, help="Milliseconds added to each response by the fake API.")
+@click.option("-rl", "--rate_limit", type=click.FloatRange(min=0), default=0.0, help="Requests allowed per second by the fake API (0 = unlimited).")
+@click.option("-fps", "--files_per_second", type=click.FloatRange(min=0), default=ServerConfig().files_per_second, help="Rate the fake API processes files added to vector stores.")
+@click.option("-td", "--token_delay", type=click.FloatRange(min=0), default=5.0, help="Milliseconds between streamed tokens.")
+@click.option("-r", "--responses", type=click.IntRange(min=1), default=5, help="Number of responses requested by 'get_thread_response'.")
+@click.option("-bc", "--batch_concurrency", "concurrency", type=click.IntRange(min=1), default=4, help="Number of inputs summarized at once by 'batch'.")
+@click.pass_context
+def main(
+    ctx: click.Context,
+    output: Optional[Path],
+    compare_path: Optional[Path],
+    scenario_names: str,
+    small_files: int,
+    huge_files: int,
+    huge_size: int,
+    latency: float,
+    rate_limit: float,
+    files_per_second: float,
+    token_delay: float,
+    responses: int,
+    concurrency: int
+):
+    if ctx.invoked_subcommand is not None:
+        return
+
+    names = [name.strip() for name in scenario_names.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise click.BadParameter(f"Unknown scenario(s): {', '.join(unknown)}", param_hint="--scenarios")
+    if not huge_files and "process_file_huge" in names:
+        names.remove("process_file_huge")
+
+    server_config = ServerConfig(latency=latency / 1000, rate_limit=rate_limit, files_per_second=files_per_second, token_delay=token_delay / 1000)
+    corpus_config = CorpusConfig(small_files=small_files, huge_files=huge_files, huge_size=huge_size * 1024 * 1024)
+    options = {"responses": responses, "concurrency": concurrency}
+
+    results: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": server_config._asdict(),
+        "corpus": corpus_config._asdict(),
+        "scenarios": {}
+    }
+
+    url_queue: "multiprocessing.Queue[str]" = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(server_config, url_queue), daemon=True)
+    server.start()
+    try:
+        url = url_queue.get(timeout=30)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            print("Generating corpus...", flush=True)
+            corpus = generate(Path(temp_dir) / "corpus", corpus_config)
+            data_dir = Path(temp_dir) / "data"
+            data_dir.mkdir()
+            create_settings(str(data_dir), base_url=url)
+            env = temp_env(str(data_dir))
+
+            print(f"{'scenario':<26} {'time':>9} {'files/s':>10} {'MB/s':>9} {'api calls':>10} {'peak rss':>10}")
+            for name in names:
+                before = server_stats(url)
+                result = subprocess.run(
+                    [sys.executable, __file__, "scenario", name, json.dumps(corpus), json.dumps(options)],
+                    env=env, capture_output=True, text=True
+                )
+                if result.returncode != 0:
+                    raise RuntimeError(f"Scenario '{name}' failed ({result.returncode}):\n{result.stderr}")
+                metrics = json.loads(result.stdout.strip().splitlines()[-1])
+                after = server_stats(url)
+                metrics["api_calls"] = after["requests"] - before["requests"]
+                metrics["rate_limited"] = after["rate_limited"] - before["rate_limited"]
+                results["scenarios"][name] = metrics
+
+                files_per_second = f"{metrics['files_per_second']:.0f}" if "files_per_second" in metrics else "-"
+                mb_per_second = f"{metrics['mb_per_second']:.1f}" if "mb_per_second" in metrics else "-"
+                print(f"{name:<26} {metrics['seconds']:>8.2f}s {files_per_second:>10} {mb_per_second:>9} "
+                      f"{metrics['api_calls']:>10} {metrics['peak_rss_mb']:>7.1f} MB", flush=True)
+    finally:
+        server.terminate()
+
+    output = output or Path(f"e2e-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.write_text(json.dumps(results, indent=4))
+    print(f"\nResults saved to: {output}")
+
+    if compare_path is not None:
+        compare(results, json.loads(compare_path.read_text()))
+
+
+@main.command()
+@click.argument("name")
+@click.argument("corpus_json")
+@click.argument("options_json")
+def scenario(name: str, corpus_json: str, options_json: str):
+    """Run a single scenario, and print its metrics as JSON (used by 'main', in a new interpreter for each scenario)."""
+    metrics = run_scenario(name, json.loads(corpus_json), json.loads(options_json))
+    print(json.dumps(metrics))
+
+
+if __name__ == "__main__":
+    main()
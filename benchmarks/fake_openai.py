@@ -0,0 +1,317 @@
+"""
+A local stand-in for the subset of the OpenAI API used by summawise (files, vector stores, threads and streamed runs), so
+benchmarks don't make paid requests or depend on the network. Responses are generated immediately, apart from a configurable
+latency, rate limit (429 responses with 'retry-after-ms'), vector store processing rate and delay between streamed tokens.
+Uploaded contents are read and discarded.
+
+Usage: python benchmarks/fake_openai.py [--port N] [--latency MS] [--rate_limit N] [--files_per_second N]
+Point summawise at it with the 'base_url' setting (or the 'OPENAI_BASE_URL' environment variable): http://127.0.0.1:<port>/v1
+Request counts are available from GET /_stats.
+"""
+import itertools
+import json
+import re
+import threading
+import time
+import click
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class ServerConfig(NamedTuple):
+    latency: float = 0.0  # seconds added to each response
+    rate_limit: float = 0.0  # requests per second (0 = unlimited), requests over the limit receive a 429 response
+    files_per_second: float = 500.0  # rate vector stores process their files (0 = instantly)
+    tokens: int = 50  # number of text deltas streamed by each run
+    token_delay: float = 0.0  # seconds between streamed text deltas
+
+
+class FakeOpenAI:
+    """The state of the fake API, shared by every request handler."""
+
+    def __init__(self, config: ServerConfig = ServerConfig()):
+        self.config = config
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        # id -> files added to the vector store, which are processed gradually: [(added at, file count)]
+        self.vector_stores: Dict[str, List[Tuple[float, int]]] = {}
+        self.requests: Counter = Counter()
+        self.rate_limited = 0
+        self.bytes_received = 0
+        self._tokens = config.rate_limit
+        self._refilled_at = time.monotonic()
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}_fake{next(self.ids)}"
+
+    def allow(self) -> Optional[float]:
+        """Take a token from the rate limiter. Returns None if the request is allowed, otherwise seconds until it would be."""
+        if self.config.rate_limit <= 0:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            self._tokens = min(self.config.rate_limit, self._tokens + (now - self._refilled_at) * self.config.rate_limit)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            self.rate_limited += 1
+            return (1 - self._tokens) / self.config.rate_limit
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "endpoints": dict(self.requests),
+                "rate_limited": self.rate_limited,
+                "bytes_received": self.bytes_received,
+                "files": len(self.files),
+                "vector_stores": len(self.vector_stores)
+            }
+
+    # objects, with the fields summawise (and the openai sdk) read
+
+    def file_obj(self, file_id: str, filename: str = "file", size: int = 0) -> Dict[str, Any]:
+        return {"id": file_id, "object": "file", "bytes": size, "created_at": int(time.time()), "filename": filename,
+                "purpose": "assistants", "status": "processed"}
+
+    def vector_store_obj(self, vector_store_id: str) -> Dict[str, Any]:
+        now = time.monotonic()
+        rate = self.config.files_per_second
+        total = completed = 0
+        for added_at, count in self.vector_stores.get(vector_store_id, []):
+            total += count
+            completed += count if rate <= 0 else min(count, int((now - added_at) * rate))
+        return {
+            "id": vector_store_id, "object": "vector_store", "created_at": int(time.time()), "name": "benchmark",
+            "usage_bytes": completed * 1024, "status": "completed" if completed == total else "in_progress",
+            "file_counts": {"in_progress": total - completed, "completed": completed, "failed": 0, "cancelled": 0, "total": total},
+            "last_active_at": int(time.time()), "metadata": {}
+        }
+
+    def run_obj(self, thread_id: str, run_id: str, status: str) -> Dict[str, Any]:
+        return {"id": run_id, "object": "thread.run", "created_at": int(time.time()), "thread_id": thread_id,
+                "assistant_id": "asst_fake", "status": status, "instructions": "", "model": "gpt-4o", "tools": [],
+                "metadata": {}, "parallel_tool_calls": True}
+
+    def message_obj(self, thread_id: str, message_id: str, run_id: str, text: str, status: str) -> Dict[str, Any]:
+        content = [{"type": "text", "text": {"value": text, "annotations": []}}] if text else []
+        return {"id": message_id, "object": "thread.message", "created_at": int(time.time()), "thread_id": thread_id,
+                "role": "assistant", "content": content, "attachments": [], "metadata": {}, "status": status,
+                "assistant_id": "asst_fake", "run_id": run_id}
+
+
+# routes: (method, pattern) -> handler name, patterns are matched against the path without the '/v1' prefix
+ROUTES: List[Tuple[str, "re.Pattern[str]", str]] = [
+    (method, re.compile(f"^{pattern}$"), name) for method, pattern, name in [
+        ("POST", r"/files", "create_file"),
+        ("GET", r"/files", "list_files"),
+        ("POST", r"/vector_stores", "create_vector_store"),
+        ("GET", r"/vector_stores/(?P<vs>[^/]+)", "get_vector_store"),
+        ("POST", r"/vector_stores/(?P<vs>[^/]+)/file_batches", "create_file_batch"),
+        ("DELETE", r"/vector_stores/(?P<vs>[^/]+)/files/(?P<file>[^/]+)", "delete_vector_store_file"),
+        ("POST", r"/threads", "create_thread"),
+        ("DELETE", r"/threads/(?P<thread>[^/]+)", "delete_thread"),
+        ("POST", r"/threads/(?P<thread>[^/]+)/messages", "create_message"),
+        ("POST", r"/threads/(?P<thread>[^/]+)/runs", "create_run"),
+        ("POST", r"/threads/(?P<thread>[^/]+)/runs/(?P<run>[^/]+)/cancel", "cancel_run"),
+        ("POST", r"/assistants", "create_assistant"),
+    ]
+]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api: FakeOpenAI  # set on the class created by 'serve'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                body += self.rfile.read(size)
+                self.rfile.readline()
+            return bytes(body)
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def send_json(self, obj: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def dispatch(self, method: str) -> None:
+        path = self.path.split("?", 1)[0]
+        body = self.read_body()
+        if path == "/_stats":
+            self.send_json(self.api.stats())
+            return
+
+        path = path[len("/v1"):] if path.startswith("/v1") else path
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                break
+        else:
+            self.send_json({"error": {"message": f"Unknown route: {method} {path}", "type": "invalid_request_error"}}, 404)
+            return
+
+        with self.api.lock:
+            self.api.requests[name] += 1
+            self.api.bytes_received += len(body)
+        retry_after = self.api.allow()
+        if retry_after is not None:
+            self.send_json({"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, 429,
+                           {"retry-after-ms": str(int(retry_after * 1000) + 1)})
+            return
+        if self.api.config.latency:
+            time.sleep(self.api.config.latency)
+
+        json_body = json.loads(body) if body and self.headers.get("Content-Type", "").startswith("application/json") else {}
+        handler: Callable[..., None] = getattr(self, name)
+        handler(json_body, body, **match.groupdict())
+
+    def create_file(self, json_body: Dict[str, Any], body: bytes) -> None:
+        filename = re.search(rb'filename="([^"]*)"', body)
+        file_id = self.api.new_id("file")
+        obj = self.api.file_obj(file_id, filename.group(1).decode() if filename else "file", len(body))
+        with self.api.lock:
+            self.api.files[file_id] = obj
+        self.send_json(obj)
+
+    def list_files(self, json_body: Dict[str, Any], body: bytes) -> None:
+        with self.api.lock:
+            files = list(self.api.files.values())
+        self.send_json({"object": "list", "data": files, "has_more": False})
+
+    def create_vector_store(self, json_body: Dict[str, Any], body: bytes) -> None:
+        vector_store_id = self.api.new_id("vs")
+        with self.api.lock:
+            self.api.vector_stores[vector_store_id] = [(time.monotonic(), len(json_body.get("file_ids", [])))]
+            obj = self.api.vector_store_obj(vector_store_id)
+        self.send_json(obj)
+
+    def get_vector_store(self, json_body: Dict[str, Any], body: bytes, vs: str) -> None:
+        with self.api.lock:
+            if vs not in self.api.vector_stores:
+                self.send_json({"error": {"message": "No vector store found", "type": "invalid_request_error"}}, 404)
+                return
+            obj = self.api.vector_store_obj(vs)
+        self.send_json(obj, headers={"openai-poll-after-ms": "100"})
+
+    def create_file_batch(self, json_body: Dict[str, Any], body: bytes, vs: str) -> None:
+        count = len(json_body.get("file_ids", []))
+        with self.api.lock:
+            self.api.vector_stores.setdefault(vs, []).append((time.monotonic(), count))
+        self.send_json({
+            "id": self.api.new_id("vsfb"), "object": "vector_store.files_batch", "created_at": int(time.time()),
+            "vector_store_id": vs, "status": "in_progress",
+            "file_counts": {"in_progress": count, "completed": 0, "failed": 0, "cancelled": 0, "total": count}
+        })
+
+    def delete_vector_store_file(self, json_body: Dict[str, Any], body: bytes, vs: str, file: str) -> None:
+        self.send_json({"id": file, "object": "vector_store.file.deleted", "deleted": True})
+
+    def create_thread(self, json_body: Dict[str, Any], body: bytes) -> None:
+        self.send_json({"id": self.api.new_id("thread"), "object": "thread", "created_at": int(time.time()),
+                        "metadata": {}, "tool_resources": json_body.get("tool_resources")})
+
+    def delete_thread(self, json_body: Dict[str, Any], body: bytes, thread: str) -> None:
+        self.send_json({"id": thread, "object": "thread.deleted", "deleted": True})
+
+    def create_message(self, json_body: Dict[str, Any], body: bytes, thread: str) -> None:
+        self.send_json(dict(self.api.message_obj(thread, self.api.new_id("msg"), "", "", "completed"), role="user"))
+
+    def cancel_run(self, json_body: Dict[str, Any], body: bytes, thread: str, run: str) -> None:
+        self.send_json(self.api.run_obj(thread, run, "cancelling"))
+
+    def create_assistant(self, json_body: Dict[str, Any], body: bytes) -> None:
+        self.send_json(dict(json_body, id=self.api.new_id("asst"), object="assistant", created_at=int(time.time()),
+                            description=None, metadata={}, tools=json_body.get("tools", [])))
+
+    def create_run(self, json_body: Dict[str, Any], body: bytes, thread: str) -> None:
+        """Stream a run which responds with 'tokens' text deltas, as server-sent events."""
+        config = self.api.config
+        run_id, message_id = self.api.new_id("run"), self.api.new_id("msg")
+        words = [f"token{idx} " for idx in range(config.tokens)]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(name: str, data: Any) -> None:
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event("thread.run.created", self.api.run_obj(thread, run_id, "queued"))
+        event("thread.run.in_progress", self.api.run_obj(thread, run_id, "in_progress"))
+        event("thread.message.created", self.api.message_obj(thread, message_id, run_id, "", "in_progress"))
+        for idx, word in enumerate(words):
+            if config.token_delay:
+                time.sleep(config.token_delay)
+            event("thread.message.delta", {"id": message_id, "object": "thread.message.delta",
+                                           "delta": {"content": [{"index": 0, "type": "text", "text": {"value": word}}]}})
+        event("thread.message.completed", self.api.message_obj(thread, message_id, run_id, "".join(words), "completed"))
+        event("thread.run.completed", self.api.run_obj(thread, run_id, "completed"))
+        self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def serve(config: ServerConfig = ServerConfig(), host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Create a server for the fake API (call 'serve_forever' to start it). Port 0 picks a free port."""
+    api = FakeOpenAI(config)
+    handler = type("FakeOpenAIHandler", (Handler,), {"api": api})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+@click.command()
+@click.option("-p", "--port", type=click.IntRange(min=0), default=0, help="Port to listen on. [Default: a free port]")
+@click.option("-l", "--latency", type=click.FloatRange(min=0), default=0.0, help="Milliseconds added to each response.")
+@click.option("-rl", "--rate_limit", type=click.FloatRange(min=0), default=0.0, help="Requests allowed per second (0 = unlimited).")
+@click.option("-fps", "--files_per_second", type=click.FloatRange(min=0), default=ServerConfig().files_per_second, help="Rate vector stores process their files (0 = instantly).")
+@click.option("-t", "--tokens", type=click.IntRange(min=0), default=ServerConfig().tokens, help="Number of text deltas streamed by each run.")
+@click.option("-td", "--token_delay", type=click.FloatRange(min=0), default=0.0, help="Milliseconds between streamed text deltas.")
+def main(port: int, latency: float, rate_limit: float, files_per_second: float, tokens: int, token_delay: float):
+    config = ServerConfig(latency / 1000, rate_limit, files_per_second, tokens, token_delay / 1000)
+    server = serve(config, port=port)
+    print(f"Fake OpenAI API listening on: {base_url(server)}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Micro-benchmarks of summawise's local hot paths (nothing is sent over the network), run against fixtures generated in a temporary directory:
+listing/filtering files, encoding detection, hashing, serialization, the file cache database, and loading transcripts.
+
+Each benchmark is timed like 'timeit': it's run once to warm up (caches, the OS page cache), the number of loops is increased until a
+repeat takes at least '--min_time', then the time per call of each repeat is recorded (with garbage collection disabled).
+The median is reported along with the spread of the repeats, fixtures are deterministic so runs on the same machine can be compared.
+
+Usage: python benchmarks/micro.py [--groups files,hash,...] [--filter 'hash.*'] [--quick] [--output results.json] [--compare previous.json]
+"""
+import fnmatch
+import gc
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+import click
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from common import create_settings
+from corpus import CorpusConfig, generate, text
+
+# changes within the larger of this and the spread of the repeats are considered noise when comparing runs
+NOISE_THRESHOLD = 0.05
+
+
+class Benchmark(NamedTuple):
+    name: str
+    func: Callable[[], Any]
+    bytes: int = 0  # processed per call (reported as MB/s)
+    items: int = 0  # processed per call (reported as items/s)
+    setup: Optional[Callable[[], Any]] = None  # called (untimed) before the benchmark is measured, ex: to write the file it loads
+
+
+def size_str(size: int) -> str:
+    """A short size for benchmark names (ex: '64KB')."""
+    for unit, multiplier in (("MB", 1024 * 1024), ("KB", 1024)):
+        if size >= multiplier:
+            return f"{size // multiplier}{unit}"
+    return f"{size}B"
+
+
+def count_str(count: int) -> str:
+    """A short count for benchmark names (ex: '100k')."""
+    for unit, multiplier in (("M", 1000 * 1000), ("k", 1000)):
+        if count >= multiplier:
+            return f"{count // multiplier}{unit}"
+    return str(count)
+
+
+def random_bytes(rng: random.Random, size: int) -> bytes:
+    return rng.getrandbits(size * 8).to_bytes(size, "little")
+
+
+def files_benchmarks(root: Path, quick: bool) -> List[Benchmark]:
+    from summawise.files import utils as FileUtils
+    from summawise.files.filters import FileFilter
+
+    config = CorpusConfig(small_files=500 if quick else 2000, huge_files=0)
+    tree = Path(generate(root / "corpus", config)["tree"])
+    all_files = FileUtils.list_files(tree)
+    file_filter = FileFilter(tree)
+
+    # one file for each path through encoding detection
+    rng = random.Random(0)
+    sample = text(rng, 8 * 1024)
+    encodings = root / "encodings"
+    encodings.mkdir()
+    fixtures = {
+        "ascii": sample.encode("ascii"),
+        "utf8": sample.replace("the", "thé").encode("utf-8"),
+        "utf8_bom": b"\xef\xbb\xbf" + sample.encode("utf-8"),
+        "utf16_bom": sample.encode("utf-16"),
+        "binary": random_bytes(rng, 8 * 1024),
+        "latin1": sample.replace("the", "thé").encode("latin-1"),  # not valid UTF-8, falls back to chardet
+    }
+    benchmarks = [
+        Benchmark("files.list_files", lambda: FileUtils.list_files(tree), items=len(all_files)),
+        Benchmark("files.filter_files", lambda: FileUtils.filter_files(all_files, file_filter=file_filter), items=len(all_files)),
+        Benchmark("files.filter_files.no_encoding", lambda: FileUtils.filter_files(all_files, check_encoding=False, file_filter=file_filter),
+                  items=len(all_files)),
+    ]
+    for name, data in fixtures.items():
+        path = encodings / f"{name}.txt"
+        path.write_bytes(data)
+        benchmarks.append(Benchmark(f"files.get_encoding.{name}", lambda path=path: FileUtils.get_encoding(path),
+                                    bytes=min(len(data), FileUtils.ENCODING_SAMPLE_SIZE), items=1))
+    return benchmarks
+
+
+def hash_benchmarks(root: Path, quick: bool) -> List[Benchmark]:
+    from summawise.data import HashAlg, HASH_MMAP_THRESHOLD
+
+    # the largest file is memory mapped while it's hashed, rather than read into a buffer
+    sizes = [4 * 1024, 1024 * 1024, 16 * 1024 * 1024]
+    if not quick:
+        sizes.append(HASH_MMAP_THRESHOLD + 16 * 1024 * 1024)
+
+    block = random_bytes(random.Random(0), 1024 * 1024)
+    benchmarks: List[Benchmark] = []
+    for size in sizes:
+        path = root / f"hash_{size_str(size)}.bin"
+        with open(path, "wb") as f:
+            for offset in range(0, size, len(block)):
+                f.write(block[:size - offset])
+        for alg in HashAlg:
+            benchmarks.append(Benchmark(f"hash.{alg.name}.{size_str(size)}", lambda alg=alg, path=path: alg.calculate(path), bytes=size, items=1))
+    # hashing in memory (ex: files which are read once and passed along, see 'files.ingest')
+    data = block * 4
+    for alg in HashAlg:
+        benchmarks.append(Benchmark(f"hash.{alg.name}.bytes_4MB", lambda alg=alg: alg.calculate(data), bytes=len(data), items=1))
+    return benchmarks
+
+
+def manifest(entries: int) -> Any:
+    """A directory manifest (a dataclass using the default 'Serializable' implementation) with 'entries' files."""
+    from summawise.files.manifest import DirManifest
+    files = {f"src/dir_{idx % 100}/file_{idx}.py": [f"{idx:032x}", f"file-{idx:024d}"] for idx in range(entries)}
+    return DirManifest("/benchmark/dir", "vs_benchmark", files, key=f"{entries:064x}")
+
+
+def serializable_benchmarks(root: Path, quick: bool) -> List[Benchmark]:
+    from summawise.data import DataMode
+    from summawise.files.manifest import DirManifest
+
+    entries = 10000
+    obj = manifest(entries)
+    benchmarks: List[Benchmark] = []
+    for mode in DataMode:
+        for compress in (False, True):
+            name = f"serializable.{mode.ext()}{'.gz' if compress else ''}"
+            path = root / f"manifest{'_gz' if compress else ''}.{mode.ext()}"
+            if compress and mode == DataMode.JSON:
+                # NOTE: compressed json is saved with a .gz suffix (binary files are always named .bin)
+                read_path = path.with_suffix(path.suffix + ".gz")
+            else:
+                read_path = path
+
+            def save(path: Path = path, mode: DataMode = mode, compress: bool = compress) -> None:
+                obj.save_to_file(path, mode, compress)
+
+            def load(read_path: Path = read_path, mode: DataMode = mode) -> None:
+                DirManifest.from_file(read_path, mode)
+
+            save()
+            size = read_path.stat().st_size
+            benchmarks.append(Benchmark(f"{name}.save", save, bytes=size, items=entries))
+            benchmarks.append(Benchmark(f"{name}.load", load, bytes=size, items=entries))
+    return benchmarks
+
+
+def file_cache_benchmarks(root: Path, quick: bool) -> List[Benchmark]:
+    from summawise import utils
+    from summawise.data import DataMode, HashAlg
+    from summawise.files.cache import FileCacheDB, FileCacheObj
+
+    sizes = [10000, 100000] if quick else [10000, 100000, 1000000]
+    # hashes/file ids looked up or written per call (a large scan), each call is a single transaction where it writes
+    batch = 1000
+    benchmarks: List[Benchmark] = []
+    for entries in sizes:
+        rows = [(f"{idx:032x}", f"file-{idx:024d}") for idx in range(entries)]
+        rng = random.Random(entries)
+        hits = [hash for hash, _ in rng.sample(rows, batch)]
+        misses = [f"{entries + idx:032x}" for idx in range(batch)]
+        updates = rng.sample(rows, batch)
+        file_ids = [file_id for _, file_id in updates]
+        db = FileCacheDB(root / f"file_cache.{count_str(entries)}.db", HashAlg.XXH3_128)
+
+        def populate(db: FileCacheDB = db, rows: List[Tuple[str, str]] = rows) -> None:
+            if len(db) != len(rows):
+                db.set_many(rows)
+                db.refresh_alive((file_id for _, file_id in rows), time.time())
+
+        def lookup(db: FileCacheDB = db, hashes: List[str] = hits) -> None:
+            for hash in hashes:
+                db.get_file_id_by_hash(hash)
+
+        # existing rows are replaced, so the size of the database doesn't change between calls
+        name = f"file_cache.db.{count_str(entries)}"
+        benchmarks.append(Benchmark(f"{name}.lookup_hit", lookup, items=batch, setup=populate))
+        benchmarks.append(Benchmark(f"{name}.lookup_miss", lambda lookup=lookup, misses=misses: lookup(hashes=misses),
+                                    items=batch, setup=populate))
+        benchmarks.append(Benchmark(f"{name}.set_many", lambda db=db, updates=updates: db.set_many(updates),
+                                    items=batch, setup=populate))
+        benchmarks.append(Benchmark(f"{name}.mark_alive", lambda db=db, file_ids=file_ids: db.mark_alive(file_ids),
+                                    items=batch, setup=populate))
+
+        # caches saved by previous versions are imported once, the first time the database is opened
+        cache = FileCacheObj(dict(rows))
+        for mode in DataMode:
+            legacy_path = utils.get_summawise_dir() / f"file_cache.{mode.ext()}"
+
+            def save_legacy(cache: FileCacheObj = cache, mode: DataMode = mode, legacy_path: Path = legacy_path) -> None:
+                # only the cache being measured exists ('import_legacy' imports every data mode)
+                for other in DataMode:
+                    utils.fp(utils.get_summawise_dir() / f"file_cache.{other.ext()}").unlink(missing_ok=True)
+                cache.save_to_file(legacy_path, mode, compress=True, pretty_json=True)
+
+            def import_legacy(entries: int = entries) -> None:
+                path = root / f"file_cache.import.{count_str(entries)}.db"
+                for suffix in ("", "-wal", "-shm"):
+                    Path(str(path) + suffix).unlink(missing_ok=True)
+                legacy_db = FileCacheDB(path, HashAlg.XXH3_128)
+                legacy_db.import_legacy()
+                legacy_db.close()
+
+            benchmarks.append(Benchmark(f"file_cache.import_legacy.{mode.ext()}.{count_str(entries)}", import_legacy,
+                                        items=entries, setup=save_legacy))
+    return benchmarks
+
+
+def transcript_json(hours: int) -> str:
+    """A transcript of a video 'hours' long, with an entry every few seconds (like YouTube's generated captions)."""
+    from summawise.youtube import Transcript, TranscriptEntry
+    rng = random.Random(hours)
+    entries: List[TranscriptEntry] = []
+    start = 0.0
+    while start < hours * 3600:
+        duration = round(rng.uniform(1.5, 5.0), 3)
+        entries.append(TranscriptEntry(text(rng, 40).replace("\n", " ").strip(), round(start, 3), duration))
+        start += duration
+    return Transcript("benchmark", entries, "vs_benchmark", "file-benchmark").to_json()
+
+
+def transcript_benchmarks(root: Path, quick: bool) -> List[Benchmark]:
+    from summawise.youtube import Transcript
+
+    benchmarks: List[Benchmark] = []
+    for hours in ([1, 3] if quick else [1, 3, 10]):
+        json_str = transcript_json(hours)
+        entries = json_str.count('"start"')
+        benchmarks.append(Benchmark(f"transcript.from_json.{hours}h", lambda json_str=json_str: Transcript.from_json(json_str),
+                                    bytes=len(json_str), items=entries))
+    return benchmarks
+
+
+GROUPS: Dict[str, Callable[[Path, bool], List[Benchmark]]] = {
+    "files": files_benchmarks,
+    "hash": hash_benchmarks,
+    "serializable": serializable_benchmarks,
+    "file_cache": file_cache_benchmarks,
+    "transcript": transcript_benchmarks,
+}
+
+
+def time_loops(func: Callable[[], Any], loops: int) -> float:
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def measure(benchmark: Benchmark, repeat: int, min_time: float) -> Dict[str, Any]:
+    """Time a benchmark, returning the time per call (median and minimum of the repeats) and its throughput."""
+    if benchmark.setup is not None:
+        benchmark.setup()
+    benchmark.func()  # warm up
+
+    # like 'timeit.Timer.autorange': 1, 2, 5, 10, 20, 50, ... loops until a repeat takes long enough
+    loops = 1
+    for multiplier in (2, 2.5, 2) * 10:
+        if time_loops(benchmark.func, loops) >= min_time:
+            break
+        loops = int(loops * multiplier)
+
+    times = [time_loops(benchmark.func, loops) / loops for _ in range(repeat)]
+    median = statistics.median(times)
+    result: Dict[str, Any] = {
+        "median_s": median,
+        "min_s": min(times),
+        # relative spread of the repeats, used to tell noise from changes when comparing runs
+        "spread": (max(times) - min(times)) / median if median else 0.0,
+        "loops": loops,
+        "repeat": repeat
+    }
+    if benchmark.bytes:
+        result["mb_per_second"] = benchmark.bytes / (1024 * 1024) / median
+    if benchmark.items:
+        result["items_per_second"] = benchmark.items / median
+    return result
+
+
+def time_str(seconds: float) -> str:
+    for unit, multiplier in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= multiplier:
+            return f"{seconds / multiplier:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def compare(results: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Print the change in the median time of each benchmark since a previous run, marking those beyond the noise."""
+    print(f"\nCompared with: {previous.get('started_at', 'previous run')}")
+    if previous.get("python") != results["python"] or previous.get("platform") != results["platform"]:
+        print("WARNING: the previous run used a different interpreter/platform, so the results may not be comparable.")
+    print(f"{'benchmark':<44} {'previous':>11} {'current':>11} {'change':>9}")
+    for name, current in results["benchmarks"].items():
+        before = previous.get("benchmarks", {}).get(name)
+        if not before:
+            continue
+        change = (current["median_s"] - before["median_s"]) / before["median_s"]
+        noise = max(NOISE_THRESHOLD, current["spread"], before["spread"])
+        marker = "" if abs(change) <= noise else (" faster" if change < 0 else " SLOWER")
+        print(f"{name:<44} {time_str(before['median_s']):>11} {time_str(current['median_s']):>11} {change * 100:>+8.1f}%{marker}")
+
+
+@click.command()
+@click.option("-g", "--groups", "group_names", default=",".join(GROUPS), help="Comma separated groups of benchmarks to run.")
+@click.option("-f", "--filter", "name_filter", default="*", help="Only run benchmarks whose name matches this pattern (ex: 'hash.XXH*').")
+@click.option("-r", "--repeat", type=click.IntRange(min=1), default=5, help="Number of times each benchmark is timed.")
+@click.option("-mt", "--min_time", type=click.FloatRange(min=0), default=0.2, help="Minimum duration of each repeat (seconds).")
+@click.option("-q", "--quick", is_flag=True, default=False, help="Use smaller fixtures (skips the largest files/caches/transcripts).")
+@click.option("-o", "--output", type=click.Path(dir_okay=False, path_type=Path), default=None, help="File the results are saved to. [Default: micro-<timestamp>.json]")
+@click.option("-c", "--compare", "compare_path", type=click.Path(exists=True, dir_okay=False, path_type=Path), default=None, help="Results of a previous run to compare with.")
+def main(group_names: str, name_filter: str, repeat: int, min_time: float, quick: bool, output: Optional[Path], compare_path: Optional[Path]):
+    names = [name.strip() for name in group_names.split(",") if name.strip()]
+    unknown = [name for name in names if name not in GROUPS]
+    if unknown:
+        raise click.BadParameter(f"Unknown group(s): {', '.join(unknown)}", param_hint="--groups")
+
+    results: Dict[str, Any] = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "benchmarks": {}
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # NOTE: settings (and the legacy file cache) are saved in the temporary directory, see 'create_settings'
+        create_settings(temp_dir)
+        print(f"{'benchmark':<44} {'time':>11} {'spread':>8} {'MB/s':>10} {'items/s':>12}")
+        for group in names:
+            fixtures = Path(temp_dir) / "fixtures" / group
+            fixtures.mkdir(parents=True)
+            for benchmark in GROUPS[group](fixtures, quick):
+                if not fnmatch.fnmatchcase(benchmark.name, name_filter):
+                    continue
+                result = measure(benchmark, repeat, min_time)
+                results["benchmarks"][benchmark.name] = result
+                mb_per_second = f"{result['mb_per_second']:.1f}" if "mb_per_second" in result else "-"
+                items_per_second = f"{result['items_per_second']:.0f}" if "items_per_second" in result else "-"
+                print(f"{benchmark.name:<44} {time_str(result['median_s']):>11} {result['spread'] * 100:>7.1f}% "
+                      f"{mb_per_second:>10} {items_per_second:>12}", flush=True)
+
+    output = output or Path(f"micro-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.write_text(json.dumps(results, indent=4))
+    print(f"\nResults saved to: {output}")
+
+    if compare_path is not None:
+        compare(results, json.loads(compare_path.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures how long each summawise command takes to start, and checks that it doesn't import heavy dependencies it doesn't use.
+Times are the median wall time of running the command in a new interpreter, minus the time taken to start a bare interpreter.
+
+Usage: python benchmarks/startup.py [--runs N]
+Exits with a non-zero status if any command exceeds its budget.
+"""
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import click
+from typing import Dict, List, Set, Tuple
+from common import create_settings, temp_env
+
+# maximum startup time (milliseconds, excluding interpreter startup) of each command
+BUDGETS: Dict[Tuple[str, ...], float] = {
+    ("--help",): 100,
+    ("--version",): 100,
+    ("assistant", "list"): 100,
+    ("assistant", "delete", "missing"): 100,
+    ("thread", "list"): 100,
+    ("thread", "delete", "missing"): 100,
+    ("scan", "--help"): 100,
+    ("batch", "--help"): 100,
+}
+
+# dependencies which are slow to import, and should only be imported by commands which use them
+HEAVY_MODULES = frozenset({
+    "openai", "prompt_toolkit", "pygments", "whats_that_code",
+    "youtube_transcript_api", "chardet", "requests"
+})
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+\d+ \|(\s+)(\S+)$")
+
+
+def run(args: List[str], env: Dict[str, str]) -> Tuple[float, str]:
+    start = time.perf_counter()
+    result = subprocess.run(args, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"'{' '.join(args)}' failed ({result.returncode}):\n{result.stderr}")
+    return elapsed * 1000, result.stderr
+
+
+def median_time(args: List[str], env: Dict[str, str], runs: int) -> float:
+    return statistics.median(run(args, env)[0] for _ in range(runs))
+
+
+def heavy_imports(command: Tuple[str, ...], env: Dict[str, str]) -> Set[str]:
+    """The heavy dependencies imported by a command (top level packages only)."""
+    _, stderr = run([sys.executable, "-X", "importtime", "-m", "summawise", *command], env)
+    imported: Set[str] = set()
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            imported.add(match.group(2).split(".")[0])
+    return imported & HEAVY_MODULES
+
+
+@click.command()
+@click.option("-r", "--runs", type=click.IntRange(min=1), default=10, help="Number of times each command is run.")
+def main(runs: int):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        create_settings(temp_dir)
+        env = temp_env(temp_dir)
+
+        baseline = median_time([sys.executable, "-c", "pass"], env, runs)
+        print(f"Interpreter startup: {baseline:.1f} ms\n")
+        print(f"{'command':<32} {'time':>10} {'budget':>10}  result")
+
+        failed = 0
+        for command, budget in BUDGETS.items():
+            elapsed = median_time([sys.executable, "-m", "summawise", *command], env, runs) - baseline
+            heavy = heavy_imports(command, env)
+            ok = elapsed <= budget and not heavy
+            failed += not ok
+            result = "ok" if ok else "FAIL"
+            if heavy:
+                result += f" (imported {', '.join(sorted(heavy))})"
+            print(f"{' '.join(command):<32} {elapsed:>7.1f} ms {budget:>7.0f} ms  {result}")
+
+    if failed:
+        print(f"\n{failed} command(s) exceeded their startup budget.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
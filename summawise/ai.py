@@ -1,10 +1,16 @@
-import json
+import asyncio
+import contextlib
+import contextvars
+import signal
 import textwrap
+import threading
+import time
+from concurrent.futures import Future
 from typing_extensions import override
-from typing import List, Optional, NamedTuple, Dict, Set
+from typing import Any, Awaitable, Coroutine, List, Optional, NamedTuple, Dict, Set, Iterable, Iterator, Union, Tuple, BinaryIO, TypeVar
 from pathlib import Path
 from dataclasses import dataclass, field
-from openai import OpenAI, AssistantEventHandler
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, AsyncAssistantEventHandler, RateLimitError, APIConnectionError, InternalServerError, NotFoundError
 from openai.types.file_object import FileObject
 from openai.types.beta import Thread, Assistant, VectorStore
 from openai.types.beta.threads import TextContentBlock, TextDelta, Message, Text
@@ -12,20 +18,78 @@ from openai.types.beta.threads.runs import ToolCall, ToolCallDelta
 from openai.types.beta.thread_create_params import ToolResources, Message as TCPMessage
 from prompt_toolkit import ANSI, HTML, print_formatted_text as print
 from pygments.formatters import Terminal256Formatter
-from summawise.files.cache import FileCacheObj
-from summawise.files import utils as FileUtils
+from summawise.files.cache import FileCacheDB
+from summawise.files.ingest import IngestResult
+from summawise.files.contents import FileContents
+from summawise.files.packing import PackResult, pack_file_contents
+from summawise.files.merkle import file_set_key
+from summawise.files.encodings import Encoding
+from summawise.data import HashAlg
+from summawise.files import dirstate
 from summawise.settings import Settings
-from summawise import utils
+from summawise import profiling, utils
 
-Client: OpenAI
-FileCache: FileCacheObj
+
+T = TypeVar("T")
+
+
+class _DeferredClient:
+    """Takes the place of a client until it's first used, then initializes it with the API key from settings (see 'init')."""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, name: str) -> Any:
+        settings = Settings()  # type: ignore
+        init(settings.api_key, verify=False, base_url=settings.base_url or None)
+        return getattr(globals()[self._name], name)
+
+
+Client: OpenAI = _DeferredClient("Client")  # type: ignore
+# used by the async functions in this module, the sync functions are wrappers around them (see 'run')
+AsyncClient: AsyncOpenAI = _DeferredClient("AsyncClient")  # type: ignore
+FileCache: FileCacheDB
+
+# event loop shared by every coroutine run from sync code, so 'AsyncClient' can reuse its connections between calls (see 'run')
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+# contents of a file which is uploaded from memory or a stream, rather than from disk
+UploadData = Union[bytes, BinaryIO]
+
+# maximum number of files uploaded at once, unless the 'workers' setting is configured (see 'upload_workers')
+UPLOAD_WORKERS = 8
+# initial uploads per second if the 'upload_rate' setting is 0, the rate is reduced from there if uploads are rate limited
+UPLOAD_RATE_MAX = 100.0
+# lowest an adaptive upload rate is reduced to
+UPLOAD_RATE_MIN = 1.0
+# number of attempts made to upload a file before giving up (in the event of rate limiting, connection errors, etc.)
+UPLOAD_MAX_ATTEMPTS = 5
+
+# seconds before the set of file ids known to exist remotely is refreshed (cached file ids are checked against it)
+FILES_ALIVE_TTL = 60 * 60
+# number of files requested per page when listing every remote file
+FILES_LIST_PAGE_SIZE = 10000
+
+# how files are chunked when they're added to a vector store (part of the key used to reuse vector stores, see 'find_vector_store')
+VECTOR_STORE_CHUNKING_STRATEGY: Dict[str, Any] = {"type": "auto"}
+
+# maximum number of file ids which can be attached to a vector store in a single request
+VECTOR_STORE_BATCH_SIZE = 500
+
+# maximum number of messages which can be included in the request creating a thread (the rest are appended afterwards)
+THREAD_CREATE_MAX_MESSAGES = 32
+
+# shared between all upload workers, limits the number of upload requests per second (created from the settings, see 'upload_limiter')
+_upload_limiter: Optional[utils.TokenBucket] = None
+_upload_limiter_lock = threading.Lock()
 
 
 @dataclass
 class Resources:
     vector_store_ids: List[str] = field(default_factory=list)
     file_ids: List[str] = field(default_factory=list)
-    file_contents: Dict[Path, str] = field(default_factory=dict)
+    file_contents: FileContents = field(default_factory=FileContents)
 
     @property
     def vector_store_id(self):
@@ -37,7 +101,7 @@ class Resources:
         return self.vector_store_ids[0]
 
 
-class EventHandler(AssistantEventHandler):
+class EventHandler(AsyncAssistantEventHandler):
 
     auto_print: bool
     response_text: str
@@ -48,6 +112,9 @@ class EventHandler(AssistantEventHandler):
     def __init__(self, auto_print: bool = False):
         self.auto_print = auto_print
         self.response_text = ""
+        # used to measure the time until the first token of the response is received (see 'profiling')
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
 
         self._tool_calls = dict()
         self._completed_tool_calls = set()
@@ -55,19 +122,21 @@ class EventHandler(AssistantEventHandler):
         super().__init__()
 
     @override
-    def on_text_created(self, text: Text) -> None:
+    async def on_text_created(self, text: Text) -> None:
         _ = text
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
         if self.auto_print:
             print("\nsummawise > ", end="", flush=True)
 
     @override
-    def on_text_delta(self, delta: TextDelta, snapshot: Text) -> None:
+    async def on_text_delta(self, delta: TextDelta, snapshot: Text) -> None:
         _ = snapshot
         if self.auto_print:
             print(delta.value, end="", flush=True)
 
     @override
-    def on_message_done(self, message: Message) -> None:
+    async def on_message_done(self, message: Message) -> None:
         print(flush=True)  # new line
         for content in message.content:
             # other possibilities: ImageFileContentBlock, ImageURLContentBlock
@@ -75,7 +144,7 @@ class EventHandler(AssistantEventHandler):
                 self.response_text += content.text.value
 
     @override
-    def on_tool_call_created(self, tool_call: ToolCall):
+    async def on_tool_call_created(self, tool_call: ToolCall):
         if self.tool_call_completed(tool_call):
             return
 
@@ -85,7 +154,7 @@ class EventHandler(AssistantEventHandler):
                 f"Tool call created: <b><ansiblue>{tool_call.type}</ansiblue> <i>[ID: {tool_call.id}]</i></b>"), flush=True)
 
     @override
-    def on_tool_call_delta(self, delta: ToolCallDelta, snapshot: ToolCall) -> None:
+    async def on_tool_call_delta(self, delta: ToolCallDelta, snapshot: ToolCall) -> None:
         if self.tool_call_completed(snapshot):
             return
 
@@ -94,7 +163,7 @@ class EventHandler(AssistantEventHandler):
                 print(delta.code_interpreter.input or "", end="", flush=True)
 
     @override
-    def on_tool_call_done(self, tool_call: ToolCall) -> None:
+    async def on_tool_call_done(self, tool_call: ToolCall) -> None:
         if self.tool_call_completed(tool_call, True):
             return
 
@@ -150,13 +219,15 @@ class EventHandler(AssistantEventHandler):
         print(ANSI(highlighted_code), end="", flush=True)
 
 
-def init(api_key: str, verify: bool = True):
+def init(api_key: str, verify: bool = True, base_url: Optional[str] = None):
     """
     Initializes the OpenAI client with the provided API key.
 
     Parameters:
         api_key (str): The API key to initialize the OpenAI API client with.
         verify (bool): Verify the API key by making a test request to the API. Default is True.
+        base_url (Optional[str]): The URL of the API (ex: a proxy, or a local server for benchmarks).
+            Defaults to the OpenAI API, or the 'OPENAI_BASE_URL' environment variable if it's set.
 
     Raises:
         ValueError: If the API key is not provided or is not a string.
@@ -165,67 +236,529 @@ def init(api_key: str, verify: bool = True):
     if not api_key or not isinstance(api_key, str):
         raise ValueError("API key must be a non-empty string.")
 
-    global Client
-    if "Client" in globals():
-        if Client.api_key == api_key:
-            return
-
-    Client = OpenAI(api_key=api_key)
+    global Client, AsyncClient
+    if isinstance(Client, OpenAI) and Client.api_key == api_key and (
+        base_url is None or str(Client.base_url).rstrip("/") == base_url.rstrip("/")
+    ):
+        return
+
+    # requests are counted by the span they're made in, while profiling is enabled (see 'profiling.http_event_hooks')
+    Client = OpenAI(api_key=api_key, base_url=base_url, http_client=DefaultHttpxClient(
+        event_hooks=profiling.http_event_hooks()))
+    AsyncClient = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=DefaultAsyncHttpxClient(
+        event_hooks=profiling.async_http_event_hooks()))
     if verify:
         Client.models.list()
 
 
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """The event loop which runs every coroutine started from sync code, in a background thread (started when first needed)."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+
+            def run_forever():
+                asyncio.set_event_loop(loop)
+                loop.run_forever()
+
+            threading.Thread(target=run_forever, name="summawise-event-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine from sync code, and return its result (the sync functions in this module are thin wrappers around async ones).
+    Ctrl-C cancels the coroutine rather than interrupting whatever it's doing, so in-flight requests (uploads, runs, etc.) are
+    cancelled cleanly before KeyboardInterrupt is raised.
+    This can be called from any thread, coroutines from every thread share one event loop (and the connections of 'AsyncClient').
+    """
+    loop = _event_loop()
+    started: "Future[asyncio.Task[T]]" = Future()
+    done = threading.Event()
+    # the task runs in a copy of the caller's context, so context variables (ex: the current profiling span) carry over
+    context = contextvars.copy_context()
+
+    def start():
+        task = context.run(loop.create_task, coro)
+        task.add_done_callback(lambda _: done.set())
+        started.set_result(task)
+
+    loop.call_soon_threadsafe(start)
+    task = started.result()
+    interrupted = False
+
+    def interrupt(signum: int, frame: Any) -> None:
+        nonlocal interrupted
+        interrupted = True
+        loop.call_soon_threadsafe(task.cancel)
+
+    # NOTE: signal handlers can only be set from the main thread, elsewhere Ctrl-C isn't delivered anyway
+    main_thread = threading.current_thread() is threading.main_thread()
+    previous = signal.signal(signal.SIGINT, interrupt) if main_thread else None
+    try:
+        # NOTE: waits in short intervals, since waiting indefinitely can't be interrupted by signals on every platform
+        while not done.wait(0.1):
+            pass
+    finally:
+        if main_thread:
+            signal.signal(signal.SIGINT, previous or signal.default_int_handler)
+    if interrupted:
+        raise KeyboardInterrupt
+    return task.result()
+
+
+async def gather(*aws: Awaitable[Any], return_exceptions: bool = False) -> List[Any]:
+    """
+    Like 'asyncio.gather', but as a coroutine so it can be passed to 'run'.
+    NOTE: 'asyncio.gather' called outside a coroutine binds its future to the default event loop rather than the one used by 'run'.
+    """
+    return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+
+
+async def cancel_tasks(tasks: Iterable["asyncio.Future[Any]"]) -> None:
+    """Cancel tasks and wait for them to finish (used to clean up when a coroutine fails or is cancelled)."""
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
 class FileInfo(NamedTuple):
     hash: str
     file_id: str
     cached: bool = False
+    path: Optional[Path] = None
+    encoding: Optional[Encoding] = None
+    data: Optional[bytes] = None  # only set for files which exist in memory (see 'IngestResult.in_memory')
 
 
-def create_file(file_path: Path) -> FileObject:
-    with open(file_path, 'rb') as file:
-        file_response = Client.files.create(file=file, purpose="assistants")
+def create_file(file: Union[Path, Tuple[str, UploadData]]) -> FileObject:
+    """Upload a file from disk, or from memory/a stream as a (filename, bytes | file-like) tuple."""
+    if isinstance(file, tuple):
+        return Client.files.create(file=file, purpose="assistants")
+    with open(file, 'rb') as f:
+        file_response = Client.files.create(file=f, purpose="assistants")
         return file_response
 
 
-def get_file_infos(files: List[Path]) -> List[FileInfo]:
+def upload_workers() -> int:
+    """The number of files uploaded at once: the 'workers' setting if it's configured, otherwise 'UPLOAD_WORKERS'."""
+    settings = Settings()  # type: ignore
+    return settings.workers if settings.workers > 0 else UPLOAD_WORKERS
+
+
+def upload_limiter() -> utils.TokenBucket:
+    """
+    The rate limiter shared between all uploads. If the 'upload_rate' setting is positive, uploads are limited to that rate.
+    Otherwise the rate starts at 'UPLOAD_RATE_MAX', and adapts to rate limiting (it's halved on each 429, and recovers as uploads succeed).
+    """
+    global _upload_limiter
+    with _upload_limiter_lock:
+        if _upload_limiter is None:
+            settings = Settings()  # type: ignore
+            if settings.upload_rate > 0:
+                _upload_limiter = utils.TokenBucket(rate=settings.upload_rate, capacity=upload_workers())
+            else:
+                _upload_limiter = utils.TokenBucket(rate=UPLOAD_RATE_MAX, capacity=upload_workers(), min_rate=UPLOAD_RATE_MIN)
+        return _upload_limiter
+
+
+async def upload_file_async(
+    file_path: Path,
+    data: Optional[UploadData] = None,
+    max_attempts: int = UPLOAD_MAX_ATTEMPTS,
+    name: Optional[str] = None
+) -> FileObject:
+    """
+    Upload a file, waiting on the shared rate limiter before each attempt.
+    If the contents of the file have already been read (or it only exists in memory), they can be provided via 'data' as bytes
+    or a file-like object, so the file isn't read again. The file is uploaded as 'name' if provided (ex: to change its extension).
+    Rate limited requests (429) pause every upload for the duration requested by the 'Retry-After' header.
+    Connection/server errors are retried with jittered exponential backoff.
+    """
+    # NOTE: retries are handled here (rather than by the client) so they're coordinated with the shared limiter
+    client = AsyncClient.with_options(max_retries=0)
+    limiter = upload_limiter()
+    name = name or file_path.name
+    # file-like objects are rewound before each attempt
+    start = data.tell() if data is not None and not isinstance(data, bytes) else 0
+    with profiling.span("upload", files=1) as span:
+        if isinstance(data, bytes):
+            span.add(bytes=len(data))
+        elif profiling.is_enabled() and file_path.exists():
+            span.add(bytes=file_path.stat().st_size)
+        for attempt in range(max_attempts):
+            await limiter.acquire_async()
+            try:
+                if data is not None:
+                    if not isinstance(data, bytes):
+                        data.seek(start)
+                    file_obj = await client.files.create(file=(name, data), purpose="assistants")
+                else:
+                    with open(file_path, 'rb') as file:
+                        file_obj = await client.files.create(file=(name, file), purpose="assistants")
+                limiter.succeeded()
+                return file_obj
+            except RateLimitError as ex:
+                if attempt == max_attempts - 1:
+                    raise
+                profiling.count(retries=1)
+                delay = utils.retry_after_seconds(ex.response.headers)
+                limiter.pause(
+                    delay if delay is not None else utils.backoff_delay(attempt))
+            except (APIConnectionError, InternalServerError):
+                if attempt == max_attempts - 1:
+                    raise
+                profiling.count(retries=1)
+                await asyncio.sleep(utils.backoff_delay(attempt))
+    raise RuntimeError(f"Failed to upload file: {file_path}")
+
+
+def upload_file(
+    file_path: Path,
+    data: Optional[UploadData] = None,
+    max_attempts: int = UPLOAD_MAX_ATTEMPTS,
+    name: Optional[str] = None
+) -> FileObject:
+    return run(upload_file_async(file_path, data, max_attempts, name))
+
+
+async def list_file_ids_async(purpose: str = "assistants") -> List[str]:
+    """List the id of every remote file (which hasn't failed processing), requesting them in large pages."""
+    file_ids: List[str] = []
+    seen: Set[str] = set()
+    after: Optional[str] = None
+    while True:
+        query: Dict[str, object] = {"limit": FILES_LIST_PAGE_SIZE}
+        if after is not None:
+            query["after"] = after
+        page = await AsyncClient.files.list(purpose=purpose, extra_query=query)
+        new_files = [file for file in page.data if file.id not in seen]
+        for file in new_files:
+            seen.add(file.id)
+            if file.status != "error":
+                file_ids.append(file.id)
+        # NOTE: stop if a page isn't full, or if pagination isn't supported (the same files are returned again)
+        if len(page.data) < FILES_LIST_PAGE_SIZE or not new_files:
+            break
+        after = page.data[-1].id
+    return file_ids
+
+
+def list_file_ids(purpose: str = "assistants") -> List[str]:
+    return run(list_file_ids_async(purpose))
+
+
+async def refresh_alive_file_ids_async(force: bool = False) -> bool:
+    """
+    Refresh the set of file ids known to exist remotely (see 'FileCacheDB.refresh_alive'), if it's older than 'FILES_ALIVE_TTL'.
+    Returns True if the set is up to date, or False if it couldn't be refreshed (in which case cached file ids are trusted).
+    """
+    refreshed_at = FileCache.alive_refreshed_at()
+    if not force and refreshed_at is not None and time.time() - refreshed_at < FILES_ALIVE_TTL:
+        return True
+    started_at = time.time()
+    try:
+        with profiling.span("files.list") as span:
+            file_ids = await list_file_ids_async()
+            span.add(files=len(file_ids))
+    except (APIConnectionError, InternalServerError, RateLimitError):
+        return False
+    FileCache.refresh_alive(file_ids, started_at)
+    return True
+
+
+def refresh_alive_file_ids(force: bool = False) -> bool:
+    return run(refresh_alive_file_ids_async(force))
+
+
+class _PendingFile(NamedTuple):
+    info: FileInfo  # 'file_id' is set if the file is cached
+    data: Optional[UploadData] = None
+    name: Optional[str] = None
+
+
+def _next_file(files: Iterator[Union[Path, IngestResult]]) -> Optional[_PendingFile]:
+    """Get the next file to upload, its hash, and its cached file id (if any). Returns 'None' once there are no more files."""
+    item = next(files, None)
+    if item is None:
+        return None
+
+    data, encoding, name, memory_data = None, None, None, None
+    legacy_hashes: List[Tuple[HashAlg, str]] = []
+    if isinstance(item, IngestResult):
+        file_path, hash = item.path, item.hash
+        data, encoding, name = item.data, item.encoding, item.upload_name
+        # contents of in-memory files are kept, since there's nothing to read them from later
+        memory_data = item.data if item.in_memory else None
+        legacy_hashes.extend(item.legacy_hashes)
+    else:
+        file_path = item
+        hash = dirstate.get().hash_file(file_path)
+    assert isinstance(hash, str), \
+        "Calculated hash should be of type 'str'. Ensure the 'intdigest' parameter is set to false."
+
+    # files cached under a previous hash algorithm are found by their legacy hash, calculated while they were read (see 'ingest_files'),
+    # or the hash the dirstate recorded for them with it if they weren't read (if any)
+    legacy_hash = None if legacy_hashes or memory_data is not None else dirstate.get().legacy_hash(file_path)
+    if legacy_hash is not None:
+        legacy_hashes.append(legacy_hash)
+    file_id = FileCache.get_file_id_by_hash(hash, legacy_hashes)
+    info = FileInfo(hash, file_id or "", file_id is not None,
+                    file_path, encoding, memory_data)
+    return _PendingFile(info, data, name)
+
+
+async def get_file_infos_async(files: Iterable[Union[Path, IngestResult]], workers: Optional[int] = None) -> List[FileInfo]:
+    """
+    Get the OpenAI file id of each file, uploading those which aren't already cached.
+    Files can be provided as an 'IngestResult' (see 'files.ingest') if their hash has already been calculated.
+    The iterable is consumed in a worker thread (it may be hashing files lazily), while uploads run concurrently in the event loop.
+    Each file id is saved to the file cache as soon as its upload completes.
+    Cached file ids which no longer exist remotely (deleted/expired) are evicted from the cache, and the files are uploaded again.
+    Remote file ids are listed alongside hashing/uploading, when the first cached file is found.
+    """
+    loop = asyncio.get_event_loop()
     file_infos: List[FileInfo] = []
-    for file_path in files:
-
-        hash = utils.calculate_hash(file_path)
-        assert isinstance(hash, str), \
-            "Calculated hash should be of type 'str'. Ensure the 'intdigest' parameter is set to false."
-
-        file_id = FileCache.get_file_id_by_hash(hash)
-        if file_id is None:
-            # not cached, upload new file
-            file = create_file(file_path)
-            info = FileInfo(hash, file.id,)
-            file_infos.append(info)
-            FileCache.set_hash_file_id(hash, file.id)
-        else:
-            # use cached file id
-            info = FileInfo(hash, file_id, True)
-            file_infos.append(info)
-
-    FileCache.save()
+    uploads: Dict["asyncio.Task[FileObject]", FileInfo] = {}
+    # cached files, which are validated once the set of remote file ids has been refreshed
+    unverified: List[_PendingFile] = []
+    alive_task: Optional["asyncio.Task[bool]"] = None
+    workers = workers or upload_workers()
+    semaphore = asyncio.Semaphore(workers)
+    cached_count = uploaded_count = expired_count = 0
+
+    def show_progress(done: bool = False):
+        expired = f", {expired_count} no longer exist remotely" if expired_count else ""
+        utils.print_progress(
+            f"Uploaded {uploaded_count}/{uploaded_count + len(uploads)} file(s), {cached_count} already cached{expired}.", done)
+
+    async def upload(pending: _PendingFile) -> FileObject:
+        async with semaphore:
+            assert pending.info.path is not None
+            return await upload_file_async(pending.info.path, pending.data, name=pending.name)
+
+    def start_upload(pending: _PendingFile):
+        task = loop.create_task(upload(pending))
+        uploads[task] = pending.info
+        show_progress()
+
+    def complete(tasks: Iterable["asyncio.Task[FileObject]"]):
+        nonlocal uploaded_count
+        completed: List[Tuple[str, str]] = []
+        try:
+            for task in tasks:
+                info = uploads.pop(task)
+                file = task.result()
+                info = info._replace(file_id=file.id)
+                file_infos.append(info)
+                completed.append((info.hash, file.id))
+                uploaded_count += 1
+                show_progress()
+        finally:
+            # uploads which finished together are recorded in a single transaction
+            FileCache.set_many(completed)
+            FileCache.mark_alive(file_id for _, file_id in completed)
+
+    async def wait_uploads():
+        done, _ = await asyncio.wait(list(uploads), return_when=asyncio.FIRST_COMPLETED)
+        complete(done)
+
+    iterator = iter(files)
+    try:
+        while True:
+            # NOTE: hashing (and the cache lookup) runs in a worker thread, so it doesn't hold up uploads which are in progress
+            pending = await loop.run_in_executor(None, _next_file, iterator)
+            if pending is None:
+                break
+
+            if pending.info.cached:
+                if alive_task is None:
+                    alive_task = loop.create_task(refresh_alive_file_ids_async())
+                # NOTE: contents aren't kept while the rest of the files are walked, a file which has expired is read again
+                # (files which only exist in memory keep their contents in 'FileInfo.data')
+                unverified.append(pending._replace(data=None))
+                cached_count += 1
+            else:
+                start_upload(pending)
+
+            # record uploads which have finished, and apply backpressure if too many are queued
+            complete([task for task in uploads if task.done()])
+            if len(uploads) >= workers * 4:
+                await wait_uploads()
+
+        validate = await alive_task if alive_task is not None else False
+        for pending in unverified:
+            info = pending.info
+            if validate and not FileCache.is_alive(info.file_id):
+                FileCache.evict(info.hash)
+                cached_count -= 1
+                expired_count += 1
+                start_upload(pending._replace(info=info._replace(file_id="", cached=False), data=info.data))
+            else:
+                file_infos.append(info)
+
+        while uploads:
+            await wait_uploads()
+    except BaseException:
+        # cancelled (ex: Ctrl-C) or an upload failed, in-flight uploads are cancelled
+        await cancel_tasks(list(uploads) + ([alive_task] if alive_task else []))
+        raise
+    finally:
+        if uploaded_count or uploads:
+            show_progress(done=True)
+
+    return file_infos
+
+
+def get_file_infos(files: Iterable[Union[Path, IngestResult]], workers: Optional[int] = None) -> List[FileInfo]:
+    with profiling.span("get_file_infos") as span:
+        file_infos = run(get_file_infos_async(files, workers))
+        span.add(files=len(file_infos), cached=sum(1 for info in file_infos if info.cached))
     return file_infos
 
 
+async def create_vector_store_from_file_ids_async(name: str, file_ids: List[str]) -> VectorStore:
+    initial_ids = file_ids[:VECTOR_STORE_BATCH_SIZE]
+    with profiling.span("vector_store.create", files=len(initial_ids)):
+        vector_store = await AsyncClient.beta.vector_stores.create(
+            name=name,
+            file_ids=initial_ids,
+            chunking_strategy=VECTOR_STORE_CHUNKING_STRATEGY  # type: ignore
+        )
+    await add_vector_store_files_async(vector_store.id, file_ids[len(initial_ids):])
+    return vector_store
+
+
 def create_vector_store_from_file_ids(name: str, file_ids: List[str]) -> VectorStore:
-    return Client.beta.vector_stores.create(name=name, file_ids=file_ids)
+    return run(create_vector_store_from_file_ids_async(name, file_ids))
+
+
+async def get_vector_store_async(id: str) -> Optional[VectorStore]:
+    """Retrieve a vector store. Returns 'None' if it doesn't exist or has expired."""
+    try:
+        with profiling.span("vector_store.retrieve"):
+            vector_store = await AsyncClient.beta.vector_stores.retrieve(id)
+    except NotFoundError:
+        return None
+    return vector_store if vector_store.status != "expired" else None
+
+
+def get_vector_store(id: str) -> Optional[VectorStore]:
+    return run(get_vector_store_async(id))
+
+
+def vector_store_key(files: Iterable[Tuple[str, str]]) -> str:
+    """The key of a vector store containing the given files (path, content hash), including the chunking strategy used."""
+    return file_set_key(files, {"chunking_strategy": VECTOR_STORE_CHUNKING_STRATEGY})
+
+
+async def find_vector_store_async(key: str) -> Optional[VectorStore]:
+    """
+    Find an existing vector store containing an identical set of files (see 'vector_store_key').
+    Its status is checked before it's reused, and it's forgotten if it no longer exists or has expired.
+    A vector store which is reused is marked as shared, so the scan it was created by no longer modifies it.
+    """
+    vector_store_id = FileCache.get_vector_store_id(key)
+    if vector_store_id is None:
+        return None
+    vector_store = await get_vector_store_async(vector_store_id)
+    if vector_store is None:
+        FileCache.evict_vector_store(vector_store_id)
+    else:
+        FileCache.mark_vector_store_shared(vector_store_id)
+    return vector_store
+
+
+def find_vector_store(key: str) -> Optional[VectorStore]:
+    return run(find_vector_store_async(key))
+
+
+async def add_vector_store_files_async(vector_store_id: str, file_ids: List[str]) -> None:
+    """Attach files to a vector store, the batches are created concurrently."""
+    if not file_ids:
+        return
+    with profiling.span("vector_store.add_files", files=len(file_ids)):
+        await asyncio.gather(*(
+            AsyncClient.beta.vector_stores.file_batches.create(
+                vector_store_id,
+                file_ids=file_ids[idx:idx + VECTOR_STORE_BATCH_SIZE],
+                chunking_strategy=VECTOR_STORE_CHUNKING_STRATEGY  # type: ignore
+            )
+            for idx in range(0, len(file_ids), VECTOR_STORE_BATCH_SIZE)
+        ))
+
+
+def add_vector_store_files(vector_store_id: str, file_ids: List[str]) -> None:
+    run(add_vector_store_files_async(vector_store_id, file_ids))
+
+
+async def remove_vector_store_files_async(vector_store_id: str, file_ids: List[str]) -> None:
+    semaphore = asyncio.Semaphore(upload_workers())
+
+    async def remove(file_id: str):
+        async with semaphore:
+            try:
+                await AsyncClient.beta.vector_stores.files.delete(
+                    file_id, vector_store_id=vector_store_id)
+            except NotFoundError:
+                pass
+
+    if not file_ids:
+        return
+    # there is no batch endpoint for removing files, so requests are sent concurrently
+    with profiling.span("vector_store.remove_files", files=len(file_ids)):
+        await asyncio.gather(*(remove(file_id) for file_id in file_ids))
+
+
+def remove_vector_store_files(vector_store_id: str, file_ids: List[str]) -> None:
+    run(remove_vector_store_files_async(vector_store_id, file_ids))
+
+
+def create_resources(
+    vector_store_id: str,
+    file_infos: List[FileInfo],
+    file_contents: Optional[FileContents] = None
+) -> Resources:
+    """
+    Create a Resources object for a vector store from the files it contains.
+    File contents are provided lazily (see 'FileContents'), and are only read if they're sent in messages.
+    """
+    file_ids = [info.file_id for info in file_infos]
+    if file_contents is None:
+        file_contents = FileContents()
+        for info in file_infos:
+            if info.path:
+                file_contents.add(info.path, info.encoding, info.data)
+    return Resources([vector_store_id], file_ids, file_contents)
 
 
-def create_vector_store(name: str, file_paths: List[Path]) -> Resources:
-    print(f"Creating vector store with {len(file_paths)} file(s).", end=" ")
-    file_infos = get_file_infos(file_paths)
+async def create_vector_store_async(name: str, files: Iterable[Union[Path, IngestResult]]) -> Resources:
+    file_infos = await get_file_infos_async(files)
     file_ids = [info.file_id for info in file_infos]
-    file_contents = {fp: FileUtils.read_str(fp) for fp in file_paths}
+
+    # an identical set of files may already be in a vector store, in which case it's reused (files aren't embedded again)
+    key = vector_store_key(
+        (info.path.name if info.path else "", info.hash) for info in file_infos)
+    vector_store = await find_vector_store_async(key)
+    if vector_store is not None:
+        print(f"Reusing vector store with {len(file_infos)} identical file(s).")
+        return create_resources(vector_store.id, file_infos)
+
+    print(f"Creating vector store with {len(file_infos)} file(s).", end=" ")
 
     cached_count = sum(1 for info in file_infos if info.cached)
     print(f"[{cached_count} file(s) already cached]" if cached_count > 0 else "")
 
-    vector_store = create_vector_store_from_file_ids(name, file_ids)
-    return Resources([vector_store.id], file_ids, file_contents)
+    vector_store = await create_vector_store_from_file_ids_async(name, file_ids)
+    FileCache.set_vector_store_id(key, vector_store.id)
+    return create_resources(vector_store.id, file_infos)
+
+
+def create_vector_store(name: str, files: Iterable[Union[Path, IngestResult]]) -> Resources:
+    return run(create_vector_store_async(name, files))
 
 
 def create_assistant(
@@ -270,35 +803,34 @@ def get_thread(id: str) -> Thread:
     return Client.beta.threads.retrieve(id)
 
 
-def create_thread(resources: Resources, file_search: bool = False, code_interpreter: bool = False, send_messages: bool = False) -> Thread:
+async def create_thread_async(
+    resources: Resources,
+    file_search: bool = False,
+    code_interpreter: bool = False,
+    send_messages: bool = False
+) -> Thread:
     # https://platform.openai.com/docs/api-reference/threads/createThread#threads-createthread-tool_resources
 
     messages: List[TCPMessage] = []
+    packed: Optional[PackResult] = None
     if send_messages:
+        packed = pack_file_contents(resources.file_contents)
         msg = TCPMessage(
             role="user",
             content=textwrap.dedent(f"""
-            The following {len(resources.file_contents)} messages will contain a file path, and the contents of the file.
-            This information will be provided in the following json schema:
+            The following {len(packed.messages)} messages will contain the paths and contents of {packed.files} files.
+            Each message is a json array of objects in the following schema:
             {{
                 'path': "file path",
-                'contents': "file contents"
+                'part': "part number/total parts (only included if the file is split across several messages)",
+                'content': "file contents"
             }}
+            The content of a file which is split across messages is the parts joined together in order.
             This information will be used throughout the duration of the conversation.
         """))
         messages.append(msg)
-
-        for path, content in resources.file_contents.items():
-            content_obj = {
-                "path": str(path),
-                "content": content
-            }
-            content = json.dumps(content_obj)
-            if len(content) > 256000:
-                # print(f"Skipping content of file {path.name}, as it exceeds the maximum length.")
-                continue
-            msg = TCPMessage(content=content, role="user")
-            messages.append(msg)
+        messages.extend(TCPMessage(content=content, role="user")
+                        for content in packed.messages)
 
     tool_resources = ToolResources(
         file_search={"vector_store_ids": resources.vector_store_ids},
@@ -310,24 +842,100 @@ def create_thread(resources: Resources, file_search: bool = False, code_interpre
     if not code_interpreter and "code_interpreter" in tool_resources:
         del tool_resources["code_interpreter"]
 
-    return Client.beta.threads.create(messages=messages, tool_resources=tool_resources)
+    with profiling.span("thread.create", messages=len(messages)):
+        thread = await AsyncClient.beta.threads.create(
+            messages=messages[:THREAD_CREATE_MAX_MESSAGES], tool_resources=tool_resources)
 
+        # messages which didn't fit in the request are appended in order, since parts of split files must stay in sequence
+        try:
+            for msg in messages[THREAD_CREATE_MAX_MESSAGES:]:
+                await AsyncClient.beta.threads.messages.create(
+                    thread_id=thread.id, content=msg["content"], role=msg["role"])
+        except BaseException:
+            # an incomplete thread is never returned, so it's deleted rather than orphaned
+            await _discard_thread_async(thread.id)
+            raise
 
-def get_thread_response(thread_id: str, assistant_id: str, prompt: str, auto_print: bool = False) -> str:
-    Client.beta.threads.messages.create(
-        thread_id=thread_id, content=prompt, role="user")
+    if packed is not None:
+        print(packed.summary())
+    return thread
 
-    event_handler = EventHandler(auto_print=auto_print)
-    with Client.beta.threads.runs.stream(
-        thread_id=thread_id,
-        assistant_id=assistant_id,
-        event_handler=event_handler
-    ) as stream:
-        stream.until_done()
 
+def create_thread(resources: Resources, file_search: bool = False, code_interpreter: bool = False, send_messages: bool = False) -> Thread:
+    return run(create_thread_async(resources, file_search, code_interpreter, send_messages))
+
+
+async def _discard_thread_async(thread_id: str) -> None:
+    """Delete a thread which won't be used, ignoring failures (it's only cleanup)."""
+    with contextlib.suppress(Exception):
+        await AsyncClient.beta.threads.delete(thread_id)
+
+
+async def gather_with_thread(
+    aw: Awaitable[T],
+    thread_aw: Awaitable[Thread]
+) -> Tuple[Union[T, BaseException, None], Union[Thread, BaseException, None]]:
+    """
+    Run something (ex: waiting for a vector store to be ready) alongside the creation of a thread, and return both results like
+    'gather(..., return_exceptions=True)'. If either fails, the other is cancelled and its result is 'None': a thread which was
+    already created is deleted, so it isn't orphaned. The same cleanup happens if this is cancelled (ex: Ctrl-C).
+    """
+    tasks = (asyncio.ensure_future(aw), asyncio.ensure_future(thread_aw))
+
+    def failed(task: "asyncio.Future[Any]") -> bool:
+        return task.done() and (task.cancelled() or task.exception() is not None)
+
+    cleanup = True
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        cleanup = any(failed(task) for task in tasks)
+    finally:
+        if cleanup:
+            await cancel_tasks(task for task in tasks if not task.done())
+            thread_task = tasks[1]
+            if not failed(thread_task) and thread_task.done():
+                await _discard_thread_async(thread_task.result().id)
+
+    def outcome(task: "asyncio.Future[Any]", discarded: bool) -> Any:
+        if task.cancelled() or discarded:
+            return None
+        return task.exception() or task.result()
+
+    result, thread = tasks
+    return outcome(result, False), outcome(thread, cleanup and not failed(thread))
+
+
+async def get_thread_response_async(thread_id: str, assistant_id: str, prompt: str, auto_print: bool = False) -> str:
+    """
+    Add a message to a thread and stream the assistant's response, in a single request (the message is sent along with the run).
+    If this is cancelled, the run is cancelled as well (otherwise it would keep going, and messages can't be added to the thread until it ends).
+    """
+    event_handler = EventHandler(auto_print=auto_print)
+    try:
+        with profiling.span("run"):
+            async with AsyncClient.beta.threads.runs.stream(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                additional_messages=[{"role": "user", "content": prompt}],
+                event_handler=event_handler
+            ) as stream:
+                await stream.until_done()
+    except asyncio.CancelledError:
+        current_run = event_handler.current_run
+        if current_run is not None and current_run.status in ("queued", "in_progress", "requires_action"):
+            with contextlib.suppress(Exception):
+                await AsyncClient.beta.threads.runs.cancel(current_run.id, thread_id=thread_id)
+        raise
+
+    if event_handler.first_token_at is not None:
+        profiling.record("run.first_token", event_handler.started_at, event_handler.first_token_at)
     return event_handler.response_text
 
 
-def set_file_cache(file_cache: FileCacheObj):
+def get_thread_response(thread_id: str, assistant_id: str, prompt: str, auto_print: bool = False) -> str:
+    return run(get_thread_response_async(thread_id, assistant_id, prompt, auto_print))
+
+
+def set_file_cache(file_cache: FileCacheDB):
     global FileCache
     FileCache = file_cache
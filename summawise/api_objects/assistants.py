@@ -1,12 +1,15 @@
+import json
 import warnings
-from typing import Dict, List, Optional, TypeVar, NamedTuple, Iterable
+from typing import Dict, List, Optional, TypeVar, NamedTuple, Iterable, TYPE_CHECKING
 from datetime import datetime, timezone
 from dataclasses import dataclass, field
-from openai.types.beta import Assistant as APIAssistant
 from summawise import utils
 from summawise.data import HashAlg
 from summawise.api_objects.generic import ApiObjList, BaseApiObj
 
+if TYPE_CHECKING:
+    from openai.types.beta import Assistant as APIAssistant
+
 T = TypeVar('T')
 
 DEFAULT_MODEL = "gpt-3.5-turbo"
@@ -25,6 +28,8 @@ class Assistant(BaseApiObj):
     temperature: Optional[float] = None
     top_p: Optional[float] = None
     created_at: datetime = field(default_factory=utils.utc_now)
+    # hash of the definition the assistant was created from (see 'hash_definition'), used to detect changes to default assistants
+    definition_hash: str = ""
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, Assistant):
@@ -48,9 +53,16 @@ class Assistant(BaseApiObj):
             missing_field_warning("instructions")
 
     def to_create_params(self) -> dict:
-        return utils.asdict_exclude(self, {"id", "created_at"})
+        return utils.asdict_exclude(self, {"id", "created_at", "definition_hash"})
+
+    def hash_definition(self) -> str:
+        """Calculate a hash of every parameter the assistant is created with, so changes can be detected without any api requests."""
+        params = json.dumps(self.to_create_params(), sort_keys=True)
+        hash = HashAlg.XXH3_64.calculate(params)
+        assert isinstance(hash, str)
+        return hash
 
-    def apply_api_obj(self, obj: APIAssistant):
+    def apply_api_obj(self, obj: "APIAssistant"):
         """Use official library API object to apply/overwrite specific fields to this dataclass."""
         self.id = obj.id
         self.name = obj.name or ""
@@ -114,6 +126,12 @@ CodingAssistant: Assistant = Assistant(
     interpret_code=True
 )
 
+# used by assistants which don't have their own conversation init
+DEFAULT_CONVERSATION_INIT = ConversationInit(
+    "Generating summary of content...",
+    "Please identify what the provided content is and provide a summary."
+)
+
 CONVERSATION_INITS: Dict[Assistant, ConversationInit] = {
     TranscriptAnalyzer: ConversationInit(
         "Generating summary of transcript...",
@@ -1,10 +1,12 @@
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Iterable, Tuple
-from openai.types.beta import Thread as APIThread
-from summawise import utils, ai
+from typing import Iterable, Tuple, TYPE_CHECKING
+from summawise import utils
 from summawise.api_objects.generic import ApiObjList, BaseApiObj
 
+if TYPE_CHECKING:
+    from openai.types.beta import Thread as APIThread
+
 
 @dataclass
 class Thread(BaseApiObj):
@@ -13,7 +15,8 @@ class Thread(BaseApiObj):
     assistant: Tuple[str, str]  # name, id
     created_at: datetime = field(default_factory=utils.utc_now)
 
-    def get_api_obj(self) -> APIThread:
+    def get_api_obj(self) -> "APIThread":
+        from summawise import ai
         if not self.id:
             raise ValueError(
                 "Thread ID must be specified to retrieve API object.")
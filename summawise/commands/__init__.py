@@ -1,3 +1,10 @@
-from .scan import scan
-from .assistants import assistant
-from .threads import thread
+from typing import Dict
+
+# maps each command to the module which defines it (see 'main.LazyGroup')
+# NOTE: modules are only imported when a command is used, since some of them depend on packages which are slow to import
+COMMANDS: Dict[str, str] = {
+    "scan": "summawise.commands.scan",
+    "batch": "summawise.commands.batch",
+    "assistant": "summawise.commands.assistants",
+    "thread": "summawise.commands.threads",
+}
@@ -1,7 +1,6 @@
 import click
 from click import types as ctypes
 from typing import Optional
-from summawise import ai
 from summawise.api_objects import Assistant
 from summawise.settings import Settings
 from summawise.data import HashAlg
@@ -17,6 +16,7 @@ def assistant():
 def list():
     """List your available assistants."""
     settings = Settings()  # type: ignore
+    # NOTE: default assistants aren't synced here (it requires api requests), they're created when they're first used
     for idx, assistant in enumerate(settings.assistants, start=1):
         print(f"{idx}) {assistant.name}")
 
@@ -43,6 +43,8 @@ def create(
     top_p: Optional[float]
 ) -> None:
     """Create a new assistant."""
+    from summawise import ai
+
     settings = Settings()  # type: ignore
 
     assistant = settings.assistants.get_by_name(name)
@@ -0,0 +1,222 @@
+import click
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, Awaitable, Dict, List, Optional, Set, TextIO, TypeVar
+from datetime import datetime, timezone
+from click import types as ctypes
+from summawise import utils
+from summawise.api_objects import Assistant, CONVERSATION_INITS, DEFAULT_CONVERSATION_INIT
+from summawise.settings import Settings
+from summawise.errors import AssistantSyncError
+
+T = TypeVar("T")
+
+
+@click.command()
+@click.argument("inputs", type=ctypes.File("r"), default="-")
+@click.option("-o", "--output", type=ctypes.File("a"), default="-", help="File which a JSON line is appended to for each input as it finishes. [Default: stdout]")
+@click.option("-ck", "--checkpoint", type=ctypes.Path(dir_okay=False), default=None, help="File which records inputs that were summarized successfully, inputs already recorded are skipped (so an interrupted batch can be restarted).")
+@click.option("-c", "--concurrency", type=ctypes.IntRange(min=1), default=4, help="Number of inputs processed at once.")
+@click.option("-a", "--assistant", "assistant_id", default="", help="The assistant used for every input, can be its name, id, or number from 'assistant list'. [Default: the first assistant]")
+@click.option("-p", "--prompt", "summary_prompt", default="", help="The message sent to generate each summary. [Default: the assistant's usual summary request]")
+@click.option("-sm", "--send_messages", type=ctypes.BOOL, default="false", help="Send content directly in messages alongside the VectorStore & FileSearch tool (see 'scan').")
+@click.option("-rf", "--ready_fraction", type=ctypes.FloatRange(0, 1, min_open=True), default=1.0, help="Generate each summary once this fraction of its files have been processed by the VectorStore.")
+@click.option("-q", "--quiet", is_flag=True, help="Discard progress output from processing inputs, rather than writing it to stderr.")
+@click.pass_context
+def batch(
+    ctx: click.Context,
+    inputs: TextIO,
+    output: TextIO,
+    checkpoint: Optional[str],
+    concurrency: int,
+    assistant_id: str,
+    summary_prompt: str,
+    send_messages: bool,
+    ready_fraction: float,
+    quiet: bool
+):
+    """
+    Summarize many inputs (URLs or file paths) without prompting, one per line of INPUTS (a file, or stdin by default).\n
+    Inputs are processed concurrently, and a JSON line is written for each one (with its summary, thread id and timings).
+    Empty lines and lines starting with '#' are ignored.
+    """
+    from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+    from summawise.files import cache as FileCache
+
+    settings = Settings()  # type: ignore
+    assistants_sync = Settings.sync_assistants()
+    FileCache.init()
+    debug = ctx.obj.get("DEBUG", False)
+
+    pending = read_inputs(inputs)
+    finished = read_checkpoint(checkpoint) if checkpoint else set()
+    skipped = len([input_str for input_str in pending if input_str in finished])
+    pending = [input_str for input_str in pending if input_str not in finished]
+    log(f"{len(pending)} input(s) to summarize" + (f", {skipped} already finished (checkpoint)." if skipped else "."))
+    if not pending:
+        return
+
+    try:
+        assistants_sync.result()
+    except AssistantSyncError as ex:
+        log(f"Error setting up assistants: {utils.ex_to_str(ex, include_traceback=debug)}")
+    if not settings.assistants:
+        log("No assistants are available.")
+        return
+
+    assistant: Optional[Assistant] = settings.assistants[0]
+    if assistant_id:
+        assistant, _ = settings.assistants.get(assistant_id)
+        if assistant is None:
+            log("No assistant found matching provided identifier.")
+            return
+    assert assistant is not None
+    if not summary_prompt:
+        summary_prompt = CONVERSATION_INITS.get(assistant, DEFAULT_CONVERSATION_INIT).gpt_msg
+
+    started_at = time.perf_counter()
+    counts = {"ok": 0, "error": 0}
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    # NOTE: output from processing inputs is written to stderr (or discarded), so stdout only contains results
+    progress_output = open(os.devnull, "w") if quiet else sys.stderr
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    written: "Set[Future[Dict[str, Any]]]" = set()
+
+    def write_results(futures: "List[Future[Dict[str, Any]]]"):
+        for future in as_completed(futures):
+            written.add(future)
+            record = future.result()
+            counts[record["status"]] += 1
+            write_record(output, record, checkpoint_file)
+
+    try:
+        with contextlib.redirect_stdout(progress_output):
+            futures = [
+                executor.submit(summarize, input_str, assistant, summary_prompt, send_messages, ready_fraction, debug)
+                for input_str in pending
+            ]
+            try:
+                write_results(futures)
+            except KeyboardInterrupt:
+                # inputs which haven't started are cancelled, those in progress are finished (and recorded) first
+                cancelled = len([future for future in futures if future.cancel()])
+                in_progress = [future for future in futures if not future.cancelled() and future not in written]
+                log(f"\nInterrupted, {cancelled} input(s) cancelled. Waiting for inputs in progress to finish...")
+                write_results(in_progress)
+    finally:
+        executor.shutdown(wait=False)
+        if checkpoint_file is not None:
+            checkpoint_file.close()
+        if quiet:
+            progress_output.close()
+
+    elapsed = time.perf_counter() - started_at
+    log(f"Summarized {counts['ok']}/{len(pending)} input(s) in {elapsed:.1f}s" + (f", {counts['error']} failed." if counts["error"] else "."))
+
+
+def summarize(
+    input_str: str,
+    assistant: Assistant,
+    summary_prompt: str,
+    send_messages: bool = False,
+    ready_fraction: float = 1.0,
+    debug: bool = False
+) -> Dict[str, Any]:
+    """
+    Process an input, create a thread for it and generate a summary (the same steps as 'scan', without prompting).
+    Returns a record of the result, errors are included in the record rather than raised.
+    """
+    from summawise import ai
+    from summawise.readiness import ReadinessWatcher
+    from summawise.commands.scan import process_input
+
+    timings: Dict[str, float] = {}
+    record: Dict[str, Any] = {"input": input_str, "status": "ok", "assistant": assistant.name}
+    started_at = time.perf_counter()
+    try:
+        resources = process_input(input_str)
+        timings["process"] = time.perf_counter() - started_at
+        vector_store_id = resources.vector_store_id
+        if not vector_store_id.startswith("vs_"):
+            raise ValueError(f"Invalid VectorStore ID: {vector_store_id}")
+        record["vector_store_id"] = vector_store_id
+
+        # the thread is created while the VectorStore's files are processed (if either fails, the thread isn't left behind)
+        watcher = ReadinessWatcher(vector_store_id, min_fraction=ready_fraction)
+        progress, api_thread = ai.run(ai.gather_with_thread(
+            timed(watcher.wait_async(), timings, "ready"),
+            timed(ai.create_thread_async(
+                resources,
+                file_search=assistant.file_search,
+                code_interpreter=assistant.interpret_code,
+                send_messages=send_messages
+            ), timings, "thread")
+        ))
+        for outcome in (progress, api_thread):
+            if isinstance(outcome, BaseException):
+                raise outcome
+        if api_thread is None:
+            raise RuntimeError("Cancelled before the thread was created.")
+        record["thread_id"] = api_thread.id
+
+        summary_started_at = time.perf_counter()
+        record["summary"] = ai.get_thread_response(api_thread.id, assistant.id, summary_prompt)
+        timings["summary"] = time.perf_counter() - summary_started_at
+    except Exception as ex:
+        record["status"] = "error"
+        record["error"] = utils.ex_to_str(ex, include_traceback=debug)
+
+    timings["total"] = time.perf_counter() - started_at
+    record["timings"] = {name: round(seconds, 3) for name, seconds in timings.items()}
+    record["finished_at"] = datetime.now(timezone.utc).isoformat()
+    return record
+
+
+async def timed(aw: Awaitable[T], timings: Dict[str, float], name: str) -> T:
+    """Await something, and record how long it took (seconds) in 'timings' under 'name'."""
+    started_at = time.perf_counter()
+    try:
+        return await aw
+    finally:
+        timings[name] = time.perf_counter() - started_at
+
+
+def read_inputs(inputs: TextIO) -> List[str]:
+    """The inputs listed in a file (one per line, in order), ignoring duplicates, empty lines and comments."""
+    unique: Dict[str, None] = {}
+    for line in inputs:
+        input_str = line.strip().strip('\'"')
+        if input_str and not input_str.startswith("#"):
+            unique[input_str] = None
+    return list(unique)
+
+
+def read_checkpoint(path: str) -> Set[str]:
+    """The inputs recorded as finished in a checkpoint file (if it exists)."""
+    finished: Set[str] = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            # NOTE: a partially written line (if the batch was killed while writing it) is ignored
+            with contextlib.suppress(ValueError):
+                finished.add(json.loads(line)["input"])
+    return finished
+
+
+def write_record(output: TextIO, record: Dict[str, Any], checkpoint_file: Optional[TextIO] = None) -> None:
+    """Write a result as a JSON line, and record the input in the checkpoint if it was successful."""
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    output.flush()
+    if checkpoint_file is not None and record["status"] == "ok":
+        checkpoint_file.write(json.dumps({"input": record["input"], "thread_id": record["thread_id"]}) + "\n")
+        checkpoint_file.flush()
+
+
+def log(text: str) -> None:
+    """Output a status message (to stderr, since stdout may contain results)."""
+    click.echo(text, err=True)
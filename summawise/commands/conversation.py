@@ -0,0 +1,24 @@
+from summawise import utils
+
+
+def converse(thread_id: str, assistant_id: str, intro: str, debug: bool = False) -> None:
+    """
+    Offer an interactive prompt to converse with an assistant in a thread, until the user exits.
+    Each response is streamed as it's generated, and each turn is a single request (see 'ai.get_thread_response').
+    """
+    from prompt_toolkit import prompt
+    from summawise import ai
+
+    print(intro)
+    while True:
+        input_str = prompt("\nyou > ")
+        utils.conditional_exit(input_str)
+        try:
+            ai.get_thread_response(
+                thread_id, assistant_id, input_str, auto_print=True)
+        except KeyboardInterrupt:
+            # the response (and its run) are cancelled, the conversation can continue
+            print("\nResponse cancelled.")
+        except Exception as ex:
+            print(
+                f"\nError occurred during conversation: {utils.ex_to_str(ex, include_traceback=debug)}")
@@ -1,41 +1,50 @@
-import validators
 import click
-import requests
-import time
-from openai.types.beta import VectorStore
-from typing import Tuple, Dict, Optional
-from prompt_toolkit import prompt
+from typing import Tuple, Dict, TYPE_CHECKING
 from pathlib import Path
 from datetime import datetime, timezone
 from click import types as ctypes
-from summawise import ai, utils
-from summawise.api_objects import Assistant, Thread, CONVERSATION_INITS, ConversationInit
+from summawise import profiling, utils
+from summawise.api_objects import Assistant, Thread, CONVERSATION_INITS, DEFAULT_CONVERSATION_INIT
 from summawise.settings import Settings
-from summawise.web import process_url
-from summawise.files.processing import process_file, process_dir
-from summawise.files import cache as FileCache
-from summawise.errors import NotSupportedError
+from summawise.errors import NotSupportedError, AssistantSyncError
 from summawise.data import DataUnit
+from summawise.commands.conversation import converse
+
+if TYPE_CHECKING:
+    from summawise import ai
 
 
 @click.command()
 @click.argument("user_input", nargs=-1)
 @click.option("-tn", "--thread_name", help="The name of the thread. [Optional: can't be restored if not specified.]", default="")
 @click.option("-sm", "--send_messages", type=ctypes.BOOL, default="false", help="Send content directly in messages alongside the VectorStore & FileSearch tool.\nThis increases the API cost, and is recommended to be used alongside saving/restoring threads with the '--thread_name' option for larger amounts of content such as codebases.")
+@click.option("-rf", "--ready_fraction", type=ctypes.FloatRange(0, 1, min_open=True), default=1.0, help="Start the conversation once this fraction of files have been processed by the VectorStore, rather than waiting for all of them.\nThe remaining files become searchable as they're processed.")
 @click.pass_context
-def scan(ctx: click.Context, user_input: Tuple[str, ...], thread_name: str, send_messages: bool):
+def scan(ctx: click.Context, user_input: Tuple[str, ...], thread_name: str, send_messages: bool, ready_fraction: float):
     """Scan and process the given input (URL or file path), and offer an interactive prompt to inquire about the vectorized data."""
+    # NOTE: imported here rather than at the top of the module, so other commands (and '--help') don't wait for them
+    import requests
+    from prompt_toolkit import prompt
+    from summawise import ai
+    from summawise.files import cache as FileCache
+    from summawise.readiness import ReadinessWatcher, VectorStoreProgress
+
     settings = Settings()  # type: ignore
+    # default assistants are created/updated in the background (if needed) while the input is processed
+    assistants_sync = Settings.sync_assistants()
     FileCache.init()
     debug = ctx.obj.get("DEBUG", False)
 
     while True:
         # prompt user for data source if not provided as an argument
         if user_input:
-            input_str = "".join(user_input)
+            # NOTE: arguments are rejoined with spaces, so paths containing spaces don't need to be quoted
+            input_str = " ".join(user_input)
         else:
             input_str = prompt("Enter a URL or local file path: ").strip('\'"')
 
+        utils.conditional_exit(input_str)
+
         # invoke process_input func to handle processing of data and retrieve vector store/file id(s)
         try:
             resources = process_input(input_str)
@@ -83,6 +92,14 @@ def scan(ctx: click.Context, user_input: Tuple[str, ...], thread_name: str, send
     if thread_name:
         print(f"Thread will be saved: {thread_name}")
 
+    try:
+        assistants_sync.result()
+    except AssistantSyncError as ex:
+        print(f"Error setting up assistants: {utils.ex_to_str(ex, include_traceback=debug)}")
+    if not settings.assistants:
+        print("No assistants are available.")
+        return
+
     assistant: Assistant = settings.assistants[0]
     if len(settings.assistants) > 1:
         # list assistant choices, map numeric index to name
@@ -102,56 +119,50 @@ def scan(ctx: click.Context, user_input: Tuple[str, ...], thread_name: str, send
         print(f"Using selected assistant: {assistant.name}")
 
     # verify vector store validity w/ openai, output some generic info
-    processing: bool = True
-    vector_store: Optional[VectorStore] = None
-    while processing:
-        try:
-            first_run = vector_store is None
-            # model dump example: https://pastebin.com/k4fwANdi
-            vector_store = ai.Client.beta.vector_stores.retrieve(
-                vector_store_id)
-            assert vector_store.status != "expired", "VectorStore is expired."
-
-            id, name = vector_store_id, vector_store.name
-            total_files = vector_store.file_counts.total
-            completed_files = vector_store.file_counts.completed
-            pending_files = vector_store.file_counts.in_progress
-            processing = vector_store.status != "completed"
-
-            size_str = DataUnit.bytes_to_str(vector_store.usage_bytes)
-            info = f"{id} ({name}), {completed_files}/{total_files} file(s), {size_str}"
-            if first_run:
-                print(f"Successfully established VectorStore!", end=" ")
-                if processing:
-                    print(f"Processing data from {pending_files} file(s)...")
-                else:
-                    print(
-                        f"{completed_files}/{total_files} file(s) have already been processed.")
-
-            if processing:
-                time.sleep(2)
-                continue
-
-            print(f"VectorStore ready for use. [{info}]")
-        except Exception as ex:
-            print(
-                f"Failed to validate VectorStore from provided ID ({vector_store_id}): {utils.ex_to_str(ex, include_traceback=debug)}")
-            return
+    watcher = ReadinessWatcher(vector_store_id, min_fraction=ready_fraction)
 
-    # create thread for this conversation
-    try:
-        api_thread = ai.create_thread(
+    def show_progress(progress: VectorStoreProgress):
+        if watcher.polls > 1:
+            return
+        print(f"Successfully established VectorStore!", end=" ")
+        if not progress.done:
+            print(f"Processing data from {progress.pending} file(s)...")
+        else:
+            print(f"{progress.completed}/{progress.total} file(s) have already been processed.")
+
+    # the thread for this conversation is created while the VectorStore's files are processed
+    # model dump example: https://pastebin.com/k4fwANdi
+    # if either fails, the other is cancelled (and a thread which was already created is deleted)
+    progress, api_thread = ai.run(ai.gather_with_thread(
+        watcher.wait_async(on_progress=show_progress),
+        ai.create_thread_async(
             resources,
             file_search=assistant.file_search,
             code_interpreter=assistant.interpret_code,
             send_messages=send_messages
         )
-        print(f"Thread created with ID: {api_thread.id}")
-    except Exception as ex:
+    ))
+    if isinstance(progress, BaseException):
+        print(
+            f"Failed to validate VectorStore from provided ID ({vector_store_id}): {utils.ex_to_str(progress, include_traceback=debug)}")
+        return
+    if isinstance(api_thread, BaseException):
         print(
-            f"Error creating thread: {utils.ex_to_str(ex, include_traceback=debug)}")
+            f"Error creating thread: {utils.ex_to_str(api_thread, include_traceback=debug)}")
+        return
+    if progress is None or api_thread is None:
+        print("Cancelled before the conversation was ready.")
         return
 
+    vector_store = progress.vector_store
+    size_str = DataUnit.bytes_to_str(vector_store.usage_bytes)
+    info = f"{vector_store_id} ({vector_store.name}), {progress.completed}/{progress.total} file(s), {size_str}"
+    if progress.done:
+        print(f"VectorStore ready for use. [{info}]")
+    else:
+        print(f"VectorStore partially ready for use, remaining files will become searchable as they're processed. [{info}]")
+    print(f"Thread created with ID: {api_thread.id}")
+
     # create internal representation of the thread (simplified)
     thread = Thread(
         id=api_thread.id,
@@ -167,11 +178,7 @@ def scan(ctx: click.Context, user_input: Tuple[str, ...], thread_name: str, send
 
     # initialize the conversation with a summary
     try:
-        default_ci = ConversationInit(
-            user_msg="Generating summary of content...",
-            gpt_msg="Please identify what the provided content is and provide a summary."
-        )
-        ci = CONVERSATION_INITS.get(assistant, default_ci)
+        ci = CONVERSATION_INITS.get(assistant, DEFAULT_CONVERSATION_INIT)
         print(ci.user_msg)
         ai.get_thread_response(thread.id, assistant.id,
                                ci.gpt_msg, auto_print=True)
@@ -180,30 +187,25 @@ def scan(ctx: click.Context, user_input: Tuple[str, ...], thread_name: str, send
             f"Error initializing conversation: {utils.ex_to_str(ex, include_traceback=debug)}")
         return
 
-    print("\nYou can now ask questions about the content. Type 'exit' to quit.")
-    while True:
-        input_str = prompt("\nyou > ")
-        utils.conditional_exit(input_str)
-        try:
-            ai.get_thread_response(
-                thread.id, assistant.id, input_str, auto_print=True)
-        except Exception as ex:
-            print(
-                f"\nError occurred during conversation: {utils.ex_to_str(ex, include_traceback=debug)}")
+    converse(thread.id, assistant.id,
+             "\nYou can now ask questions about the content. Type 'exit' to quit.", debug=debug)
 
 
-def process_input(user_input: str) -> ai.Resources:
+def process_input(user_input: str) -> "ai.Resources":
     """Takes user input, attempts to return OpenAI VectorStore ID after processing data."""
-    utils.conditional_exit(user_input)
-
-    path = Path(user_input)
-    if path.exists():
-        if path.is_file():
-            return process_file(path)
-        elif path.is_dir():
-            return process_dir(path)
-
-    if validators.url(user_input):
-        return process_url(user_input)
+    import validators
+    from summawise.web import process_url
+    from summawise.files.processing import process_file, process_dir
+
+    with profiling.span("process_input"):
+        path = Path(user_input)
+        if path.exists():
+            if path.is_file():
+                return process_file(path)
+            elif path.is_dir():
+                return process_dir(path)
+
+        if validators.url(user_input):
+            return process_url(user_input)
 
     raise NotSupportedError()
@@ -1,7 +1,8 @@
 import click
-from prompt_toolkit import prompt
-from summawise import ai, utils
+from summawise import utils
 from summawise.settings import Settings
+from summawise.errors import AssistantSyncError
+from summawise.commands.conversation import converse
 
 
 @click.group()
@@ -42,6 +43,8 @@ def delete(thread_id: str):
 @click.pass_context
 def restore(ctx: click.Context, thread_id: str):
     """Restore a saved thread from its latest state."""
+    from summawise import ai
+
     settings = Settings()  # type: ignore
     debug = ctx.obj.get("DEBUG", False)
 
@@ -50,6 +53,11 @@ def restore(ctx: click.Context, thread_id: str):
         print("No thread found matching provided identifier.")
         return
 
+    try:
+        Settings.sync_assistants().result()
+    except AssistantSyncError as ex:
+        # the thread's own assistant id is used if its default assistant couldn't be updated
+        print(f"Error setting up assistants: {utils.ex_to_str(ex, include_traceback=debug)}")
     assistant_name, assistant_id = thread.assistant
     assistant, _ = settings.assistants.get(assistant_name)
     if assistant is not None:
@@ -65,13 +73,5 @@ def restore(ctx: click.Context, thread_id: str):
         return
 
     # resume interactive prompt (from scan command) with restored thread
-    print("\nYou can now continue to ask questions about the content. Type 'exit' to quit.")
-    while True:
-        input_str = prompt("\nyou > ")
-        utils.conditional_exit(input_str)
-        try:
-            ai.get_thread_response(
-                thread.id, assistant_id, input_str, auto_print=True)
-        except Exception as ex:
-            print(
-                f"\nError occurred during conversation: {utils.ex_to_str(ex, include_traceback=debug)}")
+    converse(thread.id, assistant_id,
+             "\nYou can now continue to ask questions about the content. Type 'exit' to quit.", debug=debug)
@@ -1,8 +1,12 @@
+import os
+import mmap
 import inspect
 import hashlib
+import threading
 import xxhash
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, List, Union, NamedTuple, cast
+from typing import Any, Callable, Dict, Iterable, List, Union, NamedTuple, cast
 from types import ModuleType
 from pathlib import Path
 from summawise.errors import ValueTypeError
@@ -23,6 +27,12 @@ class DataMode(Enum):
             raise ValueError(f"Unsupported DataMode: {self}")
 
 
+class ExecutorType(Enum):
+    """The type of pool used to run CPU/IO bound work (such as hashing files) concurrently."""
+    THREAD = "thread"
+    PROCESS = "process"
+
+
 class DataUnit:
     """
     Utility class for converting sizes in bytes to human-readable string representations with appropriate units.
@@ -92,6 +102,27 @@ class _HashAlg(NamedTuple):
         return alg_init()
 
 
+# size of the buffer files are read into while being hashed (see 'HashAlg.calculate')
+HASH_BUFFER_SIZE = 1 * DataUnit.MB
+
+# files larger than this are memory mapped while being hashed, rather than read into a buffer
+HASH_MMAP_THRESHOLD = 64 * DataUnit.MB
+
+# hash object constructors, resolved and validated once per algorithm (keyed by HashAlg name)
+_hash_constructors: Dict[str, Callable[[], Any]] = {}
+
+# reusable read buffers, one per thread
+_hash_buffers = threading.local()
+
+
+def _hash_buffer(size: int) -> memoryview:
+    buffer = getattr(_hash_buffers, "buffer", None)
+    if buffer is None or len(buffer) < size:
+        buffer = memoryview(bytearray(size))
+        _hash_buffers.buffer = buffer
+    return buffer[:size]
+
+
 class HashAlg(Enum):
     """An enumeration class representing various hashing algorithms and offering their implementation."""
     SHA_256 = _HashAlg(hashlib, "sha256")
@@ -102,47 +133,103 @@ class HashAlg(Enum):
     XXH3_128 = _HashAlg(xxhash, "xxh3_128")
     XXH3_64 = _HashAlg(xxhash, "xxh3_64")
 
+    def __reduce_ex__(self, protocol: Any) -> Any:
+        # NOTE: members are pickled by name, since their values reference a module (which can't be pickled)
+        return getattr, (type(self), self.name)
+
+    def new(self) -> Any:
+        """
+        Create a new hash object for this algorithm.
+
+        Raises:
+            ValueError: If the hash algorithm/object is not valid.
+        """
+        constructor = _hash_constructors.get(self.name)
+        if constructor is not None:
+            return constructor()
+        try:
+            alg = cast(_HashAlg, self.value)
+            constructor = getattr(alg.module, alg.function_name)
+            hash_obj = constructor()
+            assert HashAlg.hash_obj_valid(hash_obj)
+        except (AssertionError, AttributeError) as ex:
+            raise ValueError("Invalid hash object.") from ex
+        _hash_constructors[self.name] = constructor
+        return hash_obj
+
     def calculate(
         self,
-        _input: Union[Path, str, bytes],
-        intdigest: bool = False
+        _input: Union[Path, str, bytes, bytearray, memoryview],
+        intdigest: bool = False,
+        buffer_size: int = HASH_BUFFER_SIZE
     ) -> Union[str, int]:
         """
         Calculate the hash of the input using the specified algorithm.
+        Files are read into a reusable buffer (or memory mapped if they're large), so no memory is allocated per chunk.
 
         Parameters:
-            _input (Union[Path, str, bytes]): The input data to calculate the hash for.
+            _input (Union[Path, str, bytes, bytearray, memoryview]): The input data to calculate the hash for.
             intdigest (bool): Whether to return the hash as an integer or a string.
+            buffer_size (int): The size of the buffer files are read into.
 
         Returns:
             Union[str, int]: The calculated hash, either as a string or an integer.
 
         Raises:
             ValueError: If the hash algorithm/object is not valid.
-            ValueTypeError: If the input data type is not one of Path, str, or bytes.
+            ValueTypeError: If the input data type is not one of Path, str, or a bytes-like object.
         """
-        try:
-            alg = cast(_HashAlg, self.value)
-            hash_obj = alg.init()
-            assert HashAlg.hash_obj_valid(hash_obj)
-        except (AssertionError, AttributeError) as ex:
-            raise ValueError("Invalid hash object.") from ex
+        hash_obj = self.new()
 
-        if isinstance(_input, (bytes, str)):
+        if isinstance(_input, (bytes, bytearray, memoryview, str)):
             _input = _input.encode() if isinstance(_input, str) else _input
             hash_obj.update(_input)
         elif isinstance(_input, Path):
-            with open(_input, "rb") as f:
-                for chunk in iter(lambda: f.read(8 * DataUnit.KB), b""):
-                    hash_obj.update(chunk)
+            HashAlg._update_from_file(hash_obj, _input, buffer_size)
         else:
-            raise ValueTypeError(_input, (Path, str, bytes))
+            raise ValueTypeError(
+                _input, (Path, str, bytes, bytearray, memoryview))
 
         return (
             hash_obj.hexdigest() if not intdigest else
             int.from_bytes(hash_obj.digest(), byteorder="big")
         )
 
+    def calculate_many(
+        self,
+        paths: Iterable[Path],
+        intdigest: bool = False,
+        buffer_size: int = HASH_BUFFER_SIZE,
+        workers: int = 1
+    ) -> List[Union[str, int]]:
+        """
+        Calculate the hash of many files in one call, in the order they're provided.
+        If 'workers' is greater than 1, files are hashed concurrently by a thread pool (hashing releases the GIL).
+        """
+        def calculate(path: Path) -> Union[str, int]:
+            return self.calculate(path, intdigest, buffer_size)
+
+        if workers <= 1:
+            return [calculate(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(calculate, paths))
+
+    @staticmethod
+    def _update_from_file(hash_obj: Any, file_path: Path, buffer_size: int) -> None:
+        with open(file_path, "rb", buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            if size > HASH_MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    with memoryview(mm) as view:
+                        hash_obj.update(view)
+                return
+            buffer = _hash_buffer(buffer_size)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hash_obj.update(buffer[:n])
+
     @staticmethod
     def hash_obj_valid(alg: Any) -> bool:
         """Check if the given algorithm object is a valid hash algorithm."""
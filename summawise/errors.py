@@ -1,4 +1,4 @@
-from typing import Any, Union, Tuple, Optional
+from typing import Any, Union, Tuple, Optional, List
 
 
 class NotSupportedError(Exception):
@@ -46,3 +46,10 @@ class MissingSortKeyError(Exception):
         msg = "Missing required sort key" + \
             (": " if len(append) else ".") + append
         super().__init__(msg)
+
+
+class AssistantSyncError(Exception):
+    def __init__(self, failures: List[Tuple[str, Exception]]):
+        self.failures = failures
+        details = "; ".join([f"{name} ([{type(ex).__name__}] {ex})" for name, ex in failures])
+        super().__init__(f"Failed to create or update assistants: {details}")
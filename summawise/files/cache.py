@@ -1,61 +1,329 @@
 import json
-from typing import Optional, Dict, Any
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+from pathlib import Path
 from summawise.settings import Settings
+from summawise.data import HashAlg, DataMode
 from summawise.serializable import Serializable
-from summawise import utils, ai
+from summawise import utils
 
-FileCache: "FileCacheObj"
+FileCache: "FileCacheDB"
+
+# seconds to wait for another process to release a lock on the database before giving up
+DB_TIMEOUT = 30.0
+
+# messages of the errors raised by sqlite when a database file is corrupt (see 'is_corrupt')
+CORRUPT_MESSAGES = ("file is not a database", "malformed")
+
+# tables created by 'FileCacheDB._init_db'
+TABLES = frozenset({"files", "meta", "alive", "vector_stores", "shared_vector_stores"})
 
 
 def init():
     global FileCache
     try:
-        FileCache = FileCacheObj.load()
-    except ModuleNotFoundError:
-        FileCacheObj.delete()
-        FileCache = FileCacheObj.load()
+        FileCache = FileCacheDB.open()
+    except sqlite3.DatabaseError as ex:
+        # NOTE: only a corrupt database is rebuilt, lock/io errors (ex: another process is writing) are raised rather than deleting it
+        if not is_corrupt(ex):
+            raise
+        FileCacheDB.delete()
+        FileCache = FileCacheDB.open()
+    # NOTE: imported here, since 'ai' imports this module (importing it at the top made the import order of the two matter)
+    from summawise import ai
     ai.set_file_cache(FileCache)
 
 
-class FileCacheObj(Serializable):
-    """Maps file hashes to OpenAI file_ids, and support our dynamic data serialization."""
+def is_corrupt(ex: sqlite3.DatabaseError) -> bool:
+    """Check if an error means the database file is corrupt (or isn't a database), rather than temporarily unusable (ex: locked)."""
+    if isinstance(ex, sqlite3.OperationalError):
+        return False
+    message = str(ex).lower()
+    return any(text in message for text in CORRUPT_MESSAGES)
 
-    def __init__(self, cache: Dict[str, str] = {}):
-        self._cache = cache
-        self.settings = Settings()  # type: ignore
-        self.path = FileCacheObj.get_path()
 
-    def set_hash_file_id(self, hash: str, file_id: str):
-        self._cache[hash] = file_id
+class FileCacheDB:
+    """
+    Maps file hashes to OpenAI file_ids, stored in a SQLite database (in WAL mode) rather than loaded into memory.
+    Lookups and writes are point queries, and the database is safe to use from several threads and processes at once.
+    Entries are keyed by (hash algorithm, hash). Entries keyed by an algorithm other than the current one
+    (see 'Settings.hash_alg') are "legacy" entries, and are migrated to the current algorithm when a file's legacy hash is known.
+    Legacy hashes are calculated from the same buffer as the current hash while legacy entries exist (see 'legacy_hash_algs'),
+    or restored from the dirstate (see 'DirStateObj.legacy_hash'), files are never read again just to look for them.
+    """
 
-    def get_file_id_by_hash(self, hash: str) -> Optional[str]:
-        return self._cache.get(hash)
+    def __init__(self, path: Path, hash_alg: HashAlg):
+        self.path = path
+        self.hash_alg = hash_alg.name
+        self._local = threading.local()
+        self._legacy_hash_algs: Optional[List[HashAlg]] = None
+        self._init_db()
 
     @classmethod
-    def load(cls) -> "FileCacheObj":
-        # create empty FileCache
-        cache = cls()
-        settings = cache.settings
+    def open(cls) -> "FileCacheDB":
+        """Open the database (creating it if it doesn't exist), importing the legacy json/binary cache on first run."""
+        settings = Settings()  # type: ignore
+        cache = cls(FileCacheDB.get_path(), settings.hash_alg)
+        cache.import_legacy()
+        return cache
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # NOTE: sqlite connections can't be shared between threads, so each thread has its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.path), timeout=DB_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        # NOTE: the write lock is only taken if tables are missing, so opening an existing database doesn't wait on other writers
+        rows = self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        if TABLES <= {row[0] for row in rows}:
+            return
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    hash_alg TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    PRIMARY KEY (hash_alg, hash)
+                ) WITHOUT ROWID
+            """)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # file ids known to exist remotely, and when they were last seen (see 'refresh_alive')
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS alive (file_id TEXT PRIMARY KEY, seen_at REAL NOT NULL) WITHOUT ROWID")
+            # vector stores, keyed by the set of files they contain (see 'files.merkle.file_set_key')
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vector_stores (key TEXT PRIMARY KEY, vector_store_id TEXT NOT NULL) WITHOUT ROWID")
+            # vector stores which have been reused by another scan, so they're never modified (see 'mark_vector_store_shared')
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_vector_stores (vector_store_id TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Group several writes into a single transaction (the write lock is acquired up front, so it can't deadlock)."""
+        conn = self._conn
+        if conn.in_transaction:
+            # nested transactions are part of the outer one
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def set_hash_file_id(self, hash: str, file_id: str):
+        self.set_many([(hash, file_id)])
+
+    def set_many(self, items: Iterable[Tuple[str, str]]):
+        """Record the file id of many hashes (calculated with the current hash algorithm) in a single transaction."""
+        rows = [(self.hash_alg, hash, file_id) for hash, file_id in items]
+        if not rows:
+            return
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (hash_alg, hash, file_id) VALUES (?, ?, ?)", rows)
+
+    def get_file_id_by_hash(self, hash: str, legacy_hashes: Iterable[Tuple[HashAlg, str]] = ()) -> Optional[str]:
+        """
+        Get the file id of a hash (calculated with the current hash algorithm).
+        If the hashes of the same content with legacy algorithms are provided (see 'legacy_hash_algs'), they're used when the file
+        isn't found, and a matching legacy entry is migrated to the current hash.
+        """
+        file_id = self._get(self.hash_alg, hash)
+        if file_id is not None:
+            return file_id
+        for hash_alg, legacy in legacy_hashes:
+            if hash_alg.name == self.hash_alg:
+                continue
+            file_id = self._get(hash_alg.name, legacy)
+            if file_id is None:
+                continue
+            with self.transaction() as conn:
+                conn.execute(
+                    "DELETE FROM files WHERE hash_alg = ? AND hash = ?", (hash_alg.name, legacy))
+                conn.execute(
+                    "INSERT OR REPLACE INTO files (hash_alg, hash, file_id) VALUES (?, ?, ?)", (self.hash_alg, hash, file_id))
+            return file_id
+        return None
+
+    def legacy_hash_algs(self) -> List[HashAlg]:
+        """
+        Hash algorithms (other than the current one) which entries are still keyed by, ex: entries imported from a previous version.
+        It's checked once (entries are only ever migrated away from them), and is usually empty, so no legacy hashes are calculated.
+        """
+        if self._legacy_hash_algs is None:
+            self._legacy_hash_algs = [
+                hash_alg for hash_alg in HashAlg
+                if hash_alg.name != self.hash_alg and self._conn.execute(
+                    "SELECT EXISTS (SELECT 1 FROM files WHERE hash_alg = ?)", (hash_alg.name,)).fetchone()[0]
+            ]
+        return list(self._legacy_hash_algs)
+
+    def _get(self, hash_alg: str, hash: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT file_id FROM files WHERE hash_alg = ? AND hash = ?", (hash_alg, hash)).fetchone()
+        return row[0] if row else None
+
+    def evict(self, hash: str):
+        """Remove the entry for a hash (calculated with the current hash algorithm), ex: if its file no longer exists remotely."""
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM files WHERE hash_alg = ? AND hash = ?", (self.hash_alg, hash))
+
+    def alive_refreshed_at(self) -> Optional[float]:
+        """The time the set of file ids known to exist remotely was last refreshed, or 'None' if it never has been."""
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'alive_refreshed_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def refresh_alive(self, file_ids: Iterable[str], started_at: float):
+        """
+        Replace the set of file ids known to exist remotely, with the result of listing every remote file.
+        'started_at' is the time the listing began: file ids marked as alive after that (ex: by another process) are kept.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO alive (file_id, seen_at) VALUES (?, ?)",
+                ((file_id, started_at) for file_id in file_ids))
+            conn.execute(
+                "DELETE FROM alive WHERE seen_at < ?", (started_at,))
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('alive_refreshed_at', ?)", (str(started_at),))
+
+    def mark_alive(self, file_ids: Iterable[str]):
+        rows = [(file_id, time.time()) for file_id in file_ids]
+        if not rows:
+            return
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO alive (file_id, seen_at) VALUES (?, ?)", rows)
+
+    def is_alive(self, file_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM alive WHERE file_id = ?", (file_id,)).fetchone()
+        return row is not None
+
+    def get_vector_store_id(self, key: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT vector_store_id FROM vector_stores WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
 
-        # if the file doesn't exist, save empty version by default
-        if not cache.path.exists():
-            cache.save()
-            return cache
+    def get_vector_store_key(self, vector_store_id: str) -> Optional[str]:
+        """Get the key of the set of files a vector store currently contains, or 'None' if it isn't known."""
+        row = self._conn.execute(
+            "SELECT key FROM vector_stores WHERE vector_store_id = ?", (vector_store_id,)).fetchone()
+        return row[0] if row else None
 
-        # if the file does exist, use functionality fom Serializable base class to establish populated object
-        return cache.from_file(cache.path, settings.data_mode)
+    def set_vector_store_id(self, key: str, vector_store_id: str):
+        """Record the set of files a vector store contains, replacing any previous key (ex: if its files were changed)."""
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM vector_stores WHERE vector_store_id = ?", (vector_store_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO vector_stores (key, vector_store_id) VALUES (?, ?)", (key, vector_store_id))
 
-    def save(self):
-        data_mode = self.settings.data_mode
-        compress = self.settings.compression
-        self.save_to_file(self.path, data_mode, compress, pretty_json=True)
+    def evict_vector_store(self, vector_store_id: str):
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM vector_stores WHERE vector_store_id = ?", (vector_store_id,))
+            conn.execute(
+                "DELETE FROM shared_vector_stores WHERE vector_store_id = ?", (vector_store_id,))
+
+    def mark_vector_store_shared(self, vector_store_id: str):
+        """
+        Record that a vector store has been handed out to another scan of identical files (see 'ai.find_vector_store').
+        Threads saved by either scan search it, so its files are never changed in place from then on.
+        """
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO shared_vector_stores (vector_store_id) VALUES (?)", (vector_store_id,))
+
+    def is_vector_store_shared(self, vector_store_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM shared_vector_stores WHERE vector_store_id = ?", (vector_store_id,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def import_legacy(self) -> int:
+        """
+        Import entries from the json/binary file cache used by previous versions (see 'FileCacheObj'), if it hasn't been imported already.
+        Existing entries take precedence over imported ones. Returns the number of entries imported.
+        """
+        query = "SELECT 1 FROM meta WHERE key = 'legacy_imported'"
+        if self._conn.execute(query).fetchone():
+            return 0
+        with self.transaction() as conn:
+            # checked again with the write lock held, another process may have imported it in the meantime
+            if conn.execute(query).fetchone():
+                return 0
+            imported = 0
+            for mode in DataMode:
+                path = utils.fp(utils.get_summawise_dir() / f"file_cache.{mode.ext()}")
+                if not path.exists():
+                    continue
+                try:
+                    legacy = FileCacheObj.from_file(path, mode)
+                except Exception:
+                    continue
+                rows = list(legacy.entries())
+                conn.executemany(
+                    "INSERT OR IGNORE INTO files (hash_alg, hash, file_id) VALUES (?, ?, ?)", rows)
+                imported += len(rows)
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('legacy_imported', '1')")
+        return imported
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def get_path() -> Path:
+        return utils.get_summawise_dir() / "file_cache.db"
+
+    @staticmethod
+    def delete():
+        path = FileCacheDB.get_path()
+        for suffix in ("", "-wal", "-shm"):
+            Path(str(path) + suffix).unlink(missing_ok=True)
+
+
+class FileCacheObj(Serializable):
+    """
+    Maps file hashes to OpenAI file_ids, in the json/binary format used by previous versions (which always hashed files with SHA3-256).
+    NOTE: it's only used to import an existing cache into 'FileCacheDB', see 'FileCacheDB.import_legacy'.
+    """
+
+    def __init__(self, cache: Optional[Dict[str, str]] = None):
+        self._cache: Dict[str, str] = cache if cache is not None else {}
+
+    def entries(self) -> Iterator[Tuple[str, str, str]]:
+        """Yields (hash algorithm, hash, file id) for every entry."""
+        for hash, file_id in self._cache.items():
+            yield HashAlg.SHA3_256.name, hash, file_id
 
     @classmethod
     def from_json(cls, json_str: str) -> "FileCacheObj":
         cache_dict = json.loads(json_str)
-        cache_dict = FileCacheObj.filter_dict(cache_dict)
-        cache = FileCacheObj(cache_dict)
-        return cache
+        return FileCacheObj(FileCacheObj.filter_dict(cache_dict))
 
     def to_json(self, pretty: bool = False) -> str:
         return json.dumps(self._cache, indent=4 if pretty else None)
@@ -67,13 +335,3 @@ class FileCacheObj(Serializable):
             k: v for k, v in obj.items()
             if isinstance(v, str)
         }
-
-    @staticmethod
-    def get_path():
-        settings = Settings()  # type: ignore
-        return utils.get_summawise_dir() / f"file_cache.{settings.data_mode.ext()}"
-
-    @staticmethod
-    def delete():
-        path = FileCacheObj.get_path()
-        path.unlink(missing_ok=True)
@@ -0,0 +1,58 @@
+from typing import Dict, Iterator, Mapping, Optional, Iterable, Tuple
+from pathlib import Path
+from summawise.files.encodings import Encoding
+from summawise.files import utils as FileUtils
+
+
+class FileContents(Mapping[Path, str]):
+    """
+    Lazily provides the text content of a set of files, keyed by path.
+    Nothing is held in memory: a file is only read/decoded when its content is accessed, and files which aren't text are skipped.
+    Files which only exist in memory (ex: a transcript) can be added along with their data.
+    """
+
+    def __init__(self, files: Iterable[Tuple[Path, Optional[Encoding]]] = ()):
+        # maps each path to its encoding, 'None' if it hasn't been detected yet
+        self._encodings: Dict[Path, Optional[Encoding]] = dict(files)
+        self._data: Dict[Path, bytes] = {}
+        self._text_paths: Optional[Tuple[Path, ...]] = None
+
+    def add(self, file_path: Path, encoding: Optional[Encoding] = None, data: Optional[bytes] = None) -> None:
+        self._encodings[file_path] = encoding
+        if data is not None:
+            self._data[file_path] = data
+        self._text_paths = None
+
+    def is_text(self, file_path: Path) -> bool:
+        encoding = self._encodings.get(file_path)
+        if encoding is None:
+            data = self._data.get(file_path)
+            encoding = FileUtils.get_encoding(file_path) if data is None else \
+                FileUtils.detect_encoding(data[:FileUtils.ENCODING_SAMPLE_SIZE])
+            self._encodings[file_path] = encoding
+        return encoding in FileUtils.ENCODING_WHITELIST
+
+    @property
+    def text_paths(self) -> Tuple[Path, ...]:
+        if self._text_paths is None:
+            self._text_paths = tuple(
+                fp for fp in self._encodings if self.is_text(fp))
+        return self._text_paths
+
+    def __getitem__(self, file_path: Path) -> str:
+        if file_path not in self._encodings or not self.is_text(file_path):
+            raise KeyError(file_path)
+        data = self._data.get(file_path)
+        if data is None:
+            data = file_path.read_bytes()
+        # NOTE: 'utf-8-sig' strips a UTF-8 byte order mark (if there is one), so it isn't included in the text
+        return data.decode("utf-8-sig", errors="replace")
+
+    def __iter__(self) -> Iterator[Path]:
+        return iter(self.text_paths)
+
+    def __len__(self) -> int:
+        return len(self.text_paths)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self._encodings)} file(s))"
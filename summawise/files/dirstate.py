@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import time
+from typing import Optional, Dict, List, Any, NamedTuple, Tuple, Iterable
+from pathlib import Path
+from summawise.settings import Settings
+from summawise.serializable import Serializable
+from summawise.data import HashAlg
+from summawise.files.encodings import Encoding
+from summawise import utils
+
+DirState: Optional["DirStateObj"] = None
+_init_lock = threading.RLock()
+
+# files modified this recently aren't recorded, since a change within the same mtime tick wouldn't be noticed
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+def init() -> "DirStateObj":
+    global DirState
+    with _init_lock:
+        try:
+            DirState = DirStateObj.load()
+        except (ModuleNotFoundError, ValueError, EOFError):
+            DirStateObj.delete()
+            DirState = DirStateObj.load()
+        return DirState
+
+
+def get() -> "DirStateObj":
+    """Returns the DirState, loading it from disk if it hasn't been initialized yet (once, even if several threads ask for it at once)."""
+    if DirState is None:
+        with _init_lock:
+            if DirState is None:
+                return init()
+    assert DirState is not None
+    return DirState
+
+
+class DirStateEntry(NamedTuple):
+    size: int
+    mtime_ns: int
+    inode: int
+    hash: str
+    encoding: Optional[str] = None  # None if it hasn't been detected, empty if no encoding was recognized
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return (
+            self.size == stat.st_size and
+            self.mtime_ns == stat.st_mtime_ns and
+            self.inode == stat.st_ino
+        )
+
+
+class DirStateObj(Serializable):
+    """
+    Maps file paths to their content hash based on (size, mtime_ns, inode), similar to git's index.
+    If a file's stat info hasn't changed since it was last hashed, the hash is restored without reading the file.
+    All hashes are calculated with the same algorithm ('hash_alg', the name of a HashAlg member).
+    When the hash algorithm changes, the previous entries are kept as "legacy" entries (see 'legacy_hash').
+    It's shared by every thread scanning files (ex: the 'batch' command), entries are recorded and saved under a lock.
+    """
+
+    def __init__(
+        self,
+        entries: Optional[Dict[str, List[Any]]] = None,
+        hash_alg: str = HashAlg.SHA3_256.name,
+        legacy_entries: Optional[Dict[str, List[Any]]] = None,
+        legacy_hash_alg: str = ""
+    ):
+        self._entries: Dict[str, DirStateEntry] = {
+            path: DirStateEntry(*entry) for path, entry in (entries or {}).items()
+        }
+        self.hash_alg = hash_alg
+        # entries hashed with the previous algorithm, until the files are recorded again with the current one
+        self._legacy_entries: Dict[str, DirStateEntry] = {
+            path: DirStateEntry(*entry) for path, entry in (legacy_entries or {}).items()
+        }
+        self.legacy_hash_alg = legacy_hash_alg
+        self._modified = False
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # NOTE: locks can't be pickled
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # objects saved before hash algorithms were configurable were always hashed with SHA3-256
+        state.setdefault("hash_alg", HashAlg.SHA3_256.name)
+        state.setdefault("_legacy_entries", {})
+        state.setdefault("legacy_hash_alg", "")
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path: Path) -> str:
+        return os.path.abspath(file_path)
+
+    def lookup(self, file_path: Path) -> Tuple[os.stat_result, Optional[DirStateEntry]]:
+        """Returns the current stat info of a file, and its entry if the file is unchanged since it was recorded."""
+        stat = os.stat(file_path)
+        entry = self._entries.get(DirStateObj.key(file_path))
+        if entry is not None and not entry.matches(stat):
+            entry = None
+        return stat, entry
+
+    def record(
+        self,
+        file_path: Path,
+        stat: os.stat_result,
+        hash: str,
+        encoding: Optional[Encoding] = None,
+        encoding_detected: bool = False
+    ) -> None:
+        """
+        Record the hash of a file, based on stat info retrieved *before* it was read.
+        If 'encoding_detected' is True, the encoding is recorded as well (even if no encoding was recognized).
+        """
+        if time.time_ns() - stat.st_mtime_ns < RACY_WINDOW_NS:
+            return
+        encoding_str = None
+        if encoding_detected:
+            encoding_str = encoding.value if encoding else ""
+        entry = DirStateEntry(stat.st_size, stat.st_mtime_ns, stat.st_ino, hash, encoding_str)
+        with self._lock:
+            self._entries[DirStateObj.key(file_path)] = entry
+            self._modified = True
+
+    def legacy_hash(self, file_path: Path) -> Optional[Tuple[HashAlg, str]]:
+        """
+        The hash of a file calculated with the previous hash algorithm, if the file is unchanged since it was recorded with it.
+        Used to find cache entries keyed by a legacy hash without reading (and hashing) the file again.
+        """
+        entry = self._legacy_entries.get(DirStateObj.key(file_path))
+        if entry is None or self.legacy_hash_alg not in HashAlg.__members__:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (HashAlg[self.legacy_hash_alg], entry.hash) if entry.matches(stat) else None
+
+    def prune(self, root: Path, seen: Iterable[Path]) -> int:
+        """
+        Remove the entries of files under a directory which weren't seen while it was walked (ex: deleted, or no longer included),
+        so the dirstate only grows with the files which are actually scanned. Returns the number of entries removed.
+        """
+        prefix = os.path.join(DirStateObj.key(root), "")
+        seen_keys = {DirStateObj.key(file_path) for file_path in seen}
+        removed = 0
+        with self._lock:
+            for entries in (self._entries, self._legacy_entries):
+                stale = [key for key in entries if key.startswith(prefix) and key not in seen_keys]
+                for key in stale:
+                    del entries[key]
+                removed += len(stale)
+            if removed:
+                self._modified = True
+        return removed
+
+    def hash_file(self, file_path: Path) -> str:
+        """Calculate the hash of a file, or restore it if the file is unchanged since it was last hashed."""
+        stat, entry = self.lookup(file_path)
+        if entry is not None:
+            return entry.hash
+        hash = HashAlg[self.hash_alg].calculate(file_path)
+        assert isinstance(hash, str)
+        self.record(file_path, stat, hash)
+        return hash
+
+    @classmethod
+    def load(cls) -> "DirStateObj":
+        settings = Settings()  # type: ignore
+        path = utils.fp(DirStateObj.get_path())
+        if path.exists():
+            dirstate = cls.from_file(path, settings.data_mode)
+            if dirstate.hash_alg == settings.hash_alg.name:
+                return dirstate
+            # if the hash algorithm has changed, files are hashed again as they're scanned, and existing entries become legacy entries
+            migrated = cls(hash_alg=settings.hash_alg.name, legacy_entries=dirstate._entries, legacy_hash_alg=dirstate.hash_alg)  # type: ignore
+            migrated._modified = True
+            return migrated
+        return cls(hash_alg=settings.hash_alg.name)
+
+    def save(self, force: bool = False):
+        if not self._modified and not force:
+            return
+        settings = Settings()  # type: ignore
+        # NOTE: entries can't be recorded while they're serialized, and the file is replaced atomically (see 'FileUtils.write_bytes')
+        with self._lock:
+            self._modified = False
+            # legacy entries are no longer needed once a file has been recorded with the current algorithm
+            for key in self._entries.keys() & self._legacy_entries.keys():
+                del self._legacy_entries[key]
+            try:
+                self.save_to_file(DirStateObj.get_path(),
+                                  settings.data_mode, settings.compression)
+            except Exception:
+                self._modified = True
+                raise
+
+    @classmethod
+    def from_json(cls, json_str: str) -> "DirStateObj":
+        data = json.loads(json_str)
+        if not isinstance(data.get("entries"), dict):
+            # saved before hash algorithms were configurable, entries are at the top level
+            return cls(data)
+        legacy = data.get("legacy") or {}
+        return cls(
+            data["entries"],
+            data.get("hash_alg", HashAlg.SHA3_256.name),
+            legacy.get("entries"),
+            legacy.get("hash_alg", "")
+        )
+
+    def to_json(self, pretty: bool = False) -> str:
+        entries = {path: list(entry) for path, entry in self._entries.items()}
+        obj: Dict[str, Any] = {"hash_alg": self.hash_alg, "entries": entries}
+        if self._legacy_entries:
+            obj["legacy"] = {
+                "hash_alg": self.legacy_hash_alg,
+                "entries": {path: list(entry) for path, entry in self._legacy_entries.items()}
+            }
+        return json.dumps(obj, indent=4 if pretty else None)
+
+    @staticmethod
+    def get_path() -> Path:
+        settings = Settings()  # type: ignore
+        return utils.get_summawise_dir() / f"dirstate.{settings.data_mode.ext()}"
+
+    @staticmethod
+    def delete():
+        path = DirStateObj.get_path()
+        path.unlink(missing_ok=True)
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import Optional, Dict
 
 
 class Encoding(Enum):
@@ -52,7 +52,10 @@ class Encoding(Enum):
         Get 'Encoding' Enum from chardet string. 
         Returns 'None' if no match is found.
         """
-        for encoding in cls:
-            if encoding.value.lower() == encoding_str.lower():
-                return encoding
-        return None
+        return _ENCODINGS_BY_NAME.get(encoding_str.lower())
+
+
+# NOTE: iterating over the enum skips aliases (duplicate values), so each name maps to the first member defined with it
+_ENCODINGS_BY_NAME: Dict[str, Encoding] = {
+    encoding.value.lower(): encoding for encoding in Encoding
+}
@@ -0,0 +1,241 @@
+import os
+import re
+import copy
+from typing import Collection, Iterable, List, Optional, Pattern, Tuple, Union
+from pathlib import Path
+
+# directories which are never descended into when walking a directory tree
+DIR_BLACKLIST = frozenset({".git", "node_modules", "site-packages", ".mypy_cache"})
+
+# extensions we'll still create embeddings for by creating a .txt duplicate
+EXTENSIONS_CONVERT = frozenset({'.lua'})
+
+# extensions supported by OpenAI by default
+EXTENSION_WHITELIST = frozenset({
+    '.py', '.js', '.txt', '.md', '.html', '.css', '.java', '.c', '.cpp',
+    '.rb', '.php', '.ts', '.json', '.xml', '.csv', '.xlsx', '.pptx', '.docx',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf', '.zip', '.tar', '.tex'
+})
+
+# rules applied to every directory scan, in .gitignore syntax
+DEFAULT_IGNORE_PATTERNS = tuple(
+    [f"{name}/" for name in sorted(DIR_BLACKLIST)] + ["*.egg-info/"])
+
+# ignore files which are honoured in each directory (later files take precedence)
+IGNORE_FILES = (".gitignore", ".summawiseignore")
+
+
+def glob_to_regex(glob: str) -> str:
+    """Translate a .gitignore style glob (without leading/trailing slashes) into a regular expression."""
+    out: List[str] = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            if glob.startswith("**", i):
+                at_start = i == 0 or glob[i - 1] == "/"
+                end = i + 2
+                if at_start and end < n and glob[end] == "/":
+                    # "**/" matches zero or more directories
+                    out.append("(?:.*/)?")
+                    i = end + 1
+                    continue
+                if at_start and end == n:
+                    # trailing "/**" matches everything inside
+                    out.append(".*")
+                    i = end
+                    continue
+                i = end - 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            start = i + 2 if glob[i + 1:i + 2] in ("!", "^") else i + 1
+            end = glob.find("]", start + 1 if glob[start:start + 1] == "]" else start)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                content = glob[i + 1:end].replace("\\", "\\\\")
+                if content[0] in ("!", "^"):
+                    content = "^" + content[1:]
+                out.append(f"[{content}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def translate_pattern(line: str) -> Optional[Tuple[str, bool]]:
+    """
+    Translate a line from a .gitignore file into a regular expression, used with 're.search'.
+    The expression is matched against a relative path (using forward slashes), with a trailing slash if the path is a directory.
+    Anything inside of a matching directory is matched as well.
+
+    Returns:
+        Optional[Tuple[str, bool]]: The regular expression and whether the pattern is negated, or 'None' if the line isn't a pattern.
+    """
+    line = line.rstrip("\r\n")
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    # patterns containing a slash (other than a trailing one) are relative to the ignore file, otherwise they match at any depth
+    anchored = "/" in line
+    body = glob_to_regex(line.lstrip("/"))
+    prefix = "^" if anchored else "(?:^|/)"
+    suffix = "/" if dir_only else "(?:/|$)"
+    return prefix + body + suffix, negate
+
+
+class IgnoreRules:
+    """A compiled set of .gitignore style patterns. All patterns are combined into a single expression."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = tuple(patterns)
+        translated = [t for t in map(translate_pattern, self.patterns) if t]
+        self._rules: List[Tuple[Pattern[str], bool]] = [
+            (re.compile(regex), negate) for regex, negate in translated
+        ]
+        self._combined: Optional[Pattern[str]] = None
+        if translated:
+            # NOTE: unanchored patterns share a prefix, grouping them avoids retrying it for each pattern
+            unanchored = [r[len("(?:^|/)"):]
+                          for r, _ in translated if r.startswith("(?:^|/)")]
+            anchored = [r for r, _ in translated if not r.startswith("(?:^|/)")]
+            alternatives = [f"(?:{r})" for r in anchored]
+            if unanchored:
+                alternatives.append(
+                    "(?:^|/)(?:" + "|".join(f"(?:{r})" for r in unanchored) + ")")
+            self._combined = re.compile("|".join(alternatives))
+        self._has_negation = any(negate for _, negate in translated)
+
+    def __bool__(self) -> bool:
+        return self._combined is not None
+
+    def match(self, rel_path: str) -> Optional[bool]:
+        """
+        Match a relative path against the rules (the last matching pattern takes precedence).
+        Returns True if the path is ignored, False if it's explicitly re-included by a negated pattern, or 'None' if nothing matched.
+        """
+        if self._combined is None or self._combined.search(rel_path) is None:
+            return None
+        if not self._has_negation:
+            return True
+        for regex, negate in reversed(self._rules):
+            if regex.search(rel_path):
+                return not negate
+        return None
+
+
+class FileFilter:
+    """
+    Decides which files in a directory tree are included in a scan, based on their extension and ignore rules.
+    Filters are immutable, 'enter' returns a filter which also includes the ignore files of a nested directory.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        extensions: Collection[str] = EXTENSION_WHITELIST | EXTENSIONS_CONVERT,
+        patterns: Iterable[str] = DEFAULT_IGNORE_PATTERNS,
+        ignore_files: Collection[str] = IGNORE_FILES
+    ):
+        self.root = os.path.abspath(root)
+        # paths are usually provided relative to the root in the same form it was provided in
+        self._root_prefixes = tuple(
+            {self.root + os.sep, os.path.join(os.fspath(root), "")})
+        self.extensions = frozenset(extensions)
+        self.ignore_files = tuple(ignore_files)
+        # (path prefix relative to root, rules), from the root outwards
+        self._levels: Tuple[Tuple[str, IgnoreRules], ...] = (
+            ("", IgnoreRules(patterns)),)
+
+    def enter(self, dir_path: Path, names: Optional[Collection[str]] = None) -> "FileFilter":
+        """
+        Returns a filter for the contents of a directory, which includes the directory's ignore files (if any).
+        Parameters:
+            dir_path (Path): The directory being entered.
+            names (Optional[Collection[str]]): The names of the directory's entries, if they're already known (saves a stat per ignore file).
+        """
+        patterns: List[str] = []
+        for name in self.ignore_files:
+            ignore_path = os.path.join(dir_path, name)
+            exists = name in names if names is not None else os.path.isfile(ignore_path)
+            if not exists:
+                continue
+            try:
+                with open(ignore_path, "r", encoding="utf-8", errors="replace") as f:
+                    patterns.extend(f.readlines())
+            except OSError:
+                continue
+
+        if not any(translate_pattern(p) for p in patterns):
+            return self
+
+        prefix = self.relative(dir_path)
+        prefix = prefix + "/" if prefix else ""
+        levels = self._levels
+        if levels and levels[-1][0] == prefix:
+            # rules for the same directory are merged, so each path is only matched against one expression per directory
+            patterns = list(levels[-1][1].patterns) + patterns
+            levels = levels[:-1]
+
+        entered = copy.copy(self)
+        entered._levels = levels + ((prefix, IgnoreRules(patterns)),)
+        return entered
+
+    def relative(self, path: Union[str, Path]) -> str:
+        path_str = os.fspath(path)
+        for root_prefix in self._root_prefixes:
+            if path_str.startswith(root_prefix):
+                rel_path = path_str[len(root_prefix):]
+                return rel_path if os.sep == "/" else rel_path.replace(os.sep, "/")
+
+        path_str = os.path.abspath(path_str)
+        if path_str == self.root:
+            return ""
+        if path_str.startswith(self.root + os.sep):
+            rel_path = path_str[len(self.root) + 1:]
+        else:
+            # paths outside of the root are matched from the top of the filesystem
+            rel_path = os.path.splitdrive(path_str)[1].lstrip(os.sep)
+        return rel_path if os.sep == "/" else rel_path.replace(os.sep, "/")
+
+    def is_ignored(self, rel_path: str) -> bool:
+        """Check if a path (relative to the root, with a trailing slash for directories) is ignored."""
+        # nested ignore files take precedence over those closer to the root
+        for prefix, rules in reversed(self._levels):
+            if prefix and not rel_path.startswith(prefix):
+                continue
+            result = rules.match(rel_path[len(prefix):])
+            if result is not None:
+                return result
+        return False
+
+    def excludes_dir(self, dir_path: Union[str, Path]) -> bool:
+        return self.is_ignored(self.relative(dir_path) + "/")
+
+    def includes_file(self, file_path: Union[str, Path]) -> bool:
+        rel_path = self.relative(file_path)
+        name = rel_path[rel_path.rfind("/") + 1:]
+        dot = name.rfind(".")
+        # NOTE: equivalent to 'Path.suffix', a leading dot (ex: '.bashrc') isn't an extension
+        if dot <= 0 or name[dot:] not in self.extensions:
+            return False
+        return not self.is_ignored(rel_path)
@@ -0,0 +1,205 @@
+import os
+import mmap
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, NamedTuple, Dict, Set, Sequence, Tuple, Union
+from pathlib import Path
+from summawise import profiling
+from summawise.data import HashAlg, ExecutorType, DataUnit
+from summawise.files.encodings import Encoding
+from summawise.files import utils as FileUtils
+from summawise.files.dirstate import DirStateObj
+from summawise.settings import Settings
+
+# number of files handled by each task submitted to the pool (amortizes the cost of inter-process communication)
+CHUNK_SIZE = 32
+
+# files larger than this are memory mapped rather than read into memory (and their contents aren't kept for uploading)
+MMAP_THRESHOLD = 16 * DataUnit.MB
+
+
+class IngestResult(NamedTuple):
+    path: Path
+    hash: str
+    encoding: Optional[Encoding]
+    data: Optional[bytes] = None  # contents of the file, passed along to be uploaded so it isn't read again
+    name: Optional[str] = None  # name the file is uploaded as, defaults to the name of 'path'
+    in_memory: bool = False  # the file only exists in memory (ex: a transcript or download), 'data' holds its contents
+    # hashes of the contents with legacy algorithms, used to find cache entries keyed by them (see 'FileCacheDB.legacy_hash_algs')
+    legacy_hashes: Tuple[Tuple[HashAlg, str], ...] = ()
+
+    @property
+    def upload_name(self) -> str:
+        return self.name or self.path.name
+
+
+def calculate_legacy_hashes(
+    data: Union[bytes, memoryview],
+    legacy_hash_algs: Sequence[HashAlg]
+) -> Tuple[Tuple[HashAlg, str], ...]:
+    hashes: List[Tuple[HashAlg, str]] = []
+    for alg in legacy_hash_algs:
+        hash = alg.calculate(data)
+        assert isinstance(hash, str)
+        hashes.append((alg, hash))
+    return tuple(hashes)
+
+
+def ingest_file(
+    file_path: Path,
+    hash_alg: Optional[HashAlg] = None,
+    keep_data: bool = True,
+    legacy_hash_algs: Sequence[HashAlg] = ()
+) -> IngestResult:
+    """
+    Read a file once, detecting its encoding and calculating its hash from the same buffer.
+    If 'keep_data' is True, the contents of the file are included in the result (unless it's memory mapped).
+    The hash algorithm defaults to 'Settings.hash_alg'. The hashes of 'legacy_hash_algs' are calculated from the same buffer as well.
+    """
+    hash_alg = hash_alg or Settings().hash_alg  # type: ignore
+    with open(file_path, "rb") as f, profiling.span("ingest", files=1) as span:
+        size = os.fstat(f.fileno()).st_size
+        span.add(bytes=size)
+        if size > MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    hash = hash_alg.calculate(view)
+                    legacy_hashes = calculate_legacy_hashes(view, legacy_hash_algs)
+                assert isinstance(hash, str)
+                encoding = FileUtils.detect_encoding(
+                    mm[:FileUtils.ENCODING_SAMPLE_SIZE], hash)
+            data = None
+        else:
+            data = f.read()
+            hash = hash_alg.calculate(data)
+            legacy_hashes = calculate_legacy_hashes(data, legacy_hash_algs)
+            assert isinstance(hash, str)
+            encoding = FileUtils.detect_encoding(
+                data[:FileUtils.ENCODING_SAMPLE_SIZE], hash)
+
+    return IngestResult(file_path, hash, encoding, data if keep_data else None, legacy_hashes=legacy_hashes)
+
+
+def ingest_bytes(
+    name: str,
+    data: bytes,
+    hash_alg: Optional[HashAlg] = None,
+    legacy_hash_algs: Sequence[HashAlg] = ()
+) -> IngestResult:
+    """Ingest the contents of a file which only exists in memory, so it can be uploaded without being written to disk."""
+    hash_alg = hash_alg or Settings().hash_alg  # type: ignore
+    with profiling.span("ingest", files=1, bytes=len(data)):
+        hash = hash_alg.calculate(data)
+        assert isinstance(hash, str)
+        legacy_hashes = calculate_legacy_hashes(data, legacy_hash_algs)
+        encoding = FileUtils.detect_encoding(
+            data[:FileUtils.ENCODING_SAMPLE_SIZE], hash)
+    return IngestResult(Path(name), hash, encoding, data, in_memory=True, legacy_hashes=legacy_hashes)
+
+
+def _ingest_chunk(file_paths: List[Path], hash_alg: HashAlg, legacy_hash_algs: Sequence[HashAlg]) -> List[IngestResult]:
+    return [ingest_file(file_path, hash_alg, legacy_hash_algs=legacy_hash_algs) for file_path in file_paths]
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def create_executor(workers: int = 0, executor_type: ExecutorType = ExecutorType.THREAD) -> Executor:
+    workers = workers if workers > 0 else default_workers()
+    if executor_type == ExecutorType.PROCESS:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def ingest_files(
+    files: Iterable[Path],
+    workers: int = 0,
+    executor_type: ExecutorType = ExecutorType.THREAD,
+    hash_alg: Optional[HashAlg] = None,
+    dirstate: Optional[DirStateObj] = None,
+    legacy_hash_algs: Sequence[HashAlg] = ()
+) -> Iterator[IngestResult]:
+    """
+    Detect the encoding of, and calculate the hash of, many files concurrently (see 'ingest_file').
+
+    Parameters:
+        files (Iterable[Path]): The files to process. This may be a lazy iterable (such as 'walk_files').
+        workers (int): The number of workers to use. Defaults to the number of CPUs if not positive.
+        executor_type (ExecutorType): Whether to use a thread pool or a process pool.
+        hash_alg (Optional[HashAlg]): The hashing algorithm used to calculate the hash of each file. Defaults to 'Settings.hash_alg'.
+        dirstate (Optional[DirStateObj]): If provided, files which are unchanged since they were last ingested aren't read at all.
+            It's ignored if its hashes were calculated with a different algorithm.
+        legacy_hash_algs (Sequence[HashAlg]): Algorithms the hash of each file which is read is also calculated with (see 'ingest_file').
+
+    Yields:
+        IngestResult: The result for each file, in the order they finish (not the order they were provided).
+    """
+    workers = workers if workers > 0 else default_workers()
+    hash_alg = hash_alg or Settings().hash_alg  # type: ignore
+    if dirstate is not None and dirstate.hash_alg != hash_alg.name:
+        dirstate = None
+    stats: Dict[Path, os.stat_result] = {}
+
+    def unchanged() -> Iterator[Path]:
+        # files with a matching dirstate entry are yielded directly, the rest are passed along to be read
+        for file_path in files:
+            if dirstate is None:
+                yield file_path
+                continue
+            stat, entry = dirstate.lookup(file_path)
+            if entry is not None and entry.encoding is not None:
+                encoding = Encoding(entry.encoding) if entry.encoding else None
+                restored.append(IngestResult(file_path, entry.hash, encoding))
+            else:
+                stats[file_path] = stat
+                yield file_path
+
+    def record(result: IngestResult) -> IngestResult:
+        stat = stats.pop(result.path, None)
+        if dirstate is not None and stat is not None:
+            dirstate.record(result.path, stat, result.hash,
+                            result.encoding, encoding_detected=True)
+        return result
+
+    restored: List[IngestResult] = []
+    changed = unchanged()
+
+    def drain_restored() -> Iterator[IngestResult]:
+        while restored:
+            yield restored.pop()
+
+    if workers == 1:
+        for file_path in changed:
+            yield from drain_restored()
+            yield record(ingest_file(file_path, hash_alg, legacy_hash_algs=legacy_hash_algs))
+        yield from drain_restored()
+        return
+
+    # bound the number of chunks in flight, so we don't hold every path in memory at once
+    max_pending = workers * 2
+    executor = create_executor(workers, executor_type)
+    pending: Set["Future[List[IngestResult]]"] = set()
+
+    def submit_chunks():
+        while len(pending) < max_pending:
+            chunk = list(islice(changed, CHUNK_SIZE))
+            if not chunk:
+                break
+            pending.add(executor.submit(_ingest_chunk, chunk, hash_alg, tuple(legacy_hash_algs)))
+
+    try:
+        submit_chunks()
+        yield from drain_restored()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            submit_chunks()
+            yield from drain_restored()
+            for future in done:
+                for result in future.result():
+                    yield record(result)
+        yield from drain_restored()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
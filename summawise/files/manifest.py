@@ -0,0 +1,68 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+from summawise.serializable import Serializable
+from summawise.settings import Settings
+from summawise.data import HashAlg
+from summawise import utils
+
+
+@dataclass
+class DirManifest(Serializable):
+    """Records the vector store created for a directory, and the hash/file id of each file (by relative path) it contains."""
+    dir_path: str
+    vector_store_id: str = ""
+    files: Dict[str, List[str]] = field(default_factory=dict)  # path -> [hash, file_id]
+    key: str = ""  # identifies the set of files in the vector store (see 'ai.vector_store_key')
+    owned: bool = True  # False if the vector store was reused from another scan of identical files, so it's never modified
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # manifests saved before vector stores were reused between scans
+        state.setdefault("key", "")
+        state.setdefault("owned", True)
+        self.__dict__.update(state)
+
+    @property
+    def file_ids(self) -> List[str]:
+        return [file_id for _, file_id in self.files.values()]
+
+    def diff(self, files: Dict[str, Tuple[str, str]]) -> Tuple[List[str], List[str]]:
+        """
+        Compare the manifest to the current state of a directory.
+
+        Parameters:
+            files (Dict[str, Tuple[str, str]]): Maps the relative path of each file currently in the directory to its (hash, file_id).
+
+        Returns:
+            Tuple[List[str], List[str]]: The file ids which need to be added to the vector store, and the file ids which need to be removed from it.
+        """
+        current_ids = {file_id for _, file_id in files.values()}
+        previous_ids = set(self.file_ids)
+        added = sorted(current_ids - previous_ids)
+        removed = sorted(previous_ids - current_ids)
+        return added, removed
+
+    def save(self):
+        settings = Settings()  # type: ignore
+        self.save_to_file(
+            file_path=DirManifest.get_path(Path(self.dir_path)),
+            mode=settings.data_mode,
+            compress=settings.compression,
+            pretty_json=True
+        )
+
+    @staticmethod
+    def load(dir_path: Path) -> Optional["DirManifest"]:
+        """Load the manifest for the given directory. Returns 'None' if it has never been scanned."""
+        settings = Settings()  # type: ignore
+        path = utils.fp(DirManifest.get_path(dir_path))
+        if not path.exists():
+            return None
+        return DirManifest.from_file(path, settings.data_mode)
+
+    @staticmethod
+    def get_path(dir_path: Path) -> Path:
+        settings = Settings()  # type: ignore
+        dir_hash = HashAlg.XXH3_64.calculate(os.path.abspath(dir_path))
+        return utils.get_summawise_dir() / "dirs" / f"{dir_hash}.{settings.data_mode.ext()}"
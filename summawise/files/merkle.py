@@ -0,0 +1,47 @@
+import json
+from typing import Any, Iterable, List, Mapping, Optional, Tuple
+from summawise.data import HashAlg
+from summawise.settings import Settings
+
+# prefixes which distinguish leaves from interior nodes, so a set of leaves can't collide with a different tree (RFC 6962)
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+
+def merkle_root(leaves: List[bytes], hash_alg: HashAlg) -> bytes:
+    """Calculate the root of a binary Merkle tree built from the given leaves (in order). An odd node is promoted to the next level."""
+    def digest(*parts: bytes) -> bytes:
+        hash_obj = hash_alg.new()
+        for part in parts:
+            hash_obj.update(part)
+        return hash_obj.digest()
+
+    level = [digest(_LEAF_PREFIX, leaf) for leaf in leaves]
+    if not level:
+        return digest(_LEAF_PREFIX)
+    while len(level) > 1:
+        paired = [digest(_NODE_PREFIX, level[i], level[i + 1])
+                  for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
+
+
+def file_set_key(
+    files: Iterable[Tuple[str, str]],
+    config: Optional[Mapping[str, Any]] = None,
+    hash_alg: Optional[HashAlg] = None
+) -> str:
+    """
+    Calculate a key which identifies a set of files, from the (path, content hash) of each file and any config used to process them.
+    The order files are provided in doesn't matter, and the key changes if any path, content, or config value changes.
+    The hash algorithm defaults to 'Settings.hash_alg'.
+    """
+    hash_alg = hash_alg or Settings().hash_alg  # type: ignore
+    leaves = [f"{path}\0{hash}".encode("utf-8") for path, hash in sorted(files)]
+    root = merkle_root(leaves, hash_alg)
+    config_str = json.dumps(config or {}, sort_keys=True)
+    key = hash_alg.calculate(root + f"\0{hash_alg.name}\0{config_str}".encode("utf-8"))
+    assert isinstance(key, str)
+    return key
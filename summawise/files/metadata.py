@@ -1,7 +1,9 @@
+import time
 from dataclasses import dataclass
+from typing import Optional
 from pathlib import Path
 from summawise.serializable import Serializable
-from summawise.utils import calculate_hash
+from summawise.files import dirstate
 
 
 @dataclass
@@ -17,8 +19,9 @@ class FileMetadata(Serializable):
     file_id: str = ""
 
     @classmethod
-    def create_from_path(cls, file_path: Path) -> "FileMetadata":
-        hash = str(calculate_hash(file_path))
+    def create_from_path(cls, file_path: Path, hash: Optional[str] = None) -> "FileMetadata":
+        if hash is None:
+            hash = dirstate.get().hash_file(file_path)
         stats = file_path.stat()
         sz_bytes = stats.st_size
         created_at = stats.st_ctime
@@ -27,3 +30,9 @@ class FileMetadata(Serializable):
 
         return cls(hash, file_path.name, str(file_path), sz_bytes,
                    created_at, last_modified_at, last_accessed_at)
+
+    @classmethod
+    def create_from_bytes(cls, name: str, data: bytes, hash: str) -> "FileMetadata":
+        """Create metadata for a file which only exists in memory (timestamps are the current time)."""
+        now = time.time()
+        return cls(hash, name, name, len(data), now, now, now)
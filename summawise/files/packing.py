@@ -0,0 +1,152 @@
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from pathlib import Path
+from summawise.files.contents import FileContents
+from summawise.data import DataUnit
+
+# maximum length (in characters) of the content of a single message
+MESSAGE_MAX_LENGTH = 256000
+
+# space reserved in each entry of a split file for its part number (ex: "12/345")
+_PART_RESERVE = len("99999/99999")
+
+# the smallest amount of content worth splitting a file into (if a path is absurdly long, the file is skipped)
+_MIN_PART_LENGTH = 1024
+
+
+@dataclass
+class PackResult:
+    """The messages built from a set of files, and a summary of what they contain."""
+    messages: List[str] = field(default_factory=list)
+    files: int = 0
+    bytes: int = 0  # total size of the messages (utf-8 encoded)
+    split: Dict[str, int] = field(default_factory=dict)  # path -> number of parts, for files split across messages
+    skipped: List[str] = field(default_factory=list)  # files which couldn't be read/included
+
+    def summary(self) -> str:
+        lines = [f"Sent {self.files} file(s) in {len(self.messages)} message(s) ({DataUnit.bytes_to_str(self.bytes)})."]
+        if self.split:
+            parts = [f"{Path(path).name} ({count} parts)" for path, count in self.split.items()]
+            lines.append(f"{len(parts)} file(s) were split across messages: {_truncate_list(parts)}")
+        if self.skipped:
+            names = [Path(path).name for path in self.skipped]
+            lines.append(f"{len(names)} file(s) were skipped: {_truncate_list(names)}")
+        return "\n".join(lines)
+
+
+def _truncate_list(items: List[str], limit: int = 5) -> str:
+    if len(items) > limit:
+        items = items[:limit] + [f"and {len(items) - limit} more"]
+    return ", ".join(items)
+
+
+def _is_escape_start(escaped: str, idx: int) -> bool:
+    """Check if the backslash at 'idx' begins an escape sequence (rather than being the escaped character itself)."""
+    backslashes = 0
+    while idx - backslashes > 0 and escaped[idx - backslashes - 1] == "\\":
+        backslashes += 1
+    return backslashes % 2 == 0
+
+
+def _escape_boundary(escaped: str, start: int, end: int) -> int:
+    """Move 'end' back so it doesn't fall in the middle of an escape sequence (ex: '\\n' or '\\u001b')."""
+    for idx in range(end - 1, max(start, end - 6) - 1, -1):
+        if escaped[idx] == "\\" and _is_escape_start(escaped, idx):
+            length = 6 if escaped[idx + 1:idx + 2] == "u" else 2
+            return idx if idx + length > end else end
+    return end
+
+
+def split_escaped(escaped: str, max_length: int) -> List[str]:
+    """
+    Split the body of a json string into parts of at most 'max_length' characters, without splitting escape sequences.
+    Parts end on a line break when there's one in the second half of the part.
+    """
+    parts: List[str] = []
+    start = 0
+    while len(escaped) - start > max_length:
+        end = start + max_length
+        newline = escaped.rfind("\\n", start + max_length // 2, end)
+        if newline != -1 and _is_escape_start(escaped, newline):
+            end = newline + 2
+        else:
+            end = _escape_boundary(escaped, start, end)
+        parts.append(escaped[start:end])
+        start = end
+    parts.append(escaped[start:])
+    return parts
+
+
+def file_entries(path: str, content: str, max_length: int = MESSAGE_MAX_LENGTH - 2) -> List[str]:
+    """
+    Encode a file as a json object containing its path and content.
+    If the object would exceed 'max_length', the content is split into several ordered objects, each with a "part" field.
+    """
+    path_json = json.dumps(path, ensure_ascii=False)
+    # NOTE: ensure_ascii is disabled so non-ascii characters aren't inflated into '\uXXXX' escape sequences
+    escaped = json.dumps(content, ensure_ascii=False)[1:-1]
+    entry = f'{{"path": {path_json}, "content": "{escaped}"}}'
+    if len(entry) <= max_length:
+        return [entry]
+
+    overhead = len(f'{{"path": {path_json}, "part": "", "content": ""}}') + _PART_RESERVE
+    if max_length - overhead < _MIN_PART_LENGTH:
+        return []
+    parts = split_escaped(escaped, max_length - overhead)
+    return [
+        f'{{"path": {path_json}, "part": "{idx}/{len(parts)}", "content": "{part}"}}'
+        for idx, part in enumerate(parts, start=1)
+    ]
+
+
+def pack_file_contents(file_contents: FileContents, max_length: int = MESSAGE_MAX_LENGTH) -> PackResult:
+    """
+    Pack the contents of many files into as few messages as possible.
+    Each message is a json array of file objects, at most 'max_length' characters long.
+    Files are packed largest first into the first message they fit in (first-fit decreasing), and files which are too large
+    for a single message are split into parts which always appear in order.
+    """
+    result = PackResult()
+    groups: List[Tuple[str, List[str]]] = []
+    for file_path in file_contents:
+        path = str(file_path)
+        try:
+            entries = file_entries(path, file_contents[file_path], max_length - 2)
+        except (OSError, KeyError):
+            entries = []
+        if not entries:
+            result.skipped.append(path)
+            continue
+        if len(entries) > 1:
+            result.split[path] = len(entries)
+        groups.append((path, entries))
+
+    groups.sort(key=lambda group: max(map(len, group[1])), reverse=True)
+
+    # each message starts as "[" and ends with "]", and its entries are separated by ",\n"
+    capacity = max_length - 2
+    bins: List[List[str]] = []
+    sizes: List[int] = []
+    for _, entries in groups:
+        min_bin = 0
+        for entry in entries:
+            idx = next((
+                i for i in range(min_bin, len(bins))
+                if sizes[i] + 2 + len(entry) <= capacity
+            ), None)
+            if idx is None:
+                bins.append([entry])
+                sizes.append(len(entry))
+                idx = len(bins) - 1
+            else:
+                bins[idx].append(entry)
+                sizes[idx] += 2 + len(entry)
+            # later parts of a split file must be placed after the previous part
+            min_bin = idx + 1
+
+    result.messages = ["[" + ",\n".join(entries) + "]" for entries in bins]
+    result.files = len(groups)
+    result.bytes = sum(len(message.encode("utf-8")) for message in result.messages)
+    return result
+
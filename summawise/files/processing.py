@@ -1,42 +1,126 @@
-import shutil
-import tempfile
+import os
+from typing import Iterator, Dict, Optional
 from pathlib import Path
-from summawise import ai, utils
+from summawise import ai, profiling, utils
 from summawise.files.metadata import FileMetadata
+from summawise.files.ingest import IngestResult, ingest_file, ingest_files, ingest_bytes
+from summawise.files.manifest import DirManifest
+from summawise.files.contents import FileContents
+from summawise.files.filters import FileFilter
 from summawise.files import utils as FileUtils
+from summawise.files import dirstate
 from summawise.settings import Settings
 
 
 def process_dir(dir_path: Path, delete: bool = True) -> ai.Resources:
     _ = delete
 
+    # use settings class (singleton)
+    settings = Settings()  # type: ignore
+
     resources: ai.Resources
-    all_files = FileUtils.list_files(dir_path)
-    # TODO(justin): look into improving/validating approach
-    filtered = FileUtils.filter_files(all_files)
-
-    temp_files = []
-    for fp in filtered.files_conv:
-        temp_dir = tempfile.gettempdir()
-        fp_new = Path(temp_dir) / (fp.stem + ".txt")
-        shutil.copy(fp, fp_new)
-        temp_files.append(fp_new)
-
-    files = filtered.files + temp_files
+    walk_stats = FileUtils.WalkStats()
+    # extensions, blacklisted directories, and ignore files (.gitignore/.summawiseignore) are applied while walking
+    file_filter = FileFilter(dir_path)
+    with profiling.span("list_files") as span:
+        files = list(FileUtils.walk_files(
+            dir_path, stats=walk_stats, file_filter=file_filter))
+        span.add(files=walk_stats.files, excluded=walk_stats.excluded, pruned=walk_stats.pruned)
+    total_count = walk_stats.files + walk_stats.excluded
+    print(
+        f"Directory walk visited {walk_stats.visited} entries, pruned {walk_stats.pruned} ignored directories.")
+
+    # maps the path of each file which is uploaded to its path relative to the directory
+    rel_paths: Dict[Path, str] = {}
+
+    def validated_files() -> Iterator[IngestResult]:
+        # encoding detection/hashing runs concurrently, results are passed along to be uploaded as they finish
+        ingested = ingest_files(
+            files,
+            workers=settings.workers,
+            executor_type=settings.executor_type,
+            dirstate=dirstate.get(),
+            legacy_hash_algs=ai.FileCache.legacy_hash_algs()
+        )
+        for result in ingested:
+            if result.encoding not in FileUtils.ENCODING_WHITELIST:
+                continue
+            if result.path.suffix in FileUtils.EXTENSIONS_CONVERT:
+                # uploaded with a supported extension (ex: 'init.lua.txt'), the content (and hash) are unchanged
+                result = result._replace(name=result.path.name + ".txt")
+            rel_paths[result.path] = result.path.relative_to(
+                dir_path).as_posix()
+            yield result
+
     try:
+        file_infos = ai.get_file_infos(validated_files())
+        cached_count = sum(1 for info in file_infos if info.cached)
         print(
-            f"Directory scan located and validated {len(files)}/{filtered.total_count} files.")
-        resources = ai.create_vector_store(dir_path.name, files)
-        print(f"Vector store created with ID: {resources.vector_store_id}")
+            f"Directory scan located and validated {len(file_infos)}/{total_count} files. [{cached_count} file(s) already cached]")
+
+        file_hashes = {
+            rel_paths[info.path]: (info.hash, info.file_id)
+            for info in file_infos if info.path
+        }
+        file_ids = [info.file_id for info in file_infos]
+
+        key = ai.vector_store_key((path, hash) for path, (hash, _) in file_hashes.items())
+
+        # if this directory has been scanned before, only apply changes to the existing vector store
+        manifest = DirManifest.load(dir_path)
+        vector_store = None
+        if manifest and manifest.vector_store_id:
+            vector_store = ai.get_vector_store(manifest.vector_store_id)
+            # the vector store is shared with another directory which has changed its files since
+            store_key = ai.FileCache.get_vector_store_key(manifest.vector_store_id)
+            if manifest.key and store_key and store_key != manifest.key:
+                vector_store = None
+
+        if manifest is None or vector_store is None:
+            manifest = DirManifest(os.path.abspath(dir_path))
+            # an identical set of files may have been scanned before (ex: a copy of this directory)
+            vector_store = ai.find_vector_store(key)
+            if vector_store is not None:
+                manifest.owned = False
+                print(f"Reusing vector store with ID: {vector_store.id} [identical files]")
+            else:
+                vector_store = ai.create_vector_store_from_file_ids(
+                    dir_path.name, file_ids)
+                print(f"Vector store created with ID: {vector_store.id}")
+        else:
+            added, removed = manifest.diff(file_hashes)
+            shared = not manifest.owned or ai.FileCache.is_vector_store_shared(vector_store.id)
+            if (added or removed) and shared:
+                # the vector store is shared with another scan of identical files (reused by it, or from it),
+                # so a new one is created rather than modifying it (threads saved by the other scan keep searching the same files)
+                manifest.owned = True
+                vector_store = ai.create_vector_store_from_file_ids(
+                    dir_path.name, file_ids)
+                print(f"Vector store created with ID: {vector_store.id}")
+            else:
+                ai.run(ai.gather(
+                    ai.add_vector_store_files_async(vector_store.id, added),
+                    ai.remove_vector_store_files_async(vector_store.id, removed)
+                ))
+                print(
+                    f"Vector store updated with ID: {vector_store.id} [{len(added)} file(s) added, {len(removed)} file(s) removed]")
+
+        ai.FileCache.set_vector_store_id(key, vector_store.id)
+        manifest.key = key
+        manifest.vector_store_id = vector_store.id
+        manifest.files = {path: list(info) for path, info in file_hashes.items()}
+        manifest.save()
+
+        file_contents = FileContents(
+            (info.path, info.encoding) for info in file_infos if info.path)
+        resources = ai.create_resources(
+            vector_store.id, file_infos, file_contents)
     except Exception as ex:
         raise Exception(f"Error creating vector store [{type(ex)}]: {ex}")
-
-    for file in temp_files:
-        if file.exists():
-            try:
-                file.unlink()
-            except:
-                pass
+    finally:
+        # entries of files under the directory which the walk didn't find are dropped, so they don't accumulate
+        dirstate.get().prune(dir_path, files)
+        dirstate.get().save()
 
     return resources
 
@@ -46,19 +130,65 @@ def process_file(file_path: Path, delete: bool = False) -> ai.Resources:
     # - add archive support (.zip, .tar.gz) - extract, call process_dir
     # - maybe add automatic extraction of text from pdf or html (undecided)
 
+    # the file is read once, its contents are passed along to be uploaded if it isn't cached
+    ingested = next(ingest_files(
+        [file_path], workers=1, dirstate=dirstate.get(), legacy_hash_algs=ai.FileCache.legacy_hash_algs()))
+    metadata = FileMetadata.create_from_path(file_path, ingested.hash)
+    resources = _process_ingested(ingested, metadata)
+
+    dirstate.get().save()
+
+    if delete and file_path.exists():
+        file_path.unlink()
+
+    return resources
+
+
+def process_bytes(name: str, data: bytes) -> ai.Resources:
+    """Process a file which only exists in memory (such as a download), it's uploaded directly without being written to disk."""
+    ingested = ingest_bytes(name, data, legacy_hash_algs=ai.FileCache.legacy_hash_algs())
+    metadata = FileMetadata.create_from_bytes(name, data, ingested.hash)
+    return _process_ingested(ingested, metadata)
+
+
+def process_download(file_path: Path) -> ai.Resources:
+    """
+    Process a download which was too large to be kept in memory, from the temporary file it was spooled to.
+    Unlike 'process_file', the file isn't tracked by the dirstate, and its metadata refers to it by name only.
+    """
+    ingested = ingest_file(file_path, keep_data=False, legacy_hash_algs=ai.FileCache.legacy_hash_algs())
+    metadata = FileMetadata.create_from_path(file_path, ingested.hash)
+    metadata.full_path = metadata.name
+    return _process_ingested(ingested, metadata)
+
+
+def _process_ingested(ingested: IngestResult, metadata: FileMetadata) -> ai.Resources:
     # use settings class (singleton)
     settings = Settings()  # type: ignore
 
     # file extension to cache file metadata (json or bin)
     ext = settings.data_mode.ext()
 
-    metadata = FileMetadata.create_from_path(file_path)
     hash = metadata.hash
     hash_path = utils.fp(utils.get_summawise_dir() / "files" / f"{hash}.{ext}")
 
+    legacy_path = None if hash_path.exists() else _legacy_metadata_path(ingested)
+    if legacy_path is not None:
+        # processed before the hash algorithm changed, the metadata is saved under the current hash as well
+        legacy_metadata = FileMetadata.from_file(legacy_path, settings.data_mode)
+        legacy_metadata.hash = hash
+        legacy_metadata.save_to_file(
+            file_path=hash_path,
+            mode=settings.data_mode,
+            compress=settings.compression,
+            pretty_json=True
+        )
+        hash_path = utils.fp(hash_path)
+
     if not hash_path.exists():
         try:
-            resources = ai.create_vector_store(file_path.stem, [file_path])
+            resources = ai.create_vector_store(
+                ingested.path.stem, [ingested])
             metadata.vector_store_id = resources.vector_store_id
             metadata.file_id = next(iter(resources.file_ids))
             metadata.save_to_file(
@@ -68,17 +198,33 @@ def process_file(file_path: Path, delete: bool = False) -> ai.Resources:
                 pretty_json=True
             )
             print(f"Vector store created with ID: {metadata.vector_store_id}")
+            return resources
         except Exception as ex:
             raise Exception(f"Error creating vector store [{type(ex)}]: {ex}")
-    else:
-        metadata = FileMetadata.from_file(hash_path, settings.data_mode)
-        print(
-            f"Restored vector store ID from cache: {metadata.vector_store_id}")
-
-    if delete and file_path.exists():
-        file_path.unlink()
 
+    metadata = FileMetadata.from_file(hash_path, settings.data_mode)
+    print(
+        f"Restored vector store ID from cache: {metadata.vector_store_id}")
     return ai.Resources(
         vector_store_ids=[metadata.vector_store_id],
         file_ids=[metadata.file_id]
     )
+
+
+def _legacy_metadata_path(ingested: IngestResult) -> Optional[Path]:
+    """
+    Find metadata saved under the hash of a legacy algorithm, if there is any.
+    Legacy hashes are calculated while files are read (see 'FileCacheDB.legacy_hash_algs'), or restored from the dirstate.
+    """
+    legacy_hashes = list(ingested.legacy_hashes)
+    if not legacy_hashes and not ingested.in_memory:
+        legacy = dirstate.get().legacy_hash(ingested.path)
+        if legacy is not None:
+            legacy_hashes.append(legacy)
+    settings = Settings()  # type: ignore
+    for _, legacy_hash in legacy_hashes:
+        path = utils.fp(utils.get_summawise_dir() / "files" /
+                        f"{legacy_hash}.{settings.data_mode.ext()}")
+        if path.exists():
+            return path
+    return None
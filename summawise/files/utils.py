@@ -1,14 +1,27 @@
+import os
 import re
+import codecs
+import threading
 import pickle
 import gzip
-import chardet
-from typing import TypeVar, Type, List, Optional, NamedTuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import TypeVar, Type, List, Optional, NamedTuple, Iterable, Iterator, Collection, Set
 from pathlib import Path
 from summawise.files.encodings import Encoding
+from summawise.files.filters import FileFilter, DIR_BLACKLIST, EXTENSIONS_CONVERT, EXTENSION_WHITELIST
 from summawise.data import DataUnit
+from summawise import profiling
 
 T = TypeVar("T")
 
+# number of bytes at the start of a file used to detect its encoding
+ENCODING_SAMPLE_SIZE = 4 * DataUnit.KB
+
+# encodings of files which we're willing to upload from a directory
+ENCODING_WHITELIST = frozenset({Encoding.UTF_8, Encoding.ASCII})
+
 
 def write_str(file_path: Path, text: str, compress: bool = False) -> None:
     file_path.parent.mkdir(parents=True, exist_ok=True)
@@ -18,18 +31,26 @@ def write_str(file_path: Path, text: str, compress: bool = False) -> None:
 
 def read_str(file_path: Path) -> str:
     data = read_bytes(file_path)
-    text = data.decode("utf-8")
+    text = data.decode("utf-8-sig")
     return text
 
 
 def write_bytes(file_path: Path, data: bytes, compress: bool = False) -> None:
+    """Write a file atomically: the data is written to a temporary file which replaces it, so readers never see a partial file."""
     file_path.parent.mkdir(parents=True, exist_ok=True)
     if compress:
         if file_path.suffix != ".bin" and ".gz" not in file_path.suffixes:
             file_path = file_path.with_suffix(file_path.suffix + ".gz")
         data = gzip.compress(data)
-    with open(file_path, 'wb') as file:
-        file.write(data)
+    # unique to this thread, since several threads (or processes) may write the same file at once
+    temp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
 
 
 def read_bytes(file_path: Path) -> bytes:
@@ -64,13 +85,133 @@ def load_object_any(file_path: Path) -> object:
 def list_files(directory: Path, recursive: bool = True) -> List[Path]:
     assert directory.is_dir(
     ), f"The provided path to 'list_files' must be a directory. (Value: '{directory}')"
-    files = []
-    for item in directory.iterdir():
-        if item.is_file():
-            files.append(item)
-        elif item.is_dir() and recursive:
-            files.extend(list_files(item, recursive=True))
-    return files
+    return list(walk_files(directory, recursive=recursive, dir_blacklist=()))
+
+
+@dataclass
+class WalkStats:
+    """Counters collected by 'walk_files' while traversing a directory tree."""
+    visited: int = 0
+    pruned: int = 0
+    files: int = 0
+    excluded: int = 0
+    errors: int = 0
+
+
+class _ScanResult(NamedTuple):
+    files: List[Path]
+    dirs: List[str]
+    file_filter: Optional[FileFilter]
+    visited: int
+    pruned: int
+    excluded: int
+    errors: int
+
+
+def _scan_dir(
+    directory: str,
+    dir_blacklist: Collection[str],
+    file_filter: Optional[FileFilter]
+) -> _ScanResult:
+    """Scan a single directory, reusing the type information cached on each 'os.DirEntry'."""
+    files: List[Path] = []
+    dirs: List[str] = []
+    visited = pruned = excluded = errors = 0
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError:
+        return _ScanResult(files, dirs, file_filter, visited, pruned, excluded, 1)
+
+    if file_filter is not None:
+        # apply ignore files (.gitignore, etc.) located in this directory to its contents
+        file_filter = file_filter.enter(
+            Path(directory), {entry.name for entry in entries})
+
+    for entry in entries:
+        visited += 1
+        try:
+            # NOTE: directory symlinks are not followed, to avoid walking in cycles
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name in dir_blacklist or (file_filter and file_filter.excludes_dir(entry.path)):
+                    pruned += 1
+                else:
+                    dirs.append(entry.path)
+            elif entry.is_file():
+                if file_filter and not file_filter.includes_file(entry.path):
+                    excluded += 1
+                else:
+                    files.append(Path(entry.path))
+        except OSError:
+            errors += 1
+    return _ScanResult(files, dirs, file_filter, visited, pruned, excluded, errors)
+
+
+def walk_files(
+    directory: Path,
+    recursive: bool = True,
+    dir_blacklist: Collection[str] = DIR_BLACKLIST,
+    workers: int = 0,
+    stats: Optional[WalkStats] = None,
+    file_filter: Optional[FileFilter] = None
+) -> Iterator[Path]:
+    """
+    Lazily yield the paths of all files in a directory, built on 'os.scandir'.
+
+    Parameters:
+        directory (Path): The directory to walk.
+        recursive (bool): Whether to descend into nested directories. Default is True.
+        dir_blacklist (Collection[str]): Directory names which are pruned before they're descended into.
+        workers (int): If greater than 1, subtrees are scanned concurrently using a thread pool of this size.
+        stats (Optional[WalkStats]): If provided, updated with the number of entries visited/pruned as the walk progresses.
+        file_filter (Optional[FileFilter]): If provided, only files it includes are yielded, and directories it ignores are pruned.
+
+    Yields:
+        Path: The path of each file found, in no particular order.
+    """
+    assert directory.is_dir(
+    ), f"The provided path to 'walk_files' must be a directory. (Value: '{directory}')"
+    stats = stats if stats is not None else WalkStats()
+
+    def consume(result: _ScanResult) -> List[Path]:
+        stats.visited += result.visited
+        stats.pruned += result.pruned
+        stats.excluded += result.excluded
+        stats.errors += result.errors
+        stats.files += len(result.files)
+        return result.files
+
+    if workers <= 1:
+        stack = [(str(directory), file_filter)]
+        while stack:
+            subdir, subdir_filter = stack.pop()
+            result = _scan_dir(subdir, dir_blacklist, subdir_filter)
+            yield from consume(result)
+            if recursive:
+                stack.extend((subdir, result.file_filter)
+                             for subdir in reversed(result.dirs))
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending: Set["Future[_ScanResult]"] = {
+        executor.submit(_scan_dir, str(directory), dir_blacklist, file_filter)}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if recursive:
+                    pending.update(
+                        executor.submit(
+                            _scan_dir, subdir, dir_blacklist, result.file_filter)
+                        for subdir in result.dirs
+                    )
+                yield from consume(result)
+    finally:
+        # the generator may be closed early, don't wait on subtrees nobody will consume
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
 
 
 def get_encoding(file_path: Path) -> Optional[Encoding]:
@@ -79,12 +220,78 @@ def get_encoding(file_path: Path) -> Optional[Encoding]:
     Supported encodings: https://link.justin.ooo/chardet-encodings
     """
     with file_path.open('rb') as f:
-        raw_data = f.read(4 * DataUnit.KB)  # read the first 4KB of the file
-        result = chardet.detect(raw_data)
-        encoding_str = result.get("encoding")
-        if isinstance(encoding_str, str):
-            encoding = Encoding.from_string(encoding_str)
+        raw_data = f.read(ENCODING_SAMPLE_SIZE)  # read the first 4KB of the file
+    return detect_encoding(raw_data)
+
+
+# byte order marks, checked in order (the UTF-32 LE mark begins with the UTF-16 LE mark)
+BOMS = (
+    (codecs.BOM_UTF8, Encoding.UTF_8),
+    (codecs.BOM_UTF32_LE, Encoding.UTF_32_LE),
+    (codecs.BOM_UTF32_BE, Encoding.UTF_32_BE),
+    (codecs.BOM_UTF16_LE, Encoding.UTF_16_LE),
+    (codecs.BOM_UTF16_BE, Encoding.UTF_16_BE),
+)
+
+# maps content hashes to the encoding detected from the content
+_encoding_cache: "OrderedDict[str, Optional[Encoding]]" = OrderedDict()
+_encoding_cache_lock = threading.Lock()
+ENCODING_CACHE_SIZE = 64 * DataUnit.KB
+
+
+def detect_encoding(data: bytes, hash: Optional[str] = None) -> Optional[Encoding]:
+    """
+    Attempts to determine the encoding of some data (typically the first 4 KB of a file). Returns 'None' if no encoding is recognized.
+    Cheap checks are made first (byte order marks, binary data, strict ASCII/UTF-8 decoding), chardet is only used if they're inconclusive.
+    If the hash of the content is provided, the result is cached based on it.
+    """
+    if hash is not None:
+        with _encoding_cache_lock:
+            if hash in _encoding_cache:
+                _encoding_cache.move_to_end(hash)
+                return _encoding_cache[hash]
+
+    encoding = _detect_encoding(data)
+
+    if hash is not None:
+        with _encoding_cache_lock:
+            _encoding_cache[hash] = encoding
+            if len(_encoding_cache) > ENCODING_CACHE_SIZE:
+                _encoding_cache.popitem(last=False)
+    return encoding
+
+
+def _detect_encoding(data: bytes) -> Optional[Encoding]:
+    if not data:
+        # there's nothing to upload from an empty file
+        return None
+
+    for bom, encoding in BOMS:
+        if data.startswith(bom):
             return encoding
+
+    if b"\x00" in data:
+        # text files (without a UTF-16/32 byte order mark) don't contain NUL bytes
+        return None
+
+    if data.isascii():
+        return Encoding.ASCII
+
+    try:
+        # 'final=False' allows a multi-byte character to be cut off at the end of the sample
+        codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+        return Encoding.UTF_8
+    except UnicodeDecodeError:
+        pass
+
+    # NOTE: imported here since it's slow to import, and rarely needed
+    import chardet
+    profiling.count(chardet=1)
+    result = chardet.detect(data)
+    encoding_str = result.get("encoding")
+    if isinstance(encoding_str, str):
+        encoding = Encoding.from_string(encoding_str)
+        return encoding
     return None
 
 
@@ -107,45 +314,30 @@ class FilteredFiles(NamedTuple):
     valid_count: int
 
 
-def filter_files(all_files: List[Path]) -> FilteredFiles:
-    encoding_whitelist = [Encoding.UTF_8, Encoding.ASCII]
-    dir_blacklist = [".git", "node_modules", "site-packages", ".mypy_cache"]
-    pattern_blacklist = [r".*\.egg-info"]
-
-    # extensions we'll still create embeddings for by creating a temp .txt duplicate
-    extensions_convert = {'.lua'}
-
-    # extensions supported by OpenAI by default
-    extension_whitelist = {
-        '.py', '.js', '.txt', '.md', '.html', '.css', '.java', '.c', '.cpp',
-        '.rb', '.php', '.ts', '.json', '.xml', '.csv', '.xlsx', '.pptx', '.docx',
-        '.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf', '.zip', '.tar', '.tex'
-    }
-
-    files = [
-        file_path for file_path in all_files
-        if file_path.suffix in extension_whitelist | extensions_convert
-        and get_encoding(file_path) in encoding_whitelist
-        and not any(has_parent_directory(file_path, dir) for dir in dir_blacklist)
-    ]
-
-    # NOTE(justin): run actual path pattern checks in a separate loop (for optimization purposes)
-    # the goal is to filter out *most* invalid paths without regex prior to this using has_parent_directory
-    files = [
-        file for file in files if
-        not any(matches_pattern(str(file), pattern)
-                for pattern in pattern_blacklist)
-    ]
-
-    # move files which need to be converted to txt into separate list
-    files_conv = [
-        file_path for file_path in files
-        if file_path.suffix in extensions_convert
-    ]
-    files = [
-        file_path for file_path in files
-        if not file_path in files_conv
-    ]
+def filter_files(
+    all_files: Iterable[Path],
+    file_filter: FileFilter,
+    check_encoding: bool = True
+) -> FilteredFiles:
+    """
+    Filter a list of files down to those which can be uploaded.
+    'file_filter' decides which files are included (ex: 'FileFilter(dir_path)' for files in a scanned directory).
+    If 'check_encoding' is False, the encoding of each file is expected to be validated by the caller (see 'files.ingest').
+    """
+    all_files = list(all_files)
+
+    files: List[Path] = []
+    files_conv: List[Path] = []
+    for file_path in all_files:
+        if not file_filter.includes_file(file_path):
+            continue
+        if check_encoding and get_encoding(file_path) not in ENCODING_WHITELIST:
+            continue
+        # files which need to be converted to txt are moved into a separate list
+        if file_path.suffix in EXTENSIONS_CONVERT:
+            files_conv.append(file_path)
+        else:
+            files.append(file_path)
 
     return FilteredFiles(
         files=files,
@@ -1,27 +1,53 @@
 import click
+import importlib
 import sys
-from summawise.utils import get_version
-from summawise.commands import assistant, scan, thread
+from typing import Any, Dict, List, Optional
+from summawise import profiling
+from summawise.utils import package_name
+from summawise.commands import COMMANDS
 from summawise.settings import Settings
 
-VERSION = get_version()
 CONTEXT_SETTINGS = {"max_content_width": sys.maxsize}
 
 
-@click.group(context_settings=CONTEXT_SETTINGS)
-@click.version_option(str(VERSION), "-v", "--version")
+class LazyGroup(click.Group):
+    """
+    A group which imports the module defining each of its commands only when the command is used.
+    Commands (and the dependencies they import) are registered by name, see 'summawise.commands.COMMANDS'.
+    """
+
+    def __init__(self, *args: Any, lazy_commands: Optional[Dict[str, str]] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands: Dict[str, str] = dict(lazy_commands or {})
+
+    def list_commands(self, ctx: click.Context) -> List[str]:
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module = importlib.import_module(self.lazy_commands[cmd_name])
+            self.add_command(getattr(module, cmd_name))
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(cls=LazyGroup, context_settings=CONTEXT_SETTINGS)
+@click.version_option(None, "-v", "--version", package_name=package_name())
 @click.option("--debug", is_flag=True, hidden=True, help="Enable debug mode")
+@click.option("--profile", is_flag=True, help="Print the time spent in each stage (and its API calls, files, bytes, etc.) once the command finishes.")
+@click.option("--profile_trace", type=click.Path(dir_okay=False, writable=True), default=None, help="Write a Chrome trace of each stage to this file once the command finishes (viewable in chrome://tracing or https://ui.perfetto.dev), implies '--profile'.")
 @click.pass_context
-def cli(ctx: click.Context, debug: bool):
+def cli(ctx: click.Context, debug: bool, profile: bool, profile_trace: Optional[str]):
     """A tool to use AI to analyze and interact with vectorized data from custom sources of information."""
     ctx.ensure_object(dict)
     ctx.obj["DEBUG"] = debug
+    if profile or profile_trace:
+        profiling.enable()
+        ctx.call_on_close(lambda: profiling.finish(profile_trace or "-"))
 
 
 def register_commands():
-    cli.add_command(scan)
-    cli.add_command(assistant)
-    cli.add_command(thread)
+    assert isinstance(cli, LazyGroup)
+    cli.lazy_commands.update(COMMANDS)
 
 
 def main():
@@ -0,0 +1,258 @@
+"""
+Lightweight instrumentation of the stages of processing an input, reported by the '--profile' option.
+Each stage is recorded as a span, which measures its wall time along with counters such as files, bytes, API calls and retries.
+Nothing is recorded unless profiling has been enabled ('enable'), so the instrumentation costs almost nothing otherwise.
+NOTE: spans recorded in other processes (ex: hashing with the 'process' executor type) aren't collected.
+"""
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+# header sent by the openai client with each request, the number of times the request has been retried
+RETRY_COUNT_HEADER = "x-stainless-retry-count"
+
+
+class Span:
+    """A stage which was timed, and the counters recorded while it was running."""
+    __slots__ = ("id", "name", "start", "end", "thread_id", "task_id", "parent", "counters")
+
+    def __init__(self, name: str, start: float, parent: Optional["Span"] = None, **counters: float):
+        self.id = next(_span_ids)
+        self.name = name
+        self.start = start
+        self.end = start
+        self.thread_id = threading.get_ident()
+        self.task_id = _current_task_id()
+        self.parent = parent
+        self.counters: Dict[str, float] = dict(counters)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def add(self, **counters: float) -> None:
+        """Add to the counters of this span (ex: 'span.add(files=1, bytes=len(data))')."""
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class _NullSpan(Span):
+    """Used in place of a span while profiling is disabled, nothing is recorded."""
+    __slots__ = ()
+
+    def add(self, **counters: float) -> None:
+        pass
+
+
+_span_ids = itertools.count(1)
+_enabled = False
+_started_at = time.perf_counter()
+_lock = threading.Lock()
+_spans: List[Span] = []
+# totals of the counters recorded by 'count' (events such as API calls, rather than the attributes of each span)
+_totals: Dict[str, float] = defaultdict(float)
+_current: ContextVar[Optional[Span]] = ContextVar("summawise_profiling_span", default=None)
+
+def _current_task_id() -> Optional[int]:
+    """An id for the asyncio task that's running (if any), spans in tasks overlap each other on the same thread."""
+    # NOTE: if asyncio hasn't been imported, no task can be running (it isn't imported here, since it's slow to import)
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return None
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return None
+    return id(task) if task is not None else None
+
+
+NULL_SPAN = _NullSpan("null", 0.0)
+
+
+def enable() -> None:
+    """Start recording spans (any previously recorded spans are discarded)."""
+    global _enabled, _started_at
+    with _lock:
+        _spans.clear()
+        _totals.clear()
+        _started_at = time.perf_counter()
+        _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextlib.contextmanager
+def span(name: str, **counters: float) -> Iterator[Span]:
+    """
+    Time a stage, the span can be used to record counters while it runs (ex: 'with span("upload", bytes=size) as s').
+    Spans started while another span is running (in the same thread or task) are its children.
+    NOTE: a span shouldn't be held across a 'yield' in a generator, since the generator may be resumed in another context.
+    """
+    if not _enabled:
+        yield NULL_SPAN
+        return
+
+    current = Span(name, time.perf_counter(), parent=_current.get(), **counters)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+        _finish(current)
+
+
+def record(name: str, start: float, end: Optional[float] = None, **counters: float) -> None:
+    """Record a span which was timed separately ('start' and 'end' are from 'time.perf_counter'), such as the time to the first token of a response."""
+    if not _enabled:
+        return
+    recorded = Span(name, start, parent=_current.get(), **counters)
+    recorded.end = end if end is not None else time.perf_counter()
+    _finish(recorded)
+
+
+def count(**counters: float) -> None:
+    """Count events (ex: 'count(api_calls=1)'), they're added to the totals and to the counters of the current span (if any)."""
+    if not _enabled:
+        return
+    current = _current.get()
+    if current is not None:
+        current.add(**counters)
+    with _lock:
+        for name, value in counters.items():
+            _totals[name] += value
+
+
+def _finish(finished: Span) -> None:
+    with _lock:
+        _spans.append(finished)
+
+
+def spans() -> List[Span]:
+    with _lock:
+        return list(_spans)
+
+
+def totals() -> Dict[str, float]:
+    with _lock:
+        return dict(_totals)
+
+
+def http_event_hooks() -> Dict[str, List[Any]]:
+    """Event hooks for an httpx client, which count the API requests (and retries/rate limited responses) of the current span."""
+    def on_request(request: Any) -> None:
+        count(api_calls=1)
+        retries = request.headers.get(RETRY_COUNT_HEADER, "0")
+        if retries.isdigit() and int(retries) > 0:
+            count(api_retries=1)
+
+    def on_response(response: Any) -> None:
+        if response.status_code == 429:
+            count(rate_limited=1)
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def async_http_event_hooks() -> Dict[str, List[Any]]:
+    """The same as 'http_event_hooks', for an async httpx client."""
+    hooks = http_event_hooks()
+
+    def wrap(hook: Any) -> Any:
+        async def async_hook(obj: Any) -> None:
+            hook(obj)
+        return async_hook
+
+    return {event: [wrap(hook) for hook in event_hooks] for event, event_hooks in hooks.items()}
+
+
+def format_value(name: str, value: float) -> str:
+    if name == "bytes":
+        from summawise.data import DataUnit
+        return DataUnit.bytes_to_str(int(value))
+    return f"{value:g}"
+
+
+def report() -> str:
+    """A table of the time spent in each stage (grouped by name, in the order they first started), and their counters."""
+    recorded = sorted(spans(), key=lambda s: s.start)
+    stages: Dict[str, List[Span]] = {}
+    for recorded_span in recorded:
+        stages.setdefault(recorded_span.name, []).append(recorded_span)
+
+    elapsed = time.perf_counter() - _started_at
+    lines = [
+        f"Profile (wall time: {elapsed:.3f}s)",
+        f"{'stage':<28} {'calls':>7} {'total':>10} {'mean':>10} {'max':>10}  counters"
+    ]
+    for name, stage_spans in stages.items():
+        durations = [s.duration for s in stage_spans]
+        counters: Dict[str, float] = defaultdict(float)
+        for stage_span in stage_spans:
+            for counter, value in stage_span.counters.items():
+                counters[counter] += value
+        counters_str = ", ".join(f"{counter}={format_value(counter, value)}" for counter, value in sorted(counters.items()))
+        lines.append(
+            f"{name:<28} {len(durations):>7} {sum(durations) * 1000:>7.1f} ms {sum(durations) / len(durations) * 1000:>7.1f} ms "
+            f"{max(durations) * 1000:>7.1f} ms  {counters_str}")
+
+    totals_str = ", ".join(f"{counter}={format_value(counter, value)}" for counter, value in sorted(totals().items()))
+    lines.append(f"Totals: {totals_str or 'none'}")
+    # NOTE: stages overlap (ex: uploads run concurrently, and alongside hashing), so their totals can exceed the wall time
+    lines.append("Stages which run concurrently overlap, so their totals can exceed the wall time.")
+    return "\n".join(lines)
+
+
+def chrome_trace() -> Dict[str, Any]:
+    """
+    The recorded spans in the Chrome trace event format (viewable in chrome://tracing or https://ui.perfetto.dev).
+    Spans in asyncio tasks are async events, since they overlap each other on the same thread.
+    """
+    pid = os.getpid()
+    events: List[Dict[str, Any]] = []
+    thread_ids: Dict[int, int] = {}
+    for recorded_span in sorted(spans(), key=lambda s: s.start):
+        tid = thread_ids.setdefault(recorded_span.thread_id, len(thread_ids) + 1)
+        event: Dict[str, Any] = {
+            "name": recorded_span.name,
+            "cat": "summawise",
+            "pid": pid,
+            "tid": tid,
+            "ts": (recorded_span.start - _started_at) * 1e6,
+            "args": recorded_span.counters
+        }
+        if recorded_span.task_id is None:
+            events.append(dict(event, ph="X", dur=recorded_span.duration * 1e6))
+        else:
+            events.append(dict(event, ph="b", id=recorded_span.id))
+            events.append(dict(event, ph="e", id=recorded_span.id, ts=(recorded_span.end - _started_at) * 1e6, args={}))
+
+    for thread_id, tid in thread_ids.items():
+        name = next((t.name for t in threading.enumerate() if t.ident == thread_id), f"thread-{tid}")
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"totals": totals()}}
+
+
+def write_chrome_trace(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f)
+
+
+def finish(path: str = "-", file: Optional[TextIO] = None) -> None:
+    """
+    Output the profile once a command has finished: the report is printed (to stderr by default, since stdout may contain results),
+    and the Chrome trace is written to 'path' unless it's '-'.
+    """
+    file = file or sys.stderr
+    print("\n" + report(), file=file)
+    if path != "-":
+        write_chrome_trace(path)
+        print(f"Chrome trace written to: {path}", file=file)
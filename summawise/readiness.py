@@ -0,0 +1,132 @@
+import asyncio
+import time
+from typing import Callable, NamedTuple, Optional
+from openai.types.beta import VectorStore
+from summawise import ai, profiling
+
+# bounds of the delay between checks of a vector store's status (seconds)
+POLL_MIN_DELAY = 0.5
+POLL_MAX_DELAY = 30.0
+# factor the delay grows by each time a check shows no progress
+POLL_BACKOFF_FACTOR = 1.6
+# rough number of files a vector store processes per second, used to choose the first delay before any progress is seen
+POLL_FILES_PER_SECOND = 25.0
+
+# header sent with vector store responses suggesting how long to wait before polling again (used by 'create_and_poll')
+POLL_AFTER_HEADER = "openai-poll-after-ms"
+
+
+class VectorStoreProgress(NamedTuple):
+    """A snapshot of how many of a vector store's files have been processed."""
+    vector_store: VectorStore
+    elapsed: float  # seconds since the watcher started
+
+    @property
+    def total(self) -> int:
+        return self.vector_store.file_counts.total
+
+    @property
+    def completed(self) -> int:
+        return self.vector_store.file_counts.completed
+
+    @property
+    def pending(self) -> int:
+        return self.vector_store.file_counts.in_progress
+
+    @property
+    def fraction(self) -> float:
+        """The fraction of files which are no longer being processed (files which failed won't become available later)."""
+        return 1.0 - self.pending / self.total if self.total else 1.0
+
+    @property
+    def done(self) -> bool:
+        return self.vector_store.status == "completed"
+
+
+class ReadinessWatcher:
+    """
+    Waits for the files in a vector store to be processed, checking its status with an adaptive delay.
+    The first delay is based on the number of files, the delay then shrinks towards the estimated time remaining while
+    progress is being made (files completed or bytes indexed) and backs off exponentially while it isn't.
+    If 'min_fraction' is less than 1, the vector store is considered ready as soon as that fraction of its files are processed.
+    """
+
+    def __init__(
+        self,
+        vector_store_id: str,
+        min_fraction: float = 1.0,
+        min_delay: float = POLL_MIN_DELAY,
+        max_delay: float = POLL_MAX_DELAY,
+        backoff_factor: float = POLL_BACKOFF_FACTOR
+    ):
+        assert 0 < min_fraction <= 1, "min_fraction must be in the range (0, 1]"
+        self.vector_store_id = vector_store_id
+        self.min_fraction = min_fraction
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.polls = 0
+
+        self._started_at = time.monotonic()
+        self._delay: Optional[float] = None
+        self._poll_after = 0.0
+        self._last: Optional[VectorStoreProgress] = None
+
+    def poll(self) -> VectorStoreProgress:
+        """Retrieve the current status of the vector store. Raises a ValueError if it has expired."""
+        return ai.run(self.poll_async())
+
+    async def poll_async(self) -> VectorStoreProgress:
+        response = await ai.AsyncClient.beta.vector_stores.with_raw_response.retrieve(self.vector_store_id)
+        poll_after = response.headers.get(POLL_AFTER_HEADER)
+        self._poll_after = int(poll_after) / 1000 if poll_after and poll_after.isdigit() else 0.0
+        vector_store = response.parse()
+        if vector_store.status == "expired":
+            raise ValueError("VectorStore is expired.")
+
+        self.polls += 1
+        return VectorStoreProgress(vector_store, time.monotonic() - self._started_at)
+
+    def is_ready(self, progress: VectorStoreProgress) -> bool:
+        return progress.done or progress.fraction >= self.min_fraction
+
+    def next_delay(self, progress: VectorStoreProgress) -> float:
+        """Calculate how long to wait before checking the status again, based on the progress since the previous check."""
+        # files which need to finish processing before the vector store is considered ready
+        remaining = max(1.0, progress.pending - (1.0 - self.min_fraction) * progress.total)
+        last, self._last = self._last, progress
+
+        if self._delay is None:
+            delay = remaining / POLL_FILES_PER_SECOND / 4
+        elif last is not None and (
+            progress.pending < last.pending or
+            progress.vector_store.usage_bytes > last.vector_store.usage_bytes
+        ):
+            # estimate the time remaining from the rate files are being processed, and check again about halfway there
+            processed = max(last.pending - progress.pending, 0)
+            interval = max(progress.elapsed - last.elapsed, 1e-3)
+            delay = remaining / (processed / interval) / 2 if processed else self._delay
+        else:
+            delay = self._delay * self.backoff_factor
+
+        self._delay = min(max(delay, self.min_delay, self._poll_after), self.max_delay)
+        return self._delay
+
+    def wait(self, on_progress: Optional[Callable[[VectorStoreProgress], None]] = None) -> VectorStoreProgress:
+        """
+        Block until the vector store is ready, and return its final status.
+        'on_progress' is called with the status after each check.
+        """
+        return ai.run(self.wait_async(on_progress))
+
+    async def wait_async(self, on_progress: Optional[Callable[[VectorStoreProgress], None]] = None) -> VectorStoreProgress:
+        with profiling.span("vector_store.ready") as span:
+            while True:
+                progress = await self.poll_async()
+                span.add(polls=1)
+                if on_progress is not None:
+                    on_progress(progress)
+                if self.is_ready(progress):
+                    span.add(files=progress.total)
+                    return progress
+                await asyncio.sleep(self.next_delay(progress))
@@ -2,17 +2,15 @@ import json
 import os
 import copy
 import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, fields, field
 from typing import Set, Optional, Dict, List, Any, ClassVar, Tuple
-from openai import AuthenticationError
 from pathlib import Path
-from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
-from pygments.styles import get_all_styles
-from summawise import utils, ai
-from summawise.utils import Singleton, ChoiceValidator
-from summawise.data import DataMode
+from summawise import utils
+from summawise.utils import Singleton
+from summawise.data import DataMode, ExecutorType, HashAlg
 from summawise.files import utils as FileUtils
+from summawise.errors import AssistantSyncError
 from summawise.api_objects import *
 
 
@@ -27,12 +25,25 @@ class Settings(metaclass=Singleton):
     code_style: str
     assistants: AssistantList
     threads: ThreadList
+    workers: int
+    executor_type: ExecutorType
+    hash_alg: HashAlg
+    base_url: str
+    upload_rate: float
 
     DEPRECATED_FIELDS: ClassVar[Set[str]] = {"assistant_id"}
     DEFAULT_MODEL: ClassVar[str] = DEFAULT_MODEL
     DEFAULT_COMPRESSION: ClassVar[bool] = True
     DEFAULT_CODE_STYLE: ClassVar[str] = "monokai"
     DEFAULT_DATA_MODE: ClassVar[DataMode] = DataMode.BIN
+    DEFAULT_WORKERS: ClassVar[int] = 0  # 0 = number of CPUs
+    DEFAULT_EXECUTOR_TYPE: ClassVar[ExecutorType] = ExecutorType.THREAD
+    DEFAULT_HASH_ALG: ClassVar[HashAlg] = HashAlg.XXH3_128  # used to identify file contents (caches are migrated if it changes)
+    DEFAULT_BASE_URL: ClassVar[str] = ""  # empty = the OpenAI API (or the 'OPENAI_BASE_URL' environment variable)
+    DEFAULT_UPLOAD_RATE: ClassVar[float] = 0.0  # uploads per second, 0 = adapts to rate limiting (see 'ai.upload_limiter')
+
+    # completes once default assistants are up to date, see 'sync_assistants'
+    _assistants_sync: ClassVar[Optional["Future[None]"]] = None
 
     # NOTE(justin): This class functions as a singleton. Example usage anywhere:
     # settings = Settings() # type: ignore (dismiss warnings related to required arguments)
@@ -50,12 +61,13 @@ class Settings(metaclass=Singleton):
             Tuple["Settings", bool]: A tuple containing the Settings object created from the data and a boolean indicating whether the settings should be updated.
         """
         key_count = len(data)
+        # NOTE(justin): a deprecated field is kept until it's migrated (see 'sync_assistants')
         expected_key_count = len(fields(Settings)) - \
-            len(Settings.DEPRECATED_FIELDS)
+            len(Settings.DEPRECATED_FIELDS - data.keys())
         save = key_count != expected_key_count
 
         # NOTE(justin): deprecated in version 0.3.0
-        assistant_id = data.pop("assistant_id", None)
+        assistant_id = data.pop("assistant_id", "")
         assistants = data.pop("assistants", [])
         assistants = AssistantList.from_dict_list(assistants)
 
@@ -71,28 +83,30 @@ class Settings(metaclass=Singleton):
             code_style=data.pop("code_style", Settings.DEFAULT_CODE_STYLE),
             data_mode=DataMode(
                 data.pop("data_mode", Settings.DEFAULT_DATA_MODE.value)),
+            workers=data.pop("workers", Settings.DEFAULT_WORKERS),
+            executor_type=ExecutorType(
+                data.pop("executor_type", Settings.DEFAULT_EXECUTOR_TYPE.value)),
+            hash_alg=HashAlg[data.pop(
+                "hash_alg", Settings.DEFAULT_HASH_ALG.name)],
+            base_url=data.pop("base_url", Settings.DEFAULT_BASE_URL),
+            upload_rate=data.pop("upload_rate", Settings.DEFAULT_UPLOAD_RATE),
             **data
         )
 
-        # version 0.3.0 backwards compatability (adding multi-assistant support)
-        if settings.assistant_id:
-            ai.init(settings.api_key, verify=False)
-            api_assistant = ai.get_assistant(assistant_id)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", UserWarning)
-                assistant = Assistant()
-            assistant.apply_api_obj(api_assistant)
-            assert assistant.name and assistant.instructions
-            assistants.append(assistant)
-            save = True
-
+        # NOTE: version 0.3.0 backwards compatability (adding multi-assistant support) requires an api request
+        # 'assistant_id' is migrated along with default assistants by commands which use them, see 'sync_assistants'
         return settings, save
 
     def to_dict(self) -> Dict[str, Any]:
         data = utils.asdict_exclude(self, Settings.DEPRECATED_FIELDS)
+        if self.assistant_id:
+            # hasn't been migrated yet
+            data["assistant_id"] = self.assistant_id
         data["assistants"] = self.assistants.to_dict_list()
         data["threads"] = self.threads.to_dict_list()
         data["data_mode"] = self.data_mode.value
+        data["executor_type"] = self.executor_type.value
+        data["hash_alg"] = self.hash_alg.name
         return data
 
     @staticmethod
@@ -106,36 +120,107 @@ class Settings(metaclass=Singleton):
             settings = Settings.prompt()
             save = True
 
-        # initialize openai api
+        # NOTE: the openai api is initialized from the api key when it's first used (see 'ai.Client'), so it isn't imported here
         # TODO(justin): key verification after settings init in main
-        ai.init(settings.api_key, verify=False)
 
-        # automatically create (or update) default assistants that are added/changed in future versions
+        # default assistants which were created before their definition was hashed are assumed to be up to date if they match
         for da in DEFAULT_ASSISTANTS:
-            try:
-                ea, idx = settings.assistants.get(da.name)
-                if not ea or ea != da:
-                    # assistant doesn't exist or has changed
-                    assistant = copy.copy(da)
-                    api_assistant = ai.create_assistant(
-                        **da.to_create_params())
-                    assistant.apply_api_obj(api_assistant)
-                    if ea and idx != -1:
-                        # assistant exists (matching default name), but the instructions are different
-                        # this means it was updated, so we delete it and re-create it
-                        assistant.created_at = ea.created_at
-                        settings.assistants[idx] = assistant
-                    else:
-                        settings.assistants.append(assistant)
-                    save = True
-            except Exception as ex:
-                print(utils.ex_to_str(ex, append=da.name, include_traceback=True))
+            ea = settings.assistants.get_by_name(da.name)
+            if ea and not ea.definition_hash and ea == da:
+                ea.definition_hash = da.hash_definition()
+                save = True
 
         if save:
             Settings.save()
 
         return settings
 
+    def outdated_assistants(self) -> List[Assistant]:
+        """Default assistants which don't exist yet, or have changed since they were created (checked without any api requests)."""
+        outdated: List[Assistant] = []
+        for da in DEFAULT_ASSISTANTS:
+            ea = self.assistants.get_by_name(da.name)
+            if not ea or ea.definition_hash != da.hash_definition():
+                outdated.append(da)
+        return outdated
+
+    @staticmethod
+    def sync_assistants() -> "Future[None]":
+        """
+        Create (or update) default assistants which are added/changed in future versions, and migrate a deprecated 'assistant_id'.
+        This is only called by commands which use assistants. Assistants are created concurrently in the background, and
+        the returned future completes once settings are saved (immediately, if everything is already up to date).
+        If any assistant couldn't be created, the others are still saved and the future raises an 'AssistantSyncError'.
+        """
+        if Settings._assistants_sync is not None:
+            return Settings._assistants_sync
+
+        settings = Settings()  # type: ignore
+        outdated = settings.outdated_assistants()
+        if not outdated and not settings.assistant_id:
+            future: "Future[None]" = Future()
+            future.set_result(None)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+            future = executor.submit(Settings._sync_assistants, outdated)
+            executor.shutdown(wait=False)
+
+        Settings._assistants_sync = future
+        return future
+
+    @staticmethod
+    def _sync_assistants(outdated: List[Assistant]) -> None:
+        from summawise import ai
+        settings = Settings()  # type: ignore
+        failures: List[Tuple[str, Exception]] = []
+
+        def create(da: Assistant) -> Assistant:
+            assistant = copy.copy(da)
+            api_assistant = ai.create_assistant(**da.to_create_params())
+            assistant.apply_api_obj(api_assistant)
+            assistant.definition_hash = da.hash_definition()
+            return assistant
+
+        def migrate(assistant_id: str) -> Assistant:
+            api_assistant = ai.get_assistant(assistant_id)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                assistant = Assistant()
+            assistant.apply_api_obj(api_assistant)
+            assert assistant.name and assistant.instructions
+            return assistant
+
+        with ThreadPoolExecutor(max_workers=len(outdated) + 1) as executor:
+            legacy = executor.submit(migrate, settings.assistant_id) if settings.assistant_id else None
+            created = [(da, executor.submit(create, da)) for da in outdated]
+
+            if legacy is not None:
+                try:
+                    settings.assistants.append(legacy.result())
+                    settings.assistant_id = ""
+                except Exception as ex:
+                    failures.append(("assistant_id", ex))
+
+            for da, future in created:
+                try:
+                    assistant = future.result()
+                except Exception as ex:
+                    failures.append((da.name, ex))
+                    continue
+                ea, idx = settings.assistants.get(da.name)
+                if ea and idx != -1:
+                    # assistant exists (matching default name), but its definition is different
+                    # this means it was updated, so we replace it with the re-created assistant
+                    assistant.created_at = ea.created_at
+                    settings.assistants[idx] = assistant
+                else:
+                    settings.assistants.append(assistant)
+
+        Settings.save()
+        if failures:
+            # NOTE: raised through the future, commands report it when they wait for assistants
+            raise AssistantSyncError(failures) from failures[0][1]
+
     @staticmethod
     def save() -> "Settings":
         settings = Settings()  # type: ignore
@@ -149,6 +234,11 @@ class Settings(metaclass=Singleton):
 
     @staticmethod
     def prompt() -> "Settings":
+        from prompt_toolkit import prompt
+        from prompt_toolkit.completion import WordCompleter
+        from pygments.styles import get_all_styles
+        from summawise.utils import ChoiceValidator
+
         api_key = os.getenv("OPENAI_API_KEY", "")
         api_key = validate_api_key(api_key)
 
@@ -174,12 +264,7 @@ class Settings(metaclass=Singleton):
         if not len(style.strip()):
             style = Settings.DEFAULT_CODE_STYLE
 
-        assistants: List[Assistant] = []
-        for da in DEFAULT_ASSISTANTS:
-            assistant = copy.copy(da)
-            api_assistant = ai.create_assistant(**da.to_create_params())
-            assistant.apply_api_obj(api_assistant)
-            assistants.append(assistant)
+        # NOTE: default assistants are created when they're first used, see 'sync_assistants'
 
         # TODO(justin): maybe add ability to select data mode. possibly a cli option to re-configure settings too.
         # it's not too important, for now it'll default to binary and can be changed manually.
@@ -188,17 +273,24 @@ class Settings(metaclass=Singleton):
             api_key=api_key,
             model=model,
             assistant_id="",  # NOTE(justin): deprecated in version 0.3.0
-            assistants=AssistantList(assistants),
+            assistants=AssistantList(),
             threads=ThreadList(),
             compression=Settings.DEFAULT_COMPRESSION,
             code_style=style,
             data_mode=Settings.DEFAULT_DATA_MODE,
+            workers=Settings.DEFAULT_WORKERS,
+            executor_type=Settings.DEFAULT_EXECUTOR_TYPE,
+            hash_alg=Settings.DEFAULT_HASH_ALG,
+            base_url=Settings.DEFAULT_BASE_URL,
+            upload_rate=Settings.DEFAULT_UPLOAD_RATE,
         )
 
 
 def validate_api_key(api_key: str) -> Optional[str]:
+    from openai import AuthenticationError
+    from summawise import ai
     try:
-        ai.init(api_key)
+        ai.init(api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
         return api_key
     except AuthenticationError:
         return None
@@ -1,3 +1,20 @@
+import importlib
+from typing import Any, Dict
 from summawise.utils.misc import *
-from summawise.utils.validators import *
-from summawise.utils.terminal import *
+from summawise.utils.ratelimit import *
+
+# names provided by modules which depend on prompt_toolkit/pygments (slow to import), they're imported when first accessed
+_LAZY_NAMES: Dict[str, str] = {
+    "NumericChoiceValidator": "summawise.utils.validators",
+    "ChoiceValidator": "summawise.utils.validators",
+    "guess_lexer": "summawise.utils.terminal",
+    "highlight_code": "summawise.utils.terminal",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_NAMES:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(_LAZY_NAMES[name]), name)
+    globals()[name] = value
+    return value
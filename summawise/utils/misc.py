@@ -3,14 +3,14 @@ import traceback
 import sys
 from datetime import datetime
 from dataclasses import is_dataclass, fields
-from importlib import metadata
-from typing import Any, Optional, Callable, Union, Tuple, Set, Dict
+from typing import Any, Optional, Callable, Union, Tuple, Set, Dict, TYPE_CHECKING
 from pathlib import Path
-from packaging.version import Version
-from packaging.version import Version
 from summawise.errors import ValueTypeError
 from summawise.data import HashAlg
 
+if TYPE_CHECKING:
+    from packaging.version import Version
+
 
 def package_name(): return __name__.split('.')[0]
 def utc_now(): return datetime.utcnow()
@@ -83,7 +83,7 @@ def asdict_exclude(obj: Any, exclude: Set[str]) -> Dict[str, Any]:
     return result
 
 
-def get_version(pkg_name: str = "") -> Version:
+def get_version(pkg_name: str = "") -> "Version":
     """
     Retrieves the version of a specified package.
     By default, it will return the running packages (summawise) version. 
@@ -92,6 +92,8 @@ def get_version(pkg_name: str = "") -> Version:
     Returns:
         Version: An object representing the version of the specified package.
     """
+    from importlib import metadata
+    from packaging.version import Version
     if not pkg_name:
         pkg_name = package_name()
     version_str = metadata.version(pkg_name)
@@ -114,6 +116,21 @@ def delete_lines(count: int = 1):
         sys.stdout.flush()
 
 
+def print_progress(text: str, done: bool = False):
+    """
+    Overwrites the current line of terminal output with the given text.
+    Parameters:
+        text (str): The text to output.
+        done (bool): Move on to a new line after the text is output, so it isn't overwritten. Default is False.
+    """
+    CARRIAGE_RETURN = '\r'
+    ERASE_LINE = '\x1b[2K'
+    sys.stdout.write(CARRIAGE_RETURN + ERASE_LINE + text)
+    if done:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
 converter_iso: Callable[[datetime], str] = lambda v: v.isoformat()
 converter_ts: Callable[[datetime], float] = lambda v: v.timestamp()
 converter_ts_int: Callable[[datetime], float] = lambda v: int(v.timestamp())
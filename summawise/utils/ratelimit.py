@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+from typing import Mapping, Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to limit the rate of requests shared between many workers (threads or tasks).
+
+    If 'min_rate' is provided, the rate adapts to rate limiting (AIMD): it's halved when the bucket is paused (down to 'min_rate'),
+    and recovers gradually as requests succeed (up to the initial rate).
+
+    Attributes:
+        rate (float): The number of tokens added to the bucket per second.
+        capacity (float): The maximum number of tokens the bucket can hold (the size of a burst).
+        max_rate (float): The initial rate, an adaptive rate never exceeds it.
+        min_rate (Optional[float]): The lowest an adaptive rate can be reduced to, 'None' if the rate is fixed.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: Optional[float] = None):
+        assert rate > 0, "rate must be positive"
+        assert min_rate is None or 0 < min_rate <= rate, "min_rate must be positive, and no greater than rate"
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def _try_acquire(self, tokens: float) -> float:
+        """Consume the requested number of tokens if they're available. Returns 0 if they were, otherwise the time to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1) -> None:
+        """Block until the requested number of tokens are available, then consume them."""
+        while True:
+            delay = self._try_acquire(tokens)
+            if not delay:
+                return
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: float = 1) -> None:
+        """Wait (without blocking the event loop) until the requested number of tokens are available, then consume them."""
+        import asyncio
+        while True:
+            delay = self._try_acquire(tokens)
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out tokens to every worker for the given duration (ex: after receiving a 429 response).
+        An adaptive rate is halved, once per pause (concurrent requests which were rate limited together only reduce it once).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.min_rate is not None and now >= self._paused_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+
+    def succeeded(self) -> None:
+        """Record a request which wasn't rate limited, an adaptive rate is increased by one token per second (up to 'max_rate')."""
+        if self.min_rate is None:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + 1)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff delay with full jitter for the given attempt number (starting at 0)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Parse the delay requested by a server via the 'retry-after-ms' or 'retry-after' response headers.
+    Returns 'None' if neither header is present or valid.
+    """
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
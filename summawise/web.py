@@ -1,11 +1,20 @@
-import requests
+import atexit
+import io
+import shutil
 import tempfile
+import requests
+from typing import BinaryIO, Optional, Union
+from urllib.parse import urlparse
 from pathlib import Path
-from summawise import ai, youtube
-from summawise.files.processing import process_file
+from summawise import ai, profiling, youtube
+from summawise.files.processing import process_bytes, process_download
+from summawise.files.ingest import MMAP_THRESHOLD
 from summawise.data import DataUnit
 from summawise.errors import NotSupportedError
 
+# downloads larger than this are spooled to a temporary file rather than kept in memory
+SPOOL_THRESHOLD = MMAP_THRESHOLD
+
 
 def process_url(url: str) -> ai.Resources:
     if youtube.is_url(url):
@@ -17,8 +26,9 @@ def process_url(url: str) -> ai.Resources:
         "text/html": ".html"
     }
 
-    response = requests.head(url, allow_redirects=True)
-    response.raise_for_status()
+    with profiling.span("web.head"):
+        response = requests.head(url, allow_redirects=True)
+        response.raise_for_status()
 
     result_url = response.url
     content_type = response.headers.get("Content-Type", "")
@@ -33,26 +43,54 @@ def process_url(url: str) -> ai.Resources:
         raise NotSupportedError(
             f"\nUnsupported content type detected from HEAD request: {content_type}")
 
-    # send requst to download file from url (stream the data)
-    response = requests.get(result_url, stream=True)
-    response.raise_for_status()
-
-    # create temp file and write chunks of streamed data to disk
     extension = extensions.get(content_type, ".txt")
-    temp_file = tempfile.NamedTemporaryFile(suffix=extension, delete=False)
-    try:
-        temp_file_path = Path(temp_file.name)
-        for chunk in response.iter_content(chunk_size=8 * DataUnit.KB):
-            temp_file.write(chunk)
-    except Exception as ex:
-        raise RuntimeError(f"Failed to write bytes to temporary file: {ex}")
-    finally:
-        temp_file.close()
-
-    # process the temp file, automatically delete it after
-    try:
-        result = process_file(temp_file_path, delete=True)
-    finally:
-        if temp_file_path.exists():
-            temp_file_path.unlink()
-    return result
+    name = (Path(urlparse(result_url).path).stem or "download") + extension
+    downloaded = download(result_url, name)
+    if isinstance(downloaded, Path):
+        return process_download(downloaded)
+    return process_bytes(name, downloaded)
+
+
+def download(url: str, name: str) -> Union[bytes, Path]:
+    """
+    Download the contents of a url. They're kept in memory and returned as bytes, unless the download is larger than
+    'SPOOL_THRESHOLD', in which case they're written to a temporary file named 'name' (and its path is returned).
+    """
+    buffer = io.BytesIO()
+    spooled: Optional[BinaryIO] = None
+    size = 0
+    with profiling.span("web.download", files=1) as span:
+        # send requst to download file from url (stream the data)
+        response = requests.get(url, stream=True)
+        response.raise_for_status()
+
+        try:
+            for chunk in response.iter_content(chunk_size=64 * DataUnit.KB):
+                size += len(chunk)
+                if spooled is None and size > SPOOL_THRESHOLD:
+                    spooled = open(spool_dir() / name, "wb")
+                    spooled.write(buffer.getbuffer())
+                    buffer = io.BytesIO()
+                (spooled or buffer).write(chunk)
+        except Exception as ex:
+            raise RuntimeError(f"Failed to download file: {ex}")
+        finally:
+            if spooled is not None:
+                spooled.close()
+        span.add(bytes=size)
+
+    if spooled is not None:
+        return Path(spooled.name)
+    # NOTE: the buffer's contents are shared with the returned bytes, rather than copied
+    return buffer.getvalue()
+
+
+def spool_dir() -> Path:
+    """
+    A temporary directory for downloads which are too large to be kept in memory.
+    It's removed when the process exits, rather than once a download is processed, since the contents of a file may be
+    read again later (ex: to be sent as messages, see 'FileContents').
+    """
+    temp_dir = tempfile.mkdtemp(prefix="summawise-")
+    atexit.register(shutil.rmtree, temp_dir, ignore_errors=True)
+    return Path(temp_dir)
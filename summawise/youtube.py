@@ -4,9 +4,9 @@ from datetime import timedelta
 from typing import List, Dict
 from pathlib import Path
 from youtube_transcript_api import YouTubeTranscriptApi
-from summawise import utils, ai
+from summawise import utils, ai, profiling
 from summawise.data import DataMode
-from summawise.files import utils as FileUtils
+from summawise.files.ingest import ingest_bytes
 from summawise.serializable import Serializable
 from summawise.settings import Settings
 
@@ -52,10 +52,9 @@ class Transcript(Serializable):
 
     def vectorize(self) -> ai.Resources:
         name = f"transcript_{self.video_id}"
-        content_path = utils.get_summawise_dir() / "youtube" / f"{name}.txt"
-        FileUtils.write_str(content_path, str(self))
-        resources = ai.create_vector_store(name, [content_path])
-        content_path.unlink()
+        # uploaded directly from memory, the transcript is never written to disk
+        transcript = ingest_bytes(f"{name}.txt", str(self).encode("utf-8"), legacy_hash_algs=ai.FileCache.legacy_hash_algs())
+        resources = ai.create_vector_store(name, [transcript])
         self.vector_store_id = resources.vector_store_id
         self.file_id = next(iter(resources.file_ids))
         return resources
@@ -80,7 +79,9 @@ class Transcript(Serializable):
 
 
 def get_transcript(video_id: str, vectorize: bool = False) -> Transcript:
-    transcript_data = YouTubeTranscriptApi.get_transcript(video_id)
+    with profiling.span("youtube.transcript") as span:
+        transcript_data = YouTubeTranscriptApi.get_transcript(video_id)
+        span.add(entries=len(transcript_data))
     entries = [TranscriptEntry(**entry) for entry in transcript_data]
     return Transcript(video_id, entries, vectorize=vectorize)
 